@@ -0,0 +1,130 @@
+#!/usr/bin/env python3
+"""
+Compare accumulating an utterance's audio in an ``AudioBuffer`` against the
+``numpy.concatenate()`` approach which ``WhisperInput`` used to take.
+
+Each approach is run in its own process so that the peak RSS figures are not
+muddled together.
+"""
+
+import argparse
+import json
+import numpy
+import resource
+import subprocess
+import sys
+import time
+import tracemalloc
+
+sys.path[0] += '/../..'
+
+from dexter.core.audio_buffer import AudioBuffer
+
+# ------------------------------------------------------------------------------
+
+_RATE  = 16000
+_WIDTH = 2
+
+# ------------------------------------------------------------------------------
+
+def _concatenate(chunks):
+    """
+    What ``WhisperInput._feed_raw()`` used to do.
+
+    :return: The audio, and how many array copies were made.
+    """
+    audio  = None
+    copies = 0
+    for data in chunks:
+        chunk = numpy.frombuffer(data, numpy.int16  ) \
+                     .astype    (      numpy.float32) / 2.0**15
+        copies += 2 # <-- astype() and the division
+        if audio is None:
+            audio = chunk
+        else:
+            audio = numpy.concatenate((audio, chunk))
+            copies += 1
+    return (audio, copies)
+
+
+def _arena(chunks):
+    """
+    Using an ``AudioBuffer``.
+
+    :return: The audio, and how many array copies were made.
+    """
+    buffer = AudioBuffer(_RATE, _WIDTH)
+    for data in chunks:
+        buffer.append(data)
+    return (buffer.view(), buffer.copies)
+
+
+def _measure(mode, seconds, chunk_secs):
+    """
+    Run the given mode and print the results as JSON.
+    """
+    rng    = numpy.random.default_rng(1)
+    count  = int(chunk_secs * _RATE)
+    chunks = [rng.integers(-32768, 32767, count, dtype=numpy.int16).tobytes()
+              for _ in range(int(seconds / chunk_secs))]
+    func   = _concatenate if mode == 'concatenate' else _arena
+
+    # Warm up so that numpy's import costs etc. are out of the way
+    func(chunks[:2])
+
+    before = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    tracemalloc.start()
+    start = time.perf_counter()
+    (audio, copies) = func(chunks)
+    elapsed = time.perf_counter() - start
+    (_, peak) = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    after = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+
+    print(json.dumps({
+        'mode'     : mode,
+        'samples'  : len(audio),
+        'copies'   : copies,
+        'ms'       : elapsed * 1000,
+        'peak_kb'  : peak // 1024,
+        'rss_kb'   : after,
+        'rss_delta': after - before,
+    }))
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Audio buffering benchmark.')
+    parser.add_argument('--seconds', type=float, default=10.0,
+                        help='The length of the utterance')
+    parser.add_argument('--chunk-secs', type=float, default=0.2,
+                        help='The length of each chunk of audio')
+    parser.add_argument('--mode', choices=('concatenate', 'arena'),
+                        help='Just run the given mode')
+    args = parser.parse_args()
+
+    if args.mode is not None:
+        _measure(args.mode, args.seconds, args.chunk_secs)
+        return
+
+    print("%0.1fs utterance in %0.2fs chunks" % (args.seconds, args.chunk_secs))
+    print()
+    print("%-12s %8s %8s %14s %12s %14s" %
+          ('mode', 'copies', 'ms', 'peak alloc KB', 'peak RSS KB', 'RSS growth KB'))
+    for mode in ('concatenate', 'arena'):
+        output = subprocess.check_output((sys.executable,
+                                          sys.argv[0],
+                                          '--seconds',    str(args.seconds),
+                                          '--chunk-secs', str(args.chunk_secs),
+                                          '--mode',       mode))
+        result = json.loads(output)
+        print("%-12s %8d %8.2f %14d %12d %14d" %
+              (mode,
+               result['copies'],
+               result['ms'],
+               result['peak_kb'],
+               result['rss_kb'],
+               result['rss_delta']))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,122 @@
+#!/usr/bin/env python3
+"""
+Micro-benchmark ``fuzzy_list_range()`` against the exhaustive scan which it
+used to do, for a range of input lengths.
+
+Both are checked to give back the same answers as they go.
+"""
+
+from   fuzzywuzzy import fuzz
+
+import argparse
+import random
+import sys
+import time
+
+sys.path[0] += '/../..'
+
+from dexter.core.util import fuzzy_list_range, _as_word
+
+# ------------------------------------------------------------------------------
+
+# What we look for
+_PHRASES = (
+    ('set', 'a', 'timer', 'for'),
+    ('whats', 'the', 'weather'),
+    ('play', 'next', 'song'),
+    ('turn', 'on'),
+    ('what', 'is', 'the', 'meaning', 'of'),
+)
+
+# The words which we build utterances out of
+_VOCABULARY = (
+    "the a and to of in is it you that he was for on are with as his they be "
+    "at one have this from or had by hot word but what some we can out other "
+    "were all there when up use your how said an each she which do their time "
+    "if will way about many then them write would like so these her long make "
+    "thing see him two has look more day could go come did number sound no "
+    "most people my over know water than call first who may down side been now "
+    "find set timer weather play song turn meaning whats next"
+).split()
+
+# ------------------------------------------------------------------------------
+
+def _exhaustive(list_, sublist, threshold=80):
+    """
+    The original implementation, which scores every slice.
+    """
+    subwords = tuple(_as_word(e, True) for e in sublist)
+    words    = tuple(_as_word(e, True) for e in list_  )
+    best = None
+    if len(words) == 1:
+        query = subwords[0]
+        if query in words:
+            return (0, 1, 100)
+        for (index, entry) in enumerate(words):
+            score = fuzz.ratio(query, entry)
+            if score >= threshold and (best is None or best[2] < score):
+                best = (index, len(words), score)
+    else:
+        query = ' '.join(subwords)
+        for s in range(len(words)):
+            for e in range(s + 1, len(words) + 1):
+                score = fuzz.ratio(query, ' '.join(words[s:e]))
+                if score >= threshold and (best is None or best[2] < score):
+                    best = (s, e, score)
+    if best is None:
+        raise ValueError("Not found")
+    return best
+
+
+def _run(fn, utterances):
+    """
+    Run the function over all the utterances and phrases, giving back the
+    results and how long it took.
+    """
+    results = []
+    start = time.perf_counter()
+    for words in utterances:
+        for phrase in _PHRASES:
+            try:
+                results.append(fn(words, phrase))
+            except ValueError:
+                results.append(None)
+    return (results, time.perf_counter() - start)
+
+
+def main():
+    parser = argparse.ArgumentParser(description='fuzzy_list_range() benchmark.')
+    parser.add_argument('--lengths', default='5,20,60',
+                        help='Comma-separated utterance lengths, in words')
+    parser.add_argument('--count', type=int, default=50,
+                        help='The number of utterances of each length')
+    args = parser.parse_args()
+
+    rng = random.Random(42)
+    print("%6s %16s %16s %8s" %
+          ('words', 'exhaustive ms', 'bounded ms', 'speedup'))
+    for length in (int(l) for l in args.lengths.split(',')):
+        # Create some utterances, with one of the phrases embedded in each
+        utterances = []
+        for _ in range(args.count):
+            words = [rng.choice(_VOCABULARY) for _ in range(length)]
+            phrase = rng.choice(_PHRASES)
+            index = rng.randint(0, max(0, length - len(phrase)))
+            words[index:index + len(phrase)] = phrase
+            utterances.append(words[:length])
+
+        (expected, exhaustive) = _run(_exhaustive,       utterances)
+        (actual,   bounded   ) = _run(fuzzy_list_range, utterances)
+        if expected != actual:
+            raise ValueError("Results differ for %d words" % length)
+
+        calls = len(utterances) * len(_PHRASES)
+        print("%6d %16.3f %16.3f %7.1fx" %
+              (length,
+               exhaustive / calls * 1000,
+               bounded    / calls * 1000,
+               exhaustive / bounded))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,172 @@
+#!/usr/bin/env python3
+"""
+Benchmark looking things up in a ``MusicIndex``, scoring every key against the
+query (what ``lookup()`` used to do) versus only scoring the candidates which
+the trigram index picks out.
+
+The index is filled with made-up songs, and the queries are a mix of ones which
+match something exactly, ones with typos, ones with only part of a key, ones
+with the words shuffled about, and ones which match nothing much at all. For
+each we check whether the trigram lookup found a key with the same score as the
+one which scoring everything found, which is what matters to the caller.
+"""
+
+from   fuzzywuzzy import process
+
+import argparse
+import random
+import sys
+import time
+import tracemalloc
+
+sys.path[0] += '/../..'
+
+from dexter.core.media_index import AudioEntry, MusicIndex, _TrigramIndex
+
+# ------------------------------------------------------------------------------
+
+_WORDS = (
+    'love', 'night', 'heart', 'baby', 'time', 'dream', 'fire', 'rain', 'blue',
+    'dance', 'road', 'summer', 'girl', 'boy', 'world', 'light', 'home', 'soul',
+    'river', 'moon', 'star', 'gold', 'city', 'wild', 'free', 'young', 'run',
+    'sweet', 'cold', 'shadow', 'angel', 'devil', 'ocean', 'sky', 'train',
+    'highway', 'midnight', 'paradise', 'thunder', 'electric', 'crazy', 'little',
+    'broken', 'forever', 'tonight', 'yesterday', 'tomorrow', 'rock', 'roll',
+    'kiss', 'lonely', 'magic', 'radio', 'queen', 'king', 'black', 'white',
+    'silver', 'diamond', 'memory', 'whisper', 'storm', 'garden', 'window',
+)
+
+# ------------------------------------------------------------------------------
+
+def _phrase(rng, low, high):
+    """
+    Make up a title.
+    """
+    return ' '.join(rng.choice(_WORDS)
+                    for _ in range(rng.randint(low, high))).title()
+
+
+def _populate(size):
+    """
+    Create an index with the given number of songs in it.
+    """
+    rng     = random.Random(size)
+    artists = [_phrase(rng, 1, 3) for _ in range(max(1, size // 100))]
+    albums  = [_phrase(rng, 1, 4) for _ in range(max(1, size // 10))]
+    entries = [AudioEntry(_phrase(rng, 1, 5),
+                          'file:///music/%d.mp3' % i,
+                          'mp3',
+                          i % 12 + 1,
+                          rng.choice(albums),
+                          rng.choice(artists))
+               for i in range(size)]
+
+    index = MusicIndex()
+    index._add_entries(entries)
+    return index
+
+
+def _typo(rng, string):
+    """
+    Mangle a character in a string.
+    """
+    if len(string) < 2:
+        return string
+    i = rng.randrange(len(string))
+    return string[:i] + rng.choice('abcdefghijklmnopqrstuvwxyz') + string[i + 1:]
+
+
+def _queries(index, count):
+    """
+    Come up with some queries for the index's names.
+    """
+    rng   = random.Random(count)
+    names = list(index._by_name.keys())
+    kinds = {
+        'exact'    : lambda name: name,
+        'typo'     : lambda name: _typo(rng, _typo(rng, name)),
+        'partial'  : lambda name: ' '.join(name.split()[:2]),
+        'reordered': lambda name: ' '.join(reversed(name.split())),
+        'garbage'  : lambda name: _phrase(rng, 1, 3) + ' zyxxy',
+    }
+    return [(kind, fn(rng.choice(names)))
+            for kind in kinds
+            for fn in (kinds[kind],)
+            for _ in range(count // len(kinds))]
+
+
+def _full(index, query):
+    """
+    What ``lookup()`` used to do.
+    """
+    return process.extractOne(query, index._by_name.keys())
+
+
+def _trigram(index, query):
+    """
+    What ``lookup()`` does now.
+    """
+    return index._find(query, index._by_name, index._name_grams, 1)[0]
+
+
+def _time(fn, index, queries):
+    """
+    Run the queries, giving back the results and the mean time per query in
+    milliseconds.
+    """
+    start   = time.perf_counter()
+    results = [fn(index, query) for (_, query) in queries]
+    return (results, (time.perf_counter() - start) / len(queries) * 1000)
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Music index lookup benchmark.')
+    parser.add_argument('--sizes', default='1000,10000,100000',
+                        help='Comma-separated numbers of songs to try')
+    parser.add_argument('--queries', type=int, default=100,
+                        help='How many queries to make of each index')
+    args = parser.parse_args()
+
+    print("%8s %8s %10s %10s %8s %9s %10s" %
+          ('songs', 'keys', 'full ms', 'tri ms', 'speedup', 'agree', 'grams MiB'))
+    disagreements = {}
+    for size in [int(s) for s in args.sizes.split(',')]:
+        index = _populate(size)
+
+        # How much the trigrams for the names cost us
+        tracemalloc.start()
+        grams = _TrigramIndex()
+        for key in index._by_name:
+            grams.add(key)
+        (memory, _) = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+        del grams
+
+        queries = _queries(index, args.queries)
+        (full,    full_ms)    = _time(_full,    index, queries)
+        (trigram, trigram_ms) = _time(_trigram, index, queries)
+
+        agree = 0
+        for ((kind, _), f, t) in zip(queries, full, trigram):
+            if f[1] == t[1]:
+                agree += 1
+            else:
+                disagreements[kind] = disagreements.get(kind, 0) + 1
+        print("%8d %8d %10.2f %10.2f %7.1fx %4d/%-4d %10.1f" %
+              (size,
+               len(index._by_name),
+               full_ms,
+               trigram_ms,
+               full_ms / trigram_ms,
+               agree,
+               len(queries),
+               memory / 1024 / 1024))
+
+    if disagreements:
+        print()
+        print("Disagreements by query kind: %s" %
+              ', '.join('%s=%d' % item for item in sorted(disagreements.items())))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,135 @@
+#!/usr/bin/env python3
+"""
+Measure how much memory a ``MusicIndex`` takes up for a given number of tracks.
+
+Each size is run in its own process so that the RSS figures are not muddled
+together. The tracks' strings are all created afresh, as they would be when
+they are read from the files' tags or from the index's cache, so that any
+sharing of them is down to the index and not to this script.
+
+The RSS is read from ``/proc``, so this only works on Linux.
+"""
+
+import argparse
+import gc
+import json
+import os
+import random
+import subprocess
+import sys
+import time
+
+sys.path[0] += '/../..'
+
+from dexter.core.media_index import AudioEntry, MusicIndex
+
+# ------------------------------------------------------------------------------
+
+_WORDS = (
+    'love', 'night', 'heart', 'baby', 'time', 'dream', 'fire', 'rain', 'blue',
+    'dance', 'road', 'summer', 'girl', 'boy', 'world', 'light', 'home', 'soul',
+    'river', 'moon', 'star', 'gold', 'city', 'wild', 'free', 'young', 'run',
+    'sweet', 'cold', 'shadow', 'angel', 'devil', 'ocean', 'sky', 'train',
+)
+
+# How many tracks we add at a time
+_BATCH_SIZE = 1000
+
+# ------------------------------------------------------------------------------
+
+def _rss_kb():
+    """
+    Get our current resident set size, in KiB.
+    """
+    with open('/proc/self/statm') as fh:
+        pages = int(fh.read().split()[1])
+    return pages * os.sysconf('SC_PAGE_SIZE') // 1024
+
+
+def _phrase(rng, low, high):
+    """
+    Make up a title.
+    """
+    return ' '.join(rng.choice(_WORDS)
+                    for _ in range(rng.randint(low, high))).title()
+
+
+def _entries(size):
+    """
+    Generate the given number of tracks, about ten to an album and a hundred to
+    an artist.
+    """
+    rng     = random.Random(size)
+    artists = [_phrase(rng, 1, 3) for _ in range(max(1, size // 100))]
+    albums  = [(_phrase(rng, 1, 4), rng.choice(artists))
+               for _ in range(max(1, size // 10))]
+    for i in range(size):
+        (album, artist) = rng.choice(albums)
+        yield AudioEntry(_phrase(rng, 1, 5),
+                         'file:///music/%s/%s/%02d.mp3' % (artist, album, i),
+                         'mp3'.encode().decode(),
+                         '%d' % (i % 12 + 1,),
+                         album .encode().decode(),
+                         artist.encode().decode())
+
+
+def _measure(size):
+    """
+    Build an index of the given size and print the results as JSON.
+    """
+    # Warm up so that the import costs etc. are out of the way
+    index = MusicIndex()
+    index._add_entries(_entries(10))
+    index = MusicIndex()
+    gc.collect()
+
+    before = _rss_kb()
+    start  = time.perf_counter()
+    batch  = []
+    for entry in _entries(size):
+        batch.append(entry)
+        if len(batch) >= _BATCH_SIZE:
+            index._add_entries(batch)
+            batch = []
+    index._add_entries(batch)
+    elapsed = time.perf_counter() - start
+    gc.collect()
+    after = _rss_kb()
+
+    print(json.dumps({
+        'size'     : size,
+        'seconds'  : elapsed,
+        'rss_kb'   : after,
+        'rss_delta': after - before,
+    }))
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Music index memory usage.')
+    parser.add_argument('--sizes', default='10000,100000,200000',
+                        help='Comma-separated numbers of tracks to try')
+    parser.add_argument('--size', type=int,
+                        help='Just measure the given number of tracks')
+    args = parser.parse_args()
+
+    if args.size is not None:
+        _measure(args.size)
+        return
+
+    print("%8s %10s %10s %14s %12s" %
+          ('tracks', 'seconds', 'RSS KiB', 'RSS growth KiB', 'bytes/track'))
+    for size in [int(s) for s in args.sizes.split(',')]:
+        output = subprocess.check_output((sys.executable,
+                                          sys.argv[0],
+                                          '--size', str(size)))
+        result = json.loads(output)
+        print("%8d %10.2f %10d %14d %12d" %
+              (result['size'],
+               result['seconds'],
+               result['rss_kb'],
+               result['rss_delta'],
+               result['rss_delta'] * 1024 // result['size']))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,155 @@
+#!/usr/bin/env python3
+"""
+Stress a ``MusicIndex`` by looking things up in it while it is being built, in
+the same way as happens when someone asks for a song while the library is still
+being indexed.
+
+A writer thread adds made-up tracks in batches, the same size as the ones which
+``FileMusicIndex`` uses, while a number of reader threads look up the names of
+tracks as fast as they can. We report how long the writer's batches took (which
+is where it would have been held up by lookups) and how long the lookups took,
+and check that nothing went wrong along the way and that everything can be
+found at the end.
+"""
+
+from   threading import Event, Thread
+
+import argparse
+import numpy
+import random
+import sys
+import time
+
+sys.path[0] += '/../..'
+
+from dexter.core.media_index import AudioEntry, MusicIndex
+
+# ------------------------------------------------------------------------------
+
+_WORDS = (
+    'love', 'night', 'heart', 'baby', 'time', 'dream', 'fire', 'rain', 'blue',
+    'dance', 'road', 'summer', 'girl', 'boy', 'world', 'light', 'home', 'soul',
+    'river', 'moon', 'star', 'gold', 'city', 'wild', 'free', 'young', 'run',
+    'sweet', 'cold', 'shadow', 'angel', 'devil', 'ocean', 'sky', 'train',
+)
+
+# ------------------------------------------------------------------------------
+
+def _entries(size):
+    """
+    Make up the given number of tracks. Each has a unique name so that we can
+    tell whether we found the right one.
+    """
+    rng     = random.Random(size)
+    phrase  = lambda low, high: ' '.join(rng.choice(_WORDS)
+                                         for _ in range(rng.randint(low, high)))
+    artists = [phrase(1, 3) for _ in range(max(1, size // 100))]
+    albums  = [phrase(1, 4) for _ in range(max(1, size // 10))]
+    return [AudioEntry('%s %d' % (phrase(1, 4), i),
+                       'file:///music/%d.mp3' % i,
+                       'mp3',
+                       i % 12 + 1,
+                       rng.choice(albums),
+                       rng.choice(artists))
+            for i in range(size)]
+
+
+def _write(index, entries, batch_size, started, timings):
+    """
+    Add the entries to the index in batches, timing each one.
+    """
+    for i in range(0, len(entries), batch_size):
+        start = time.perf_counter()
+        index._add_entries(entries[i:i + batch_size])
+        timings.append(time.perf_counter() - start)
+        started.set()
+    index._publish()
+
+
+def _read(index, entries, started, done, timings, errors):
+    """
+    Look up tracks, from when the index has something in it until we're told to
+    stop.
+    """
+    rng = random.Random()
+    started.wait()
+    while not done.is_set():
+        entry = rng.choice(entries)
+        try:
+            start = time.perf_counter()
+            index.lookup(name=entry.name, artist=entry.artist)
+            timings.append(time.perf_counter() - start)
+        except Exception as e:
+            errors.append(e)
+
+
+def _ms(timings):
+    """
+    The p50, p99 and max of the timings, in milliseconds.
+    """
+    if len(timings) == 0:
+        return (float('nan'),) * 3
+    return tuple(numpy.percentile(timings, (50, 99, 100)) * 1000)
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Music index stress test.')
+    parser.add_argument('--size', type=int, default=50000,
+                        help='How many tracks to add')
+    parser.add_argument('--readers', type=int, default=2,
+                        help='How many threads to do lookups in')
+    parser.add_argument('--batch-size', type=int, default=64,
+                        help='How many tracks to add at a time')
+    parser.add_argument('--check', type=int, default=200,
+                        help='How many tracks to look for once the index is built')
+    args = parser.parse_args()
+
+    entries = _entries(args.size)
+    index   = MusicIndex()
+
+    # Go!
+    started = Event()
+    done    = Event()
+    writes  = []
+    reads   = []
+    errors  = []
+    writer  = Thread(target=_write,
+                     args=(index, entries, args.batch_size, started, writes))
+    readers = [Thread(target=_read,
+                      args=(index, entries, started, done, reads, errors))
+               for _ in range(args.readers)]
+    start = time.perf_counter()
+    for reader in readers:
+        reader.daemon = True
+        reader.start()
+    writer.start()
+    writer.join()
+    elapsed = time.perf_counter() - start
+    done.set()
+    for reader in readers:
+        reader.join()
+
+    # Now everything should be there
+    missing = 0
+    for entry in random.Random(0).sample(entries, min(args.check, len(entries))):
+        if entry not in index.lookup(name=entry.name, artist=entry.artist)[:1]:
+            missing += 1
+
+    print("Added %d tracks in batches of %d in %0.1fs, with %d reader threads" %
+          (args.size, args.batch_size, elapsed, args.readers))
+    print()
+    print("%-8s %8s %10s %10s %10s" % ('', 'count', 'p50 ms', 'p99 ms', 'max ms'))
+    print("%-8s %8d %10.2f %10.2f %10.2f" % (('batches', len(writes)) + _ms(writes)))
+    print("%-8s %8d %10.2f %10.2f %10.2f" % (('lookups', len(reads )) + _ms(reads )))
+    print()
+    print("Lookup errors: %d" % (len(errors),))
+    for error in errors[:5]:
+        print("  %s" % (error,))
+    print("Not found after the build: %d of %d" %
+          (missing, min(args.check, len(entries))))
+    if errors or missing:
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,137 @@
+#!/usr/bin/env python3
+"""
+Replay a corpus of utterances through the stock services and measure how much
+time is spent evaluating them, along with how well the memoised word
+normalisers (``homonize()``, ``number_to_words()`` etc.) are doing.
+
+The first pass is run with empty caches and the later ones with warm caches.
+Services which can't be created on this machine (e.g. since their dependencies
+are not installed) are skipped.
+"""
+
+import argparse
+import logging
+import sys
+import time
+
+sys.path[0] += '/../..'
+
+from dexter.core      import Dexter
+from dexter.core.util import clear_normaliser_caches, normaliser_stats
+from dexter.test      import NOTIFIER, tokenise
+
+# ------------------------------------------------------------------------------
+
+# The services which we try to create, along with their kwargs
+_SERVICES = (
+    ('dexter.service.bespoke.BespokeService',        None),
+    ('dexter.service.chronos.ClockService',          None),
+    ('dexter.service.chronos.TimerService',          None),
+    ('dexter.service.chronos.AlarmService',          None),
+    ('dexter.service.dev.EchoService',               None),
+    ('dexter.service.fortune.FortuneService',        None),
+    ('dexter.service.language.SpellingService',      None),
+    ('dexter.service.language.DictionaryService',    None),
+    ('dexter.service.life.ShoppingListService',      None),
+    ('dexter.service.numeric.CalculatorService',     None),
+    ('dexter.service.purpleair.PurpleAirService',    {'sensor_id' : 1,
+                                                      'api_key'   : 'key'}),
+    ('dexter.service.randomness.RandomService',      None),
+    ('dexter.service.volume.VolumeService',          None),
+    ('dexter.service.weather.WeatherService',        {'coordinates' : '0,0'}),
+    ('dexter.service.wikiquery.WikipediaService',    None),
+    ('dexter.service.tplink_kasa.KasaService',       None),
+)
+
+# What people might say
+_CORPUS = (
+    "what's the time",
+    "what is the date",
+    "set a timer for 5 minutes",
+    "set a timer for two and a half hours",
+    "cancel the timer",
+    "set an alarm for 7 30 am",
+    "cancel alarm",
+    "what's the weather",
+    "what is the air quality index",
+    "what's the humidity",
+    "play the next song",
+    "turn on the kitchen lights",
+    "turn off the bedroom light",
+    "define serendipity",
+    "what is the meaning of life",
+    "what does ephemeral mean",
+    "how do you spell necessary",
+    "what is 42 times 17",
+    "what is the square root of 2",
+    "add two pints of milk to my shopping list",
+    "what's on my shopping list",
+    "pick a random number between 1 and 100",
+    "flip a coin",
+    "set volume to 5",
+    "tell me something",
+    "who is ada lovelace",
+    "open the pod bay doors",
+    "thank you",
+)
+
+# ------------------------------------------------------------------------------
+
+def main():
+    parser = argparse.ArgumentParser(description='Normaliser benchmark.')
+    parser.add_argument('--passes', type=int, default=5,
+                        help='How many passes to make over the corpus')
+    args = parser.parse_args()
+
+    # Keep the services quiet
+    logging.getLogger().setLevel(logging.WARNING)
+
+    # Create all the services which we can
+    services = []
+    for (classname, kwargs) in _SERVICES:
+        try:
+            service = Dexter._get_component(classname, kwargs, NOTIFIER)
+            service.start()
+            services.append(service)
+        except Exception as e:
+            print("Skipping %s: %s" % (classname, e))
+    print("Using %d services: %s" %
+          (len(services), ', '.join(str(s) for s in services)))
+    print()
+
+    # Now replay the corpus
+    utterances = [tokenise(u.replace("'", '')) for u in _CORPUS]
+    clear_normaliser_caches()
+    print("%5s %14s %8s %8s" % ('pass', 'ms/utterance', 'hits', 'misses'))
+    for index in range(args.passes):
+        start = time.perf_counter()
+        for tokens in utterances:
+            for service in services:
+                try:
+                    service.evaluate(tokens)
+                except Exception:
+                    pass
+        elapsed = time.perf_counter() - start
+
+        stats  = normaliser_stats().values()
+        hits   = sum(s['hits']   for s in stats)
+        misses = sum(s['misses'] for s in stats)
+        print("%5d %14.3f %8d %8d" %
+              (index + 1, elapsed / len(utterances) * 1000, hits, misses))
+
+    # Say how each function did
+    print()
+    print("%-20s %8s %8s %8s" % ('function', 'hits', 'misses', 'size'))
+    for (name, stats) in sorted(normaliser_stats().items()):
+        print("%-20s %8d %8d %8d" %
+              (name, stats['hits'], stats['misses'], stats['size']))
+
+    for service in services:
+        try:
+            service.stop()
+        except Exception:
+            pass
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,132 @@
+#!/usr/bin/env python3
+"""
+Benchmark the per-utterance cost of matching services' trigger phrases, using
+``fuzzy_list_range()`` directly versus using the shared ``PhraseIndex``.
+
+Each simulated service has a handful of trigger phrases, in the same way that
+the stock services do, and we time how long it takes for all of the services to
+check all of their phrases against an utterance.
+"""
+
+import argparse
+import random
+import sys
+import time
+
+sys.path[0] += '/../..'
+
+from dexter.core.util import PhraseIndex, fuzzy_list_range
+
+# ------------------------------------------------------------------------------
+
+# Some representative phrases, taken from the stock services
+_PHRASES = (
+    ('set', 'a', 'timer', 'for'),
+    ('cancel', 'timer'),
+    ('set', 'an', 'alarm', 'for'),
+    ('cancel', 'alarm'),
+    ('whats', 'the', 'weather'),
+    ('what', 'is', 'the', 'air', 'quality', 'index'),
+    ('whats', 'the', 'humidity'),
+    ('play', 'next', 'song'),
+    ('skip', 'backwards', 'a', 'song'),
+    ('whats', 'this', 'song'),
+    ('turn', 'on'),
+    ('turn', 'off'),
+    ('define',),
+    ('what', 'is', 'the', 'meaning', 'of'),
+    ('format', 'c', 'colon'),
+    ('open', 'pod', 'bay', 'doors'),
+    ('have', 'you', 'seen', 'my', 'keys'),
+    ('go', 'to', 'sleep'),
+)
+
+# What people might say
+_UTTERANCES = (
+    "set a timer for five minutes",
+    "what's the weather like tomorrow",
+    "play the next song",
+    "turn on the kitchen lights",
+    "what is the meaning of life",
+    "cancel the timer",
+    "play captain underpants by weird al",
+    "what is the air quality index outside right now",
+)
+
+# ------------------------------------------------------------------------------
+
+def _services(count, per_service):
+    """
+    Create the phrases for the given number of services.
+    """
+    rng = random.Random(count)
+    return [tuple(rng.choice(_PHRASES) for _ in range(per_service))
+            for _ in range(count)]
+
+
+def _time(fn, repeats):
+    """
+    Time how long the function takes per call, in milliseconds.
+    """
+    start = time.perf_counter()
+    for _ in range(repeats):
+        fn()
+    return (time.perf_counter() - start) / repeats * 1000
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Phrase matching benchmark.')
+    parser.add_argument('--services', default='1,2,5,10,20,40',
+                        help='Comma-separated numbers of services to try')
+    parser.add_argument('--phrases', type=int, default=3,
+                        help='The number of phrases per service')
+    parser.add_argument('--repeats', type=int, default=5,
+                        help='How many times to repeat each measurement')
+    args = parser.parse_args()
+
+    utterances = [u.replace("'", '').split() for u in _UTTERANCES]
+
+    print("%8s %8s %14s %14s %8s" %
+          ('services', 'phrases', 'direct ms/utt', 'index ms/utt', 'speedup'))
+    for count in (int(c) for c in args.services.split(',')):
+        services = _services(count, args.phrases)
+
+        # The old way, where every service calls fuzzy_list_range() for each of
+        # its phrases
+        def direct():
+            for words in utterances:
+                for phrases in services:
+                    for phrase in phrases:
+                        try:
+                            fuzzy_list_range(words, phrase)
+                        except ValueError:
+                            pass
+
+        # The new way, where the phrases are registered once and the first
+        # lookup for an utterance matches all of them. We use a fresh index
+        # each time so that we don't just measure the cache.
+        def indexed():
+            index = PhraseIndex()
+            for phrases in services:
+                for phrase in phrases:
+                    index.register(phrase)
+            for words in utterances:
+                for phrases in services:
+                    for phrase in phrases:
+                        try:
+                            index.find(words, phrase)
+                        except ValueError:
+                            pass
+
+        direct_ms  = _time(direct,  args.repeats) / len(utterances)
+        indexed_ms = _time(indexed, args.repeats) / len(utterances)
+        print("%8d %8d %14.3f %14.3f %7.1fx" %
+              (count,
+               count * args.phrases,
+               direct_ms,
+               indexed_ms,
+               direct_ms / indexed_ms))
+
+
+if __name__ == "__main__":
+    main()
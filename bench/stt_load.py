@@ -0,0 +1,217 @@
+#!/usr/bin/env python3
+"""
+Generate load against a speech-to-text server, like ``whisper_server.py``, and
+measure its throughput and latency.
+
+A number of clients talk to the server at the same time, each sending it
+utterances one after the other. The latency is the time from the client saying
+that an utterance has ended to it getting the result back, which is what the
+user ends up waiting for.
+"""
+
+from   threading import Barrier, Thread
+
+import argparse
+import numpy
+import socket
+import sys
+import time
+import wave
+
+sys.path[0] += '/../..'
+
+from dexter.stt_server import (DATA, END, ERROR, FRAME, HEADER, LENGTH, RESULT,
+                               START, V2_HELLO)
+
+# ------------------------------------------------------------------------------
+
+_RATE     = 16000
+_WIDTH    = 2
+_CHANNELS = 1
+
+# ------------------------------------------------------------------------------
+
+def _read(conn, count):
+    """
+    Read exactly the given number of bytes from the connection.
+    """
+    chunks = []
+    while count > 0:
+        got = conn.recv(count)
+        if len(got) == 0:
+            raise EOFError("EOF in recv()")
+        chunks.append(got)
+        count -= len(got)
+    return b''.join(chunks)
+
+
+def _load_audio(wav, seconds):
+    """
+    Get the audio to send, either from a file or made up.
+    """
+    if wav is not None:
+        with wave.open(wav, 'rb') as fh:
+            if (fh.getframerate() != _RATE         or
+                fh.getsampwidth() != _WIDTH        or
+                fh.getnchannels() != _CHANNELS):
+                raise ValueError("Need %dHz, %d byte, %d channel audio" %
+                                 (_RATE, _WIDTH, _CHANNELS))
+            return fh.readframes(fh.getnframes())
+
+    # A quiet room with a hum in it
+    rng = numpy.random.default_rng(1)
+    t   = numpy.arange(int(seconds * _RATE)) / _RATE
+    audio = rng.normal(0, 100, len(t)) + 1000 * numpy.sin(2 * numpy.pi * 220 * t)
+    return audio.astype(numpy.int16).tobytes()
+
+
+def _chunks(audio, chunk_secs):
+    """
+    Break the audio up into the chunks which a client would send.
+    """
+    size = int(chunk_secs * _RATE) * _WIDTH * _CHANNELS
+    return [audio[i:i + size] for i in range(0, len(audio), size)]
+
+
+def _client_v1(host, port, chunks, count, pace, barrier, latencies, errors):
+    """
+    Send utterances using protocol version 1, a connection per utterance.
+    """
+    barrier.wait()
+    for _ in range(count):
+        try:
+            conn = socket.create_connection((host, port))
+            try:
+                conn.sendall(HEADER.pack(_CHANNELS, _WIDTH, _RATE))
+                for chunk in chunks:
+                    conn.sendall(LENGTH.pack(len(chunk)) + chunk)
+                    time.sleep(pace)
+                start = time.monotonic()
+                conn.sendall(LENGTH.pack(-1))
+                (length,) = LENGTH.unpack(_read(conn, LENGTH.size))
+                _read(conn, length)
+                latencies.append(time.monotonic() - start)
+            finally:
+                conn.close()
+        except Exception:
+            errors.append(1)
+
+
+def _client_v2(host, port, chunks, count, pace, barrier, latencies, errors):
+    """
+    Send utterances using protocol version 2, over one connection.
+    """
+    try:
+        conn = socket.create_connection((host, port))
+        conn.sendall(V2_HELLO)
+        if _read(conn, len(V2_HELLO)) != V2_HELLO:
+            raise ValueError("Server does not speak version 2")
+    except Exception:
+        errors.extend([1] * count)
+        barrier.wait()
+        return
+
+    barrier.wait()
+    uid = 0
+    try:
+        for uid in range(1, count + 1):
+            header = HEADER.pack(_CHANNELS, _WIDTH, _RATE)
+            conn.sendall(FRAME.pack(START, uid, len(header)) + header)
+            for chunk in chunks:
+                conn.sendall(FRAME.pack(DATA, uid, len(chunk)) + chunk)
+                time.sleep(pace)
+            start = time.monotonic()
+            conn.sendall(FRAME.pack(END, uid, 0))
+            while True:
+                (kind, got, length) = FRAME.unpack(_read(conn, FRAME.size))
+                _read(conn, length)
+                if got == uid and kind in (RESULT, ERROR):
+                    break
+            if kind == RESULT:
+                latencies.append(time.monotonic() - start)
+            else:
+                errors.append(1)
+    except Exception:
+        # Everything from here on is lost
+        errors.extend([1] * (count - uid + 1))
+    finally:
+        conn.close()
+
+
+def _run(host, port, protocol, clients, count, chunks, pace):
+    """
+    Run the given number of clients against the server.
+
+    :return: The latencies, the number of errors, and the elapsed time.
+    """
+    latencies = []
+    errors    = []
+    barrier   = Barrier(clients + 1)
+    target    = _client_v1 if protocol == 1 else _client_v2
+    threads   = [Thread(target=target,
+                        args=(host, port, chunks, count, pace,
+                              barrier, latencies, errors))
+                 for _ in range(clients)]
+    for thread in threads:
+        thread.daemon = True
+        thread.start()
+
+    # Go!
+    barrier.wait()
+    start = time.monotonic()
+    for thread in threads:
+        thread.join()
+    return (latencies, len(errors), time.monotonic() - start)
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Speech-to-text server load test.')
+    parser.add_argument('--host', default='localhost',
+                        help='The host which the server is on')
+    parser.add_argument('--port', type=int, default=8008,
+                        help='The port which the server is listening on')
+    parser.add_argument('--protocol', type=int, choices=(1, 2), default=2,
+                        help='The version of the protocol to speak')
+    parser.add_argument('--clients', default='1,2,4,8,16',
+                        help='The comma-separated numbers of clients to try')
+    parser.add_argument('--requests', type=int, default=10,
+                        help='How many utterances each client sends')
+    parser.add_argument('--seconds', type=float, default=3.0,
+                        help='The length of the made-up utterances')
+    parser.add_argument('--chunk-secs', type=float, default=0.2,
+                        help='The length of each chunk of audio sent')
+    parser.add_argument('--realtime', default=False, action='store_true',
+                        help='Send the audio as fast as it would be spoken')
+    parser.add_argument('--wav',
+                        help='A 16kHz, 16 bit, mono WAV file to send instead')
+    args = parser.parse_args()
+
+    chunks = _chunks(_load_audio(args.wav, args.seconds), args.chunk_secs)
+    print("Sending %d chunks per utterance to %s:%d with protocol version %d" %
+          (len(chunks), args.host, args.port, args.protocol))
+    print()
+    print("%8s %9s %7s %10s %10s %10s" %
+          ('clients', 'requests', 'errors', 'req/sec', 'p50 ms', 'p99 ms'))
+    for clients in [int(c) for c in args.clients.split(',')]:
+        (latencies, errors, elapsed) = _run(args.host,
+                                            args.port,
+                                            args.protocol,
+                                            clients,
+                                            args.requests,
+                                            chunks,
+                                            args.chunk_secs if args.realtime else 0)
+        if latencies:
+            (p50, p99) = numpy.percentile(latencies, (50, 99)) * 1000
+        else:
+            p50 = p99 = float('nan')
+        print("%8d %9d %7d %10.2f %10.1f %10.1f" %
+              (clients,
+               len(latencies),
+               errors,
+               len(latencies) / elapsed,
+               p50,
+               p99))
+
+
+if __name__ == "__main__":
+    main()
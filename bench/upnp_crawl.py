@@ -0,0 +1,229 @@
+#!/usr/bin/env python3
+"""
+Benchmark crawling a UPnP server's ContentDirectory to build the music index,
+using a fake server so that no real one is needed.
+
+The fake server has a library laid out like Jellyfin's, with a folder per artist
+and album under ``Music/Songs`` plus one big flat folder of everything. Each
+browse takes a while, some fail at random, and browses which ask for too many
+children at once time out, like they can on real servers.
+
+A page size of 0 asks for all of a folder's children in one go. With one
+worker, that is how the index used to be built.
+"""
+
+from   didl_lite import didl_lite
+
+import argparse
+import random
+import sys
+import threading
+import time
+
+sys.path[0] += '/../..'
+
+from dexter.service.upnp import _UpnpMusicIndex
+
+# ------------------------------------------------------------------------------
+
+class _FakeContentDirectory:
+    """
+    Something which looks like a ContentDirectory service to the index.
+    """
+    def __init__(self, children, latency, item_secs, max_items, failures):
+        """
+        :param children:  The XML of the children of each object, by its ID.
+        :param latency:   How long each browse takes, in seconds.
+        :param item_secs: How much longer it takes for each child returned.
+        :param max_items: The most children which we can return before timing
+                          out.
+        :param failures:  The chance of any browse failing.
+        """
+        self._children  = children
+        self._latency   = latency
+        self._item_secs = item_secs
+        self._max_items = max_items
+        self._failures  = failures
+        self._rng       = random.Random(0)
+        self._lock      = threading.Lock()
+        self.browses    = 0
+
+
+    def Browse(self,
+               Filter,
+               ObjectID,
+               BrowseFlag,
+               StartingIndex,
+               RequestedCount,
+               SortCriteria):
+        with self._lock:
+            self.browses += 1
+            fail = self._rng.random() < self._failures
+
+        children = self._children.get(ObjectID, [])
+        start    = int(StartingIndex)
+        count    = int(RequestedCount)
+        if count <= 0:
+            count = len(children)
+        page = children[start:start + count]
+
+        time.sleep(self._latency + len(page) * self._item_secs)
+        if fail:
+            raise ConnectionError("Connection reset")
+        if len(page) > self._max_items:
+            raise TimeoutError("Timed out returning %d children" % len(page))
+
+        return {
+            'Result'        : _HEADER + ''.join(page) + _FOOTER,
+            'NumberReturned': str(len(page)),
+            'TotalMatches'  : str(len(children)),
+            'UpdateID'      : '1',
+        }
+
+
+class _FakeDevice:
+    """
+    Something which looks like a UPnP device to the index.
+    """
+    def __init__(self, content_directory):
+        self.friendly_name    = 'Fake'
+        self.ContentDirectory = content_directory
+
+
+    def __str__(self):
+        return self.friendly_name
+
+# ------------------------------------------------------------------------------
+
+# The wrapping of each browse's result
+_HEADER = None
+_FOOTER = '</DIDL-Lite>'
+
+# ------------------------------------------------------------------------------
+
+def _render(obj):
+    """
+    Render a DIDL object as XML, without the wrapping.
+    """
+    global _HEADER
+    xml = didl_lite.to_xml_string(obj).decode()
+    end = xml.index('>') + 1
+    _HEADER = xml[:end]
+    return xml[end:-len(_FOOTER)]
+
+
+def _library(artists, albums, tracks):
+    """
+    Create the XML for the children of everything in the fake library.
+
+    :return: The children, and the number of distinct tracks.
+    """
+    children = {}
+    ids      = iter(range(1, 1 << 30))
+
+    def folder(parent_id, title):
+        id_ = str(next(ids))
+        children.setdefault(parent_id, []).append(
+            _render(didl_lite.StorageFolder(id          =id_,
+                                            parent_id   =parent_id,
+                                            title       =title,
+                                            restricted  ='1',
+                                            storage_used='-1'))
+        )
+        return id_
+
+    def track(parent_id, title, artist, album, number):
+        id_ = str(next(ids))
+        res = didl_lite.Resource(uri          ='http://fake/%s.mp3' % id_,
+                                 protocol_info='http-get:*:audio/mpeg:*')
+        children.setdefault(parent_id, []).append(
+            _render(didl_lite.MusicTrack(id                   =id_,
+                                         parent_id            =parent_id,
+                                         title                =title,
+                                         restricted           ='1',
+                                         artist               =artist,
+                                         album                =album,
+                                         original_track_number=str(number),
+                                         res                  =[res]))
+        )
+
+    music  = folder('0',   'Music')
+    latest = folder(music, 'Latest')
+    songs  = folder(music, 'Songs')
+    every  = folder(songs, 'All')
+    count  = 0
+    for a in range(artists):
+        artist    = 'Artist %d' % a
+        artist_id = folder(songs, artist)
+        for b in range(albums):
+            album    = 'Album %d-%d' % (a, b)
+            album_id = folder(artist_id, album)
+            for t in range(tracks):
+                title = 'Song %d-%d-%d' % (a, b, t)
+                track(album_id, title, artist, album, t + 1)
+                track(every,    title, artist, album, t + 1)
+                if count < 50:
+                    track(latest, title, artist, album, t + 1)
+                count += 1
+    return (children, count)
+
+
+def main():
+    parser = argparse.ArgumentParser(description='UPnP crawl benchmark.')
+    parser.add_argument('--artists', type=int, default=100,
+                        help='How many artists there are')
+    parser.add_argument('--albums', type=int, default=5,
+                        help='How many albums each artist has')
+    parser.add_argument('--tracks', type=int, default=10,
+                        help='How many tracks each album has')
+    parser.add_argument('--latency', type=float, default=0.02,
+                        help='How long each browse takes, in seconds')
+    parser.add_argument('--item-secs', type=float, default=0.0002,
+                        help='How much longer each child returned takes')
+    parser.add_argument('--max-items', type=int, default=2000,
+                        help='How many children a browse can return before '
+                             'timing out')
+    parser.add_argument('--failures', type=float, default=0.02,
+                        help='The chance of any browse failing')
+    parser.add_argument('--retry-delay', type=float, default=0.05,
+                        help='How long to wait before retrying, in seconds')
+    parser.add_argument('--runs', default='1:0,1:200,4:200,8:200,16:200',
+                        help='Comma-separated workers:page_size pairs to try')
+    args = parser.parse_args()
+
+    (children, count) = _library(args.artists, args.albums, args.tracks)
+    print("Library of %d tracks, each in its album's folder and in one big one, "
+          "with %0.0fms per browse" %
+          (count, args.latency * 1000))
+    print()
+    print("%8s %6s %10s %9s %10s %9s" %
+          ('workers', 'page', 'seconds', 'browses', 'gave up', 'entries'))
+    for run in args.runs.split(','):
+        (workers, page_size) = (int(value) for value in run.split(':'))
+        directory = _FakeContentDirectory(children,
+                                          args.latency,
+                                          args.item_secs,
+                                          args.max_items,
+                                          args.failures)
+        index = _UpnpMusicIndex(_FakeDevice(directory),
+                                ['*/Songs/*'],
+                                workers=workers)
+        index._PAGE_SIZE   = page_size
+        index._RETRY_DELAY = args.retry_delay
+
+        start = time.perf_counter()
+        (_, failures) = index._crawl()
+        index._publish()
+        elapsed = time.perf_counter() - start
+
+        print("%8d %6d %10.2f %9d %10d %9d" %
+              (workers,
+               page_size,
+               elapsed,
+               directory.browses,
+               failures,
+               len(index)))
+
+
+if __name__ == "__main__":
+    main()
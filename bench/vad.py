@@ -0,0 +1,201 @@
+#!/usr/bin/env python3
+"""
+Measure the CPU cost, and the detection latency, of the voice activity
+detectors which ``AudioInput`` uses.
+
+The audio is synthesised: a noisy room with bursts of voice-like sound in it.
+The level detector is also checked against the numpy-based version which
+``AudioInput._run()`` used to have, since they should make the same decisions.
+"""
+
+from   collections import deque
+
+import argparse
+import audioop
+import logging
+import numpy
+import sys
+import time
+
+sys.path[0] += '/../..'
+
+from dexter.core.vad import EnergyDetector, LevelDetector
+
+# ------------------------------------------------------------------------------
+
+_RATE     = 16000
+_WIDTH    = 2
+_CHANNELS = 1
+
+# ------------------------------------------------------------------------------
+
+class _Legacy(object):
+    """
+    What ``AudioInput._run()`` used to do, for comparison.
+    """
+    def __init__(self, read_rate, min_secs=2, max_secs=10):
+        self._level_buf = deque(maxlen=int(4.0 * read_rate))
+        self._avg_idx   = self._level_buf.maxlen // 3
+        self._min_secs  = min_secs
+        self._max_secs  = max_secs
+        self._talking   = None
+
+
+    def update(self, chunk, now):
+        level = abs(audioop.rms(chunk, _WIDTH))
+        self._level_buf.append(level)
+        if len(self._level_buf) != self._level_buf.maxlen:
+            return None
+
+        levels = numpy.array(self._level_buf)
+        if self._talking is None:
+            self._talking       = False
+            self._talking_start = 0
+
+        avg_idx     = self._avg_idx
+        from_levels = levels[        :-avg_idx]
+        to_levels   = levels[-avg_idx:        ]
+        from_median = numpy.sort(from_levels)[int(len(from_levels) * 0.5)]
+        to_median   = numpy.sort(to_levels  )[int(len(to_levels  ) * 0.5)]
+
+        if not self._talking:
+            if from_median * 2.0 < to_median:
+                self._talking       = True
+                self._talking_start = now
+                self._start_median  = from_median
+        else:
+            if (now - self._talking_start > self._min_secs and
+                (from_median > to_median * 1.5 or
+                 to_median < self._start_median * 1.1)):
+                self._talking = False
+
+        if self._talking and now - self._talking_start > self._max_secs:
+            self._talking = False
+
+        return self._talking
+
+
+def _synthesise(seconds, seed):
+    """
+    Create some audio with speech-like bursts in it.
+
+    :return: The audio, and a list of the (start, end) times of the bursts.
+    """
+    rng    = numpy.random.default_rng(seed)
+    count  = int(seconds * _RATE)
+    audio  = rng.normal(0, 150, count)
+    bursts = []
+
+    offset = 3.0
+    while True:
+        length = rng.uniform(2.5, 5.0)
+        if offset + length > seconds - 1:
+            break
+        bursts.append((offset, offset + length))
+
+        # A voice with a wandering pitch, broken up into syllables and words
+        start = int(offset * _RATE)
+        end   = int((offset + length) * _RATE)
+        t     = numpy.arange(end - start) / _RATE
+        f0    = rng.uniform(100, 220) * (1 + 0.1 * numpy.sin(2 * numpy.pi * t))
+        phase = 2 * numpy.pi * numpy.cumsum(f0) / _RATE
+        voice = sum(numpy.sin(h * phase) / h for h in range(1, 6))
+        sylls = numpy.abs(numpy.sin(2 * numpy.pi * 2.0 * t)) ** 0.5
+        words = (numpy.sin(2 * numpy.pi * 0.7 * t) > -0.9).astype(float)
+        audio[start:end] += rng.uniform(2000, 5000) * voice * sylls * words
+
+        offset += length + rng.uniform(3.0, 6.0)
+
+    audio = numpy.clip(audio, -32768, 32767).astype(numpy.int16)
+    return (audio.tobytes(), bursts)
+
+
+def _run(detector, chunks, chunk_secs):
+    """
+    Feed the chunks through the detector.
+
+    :return: The decisions, the CPU time taken, and the (start, end) times of
+             what was detected.
+    """
+    decisions = []
+    spans     = []
+    talking   = False
+    start     = time.process_time()
+    for (index, chunk) in enumerate(chunks):
+        now      = (index + 1) * chunk_secs
+        decision = detector.update(chunk, now)
+        decisions.append(decision)
+        if decision and not talking:
+            spans.append([now, None])
+        elif talking and not decision:
+            spans[-1][1] = now
+        talking = bool(decision)
+    elapsed = time.process_time() - start
+    return (decisions, elapsed, spans)
+
+
+def _latencies(bursts, spans):
+    """
+    Match up what was detected with the bursts and say how late we were.
+    """
+    starts = []
+    ends   = []
+    for (b_start, b_end) in bursts:
+        for (s_start, s_end) in spans:
+            if s_end is not None and b_start <= s_start < b_end:
+                starts.append(s_start - b_start)
+                ends  .append(s_end   - b_end  )
+                break
+    return (starts, ends)
+
+
+def main():
+    parser = argparse.ArgumentParser(description='VAD benchmark.')
+    parser.add_argument('--seconds', type=float, default=600,
+                        help='How much audio to synthesise')
+    parser.add_argument('--chunk-secs', type=float, default=0.2,
+                        help='The length of each chunk of audio')
+    parser.add_argument('--seed', type=int, default=1,
+                        help='The random seed')
+    args = parser.parse_args()
+
+    # Keep the detectors quiet
+    logging.getLogger().setLevel(logging.WARNING)
+
+    (audio, bursts) = _synthesise(args.seconds, args.seed)
+    chunk_bytes = int(args.chunk_secs * _RATE) * _WIDTH
+    chunks      = [audio[i:i + chunk_bytes]
+                   for i in range(0, len(audio) - chunk_bytes + 1, chunk_bytes)]
+    read_rate   = 1.0 / args.chunk_secs
+    print("%0.0fs of audio in %d chunks with %d bursts of speech" %
+          (args.seconds, len(chunks), len(bursts)))
+    print()
+
+    detectors = (
+        ('legacy', _Legacy(read_rate)),
+        ('level',  LevelDetector(read_rate, _WIDTH)),
+        ('energy', EnergyDetector(read_rate, _WIDTH, _CHANNELS, _RATE)),
+    )
+    print("%-8s %12s %9s %14s %14s" %
+          ('mode', 'cpu ms/sec', 'detected', 'start latency', 'end latency'))
+    results = {}
+    for (name, detector) in detectors:
+        (decisions, elapsed, spans) = _run(detector, chunks, args.chunk_secs)
+        (starts, ends) = _latencies(bursts, spans)
+        results[name] = decisions
+        print("%-8s %12.4f %5d/%-3d %13.2fs %13.2fs" %
+              (name,
+               elapsed / args.seconds * 1000,
+               len(starts),
+               len(bursts),
+               numpy.mean(starts) if starts else float('nan'),
+               numpy.mean(ends)   if ends   else float('nan')))
+
+    if results['legacy'] != results['level']:
+        raise ValueError("Level detector disagrees with the legacy one")
+    print()
+    print("Level detector agrees with the legacy one")
+
+
+if __name__ == "__main__":
+    main()
@@ -2,23 +2,22 @@
 The heart of the system.
 """
 
+from   concurrent.futures   import ThreadPoolExecutor, TimeoutError
 from   dexter.core.audio    import get_volume, set_volume
 from   dexter.core.event    import TimerEvent
 from   dexter.core.log      import LOG
+from   dexter.core.metrics  import Histogram, Timeline
 from   dexter.core.util     import (to_alphanumeric,
                                     to_letters,
                                     list_index,
                                     fuzzy_list_range)
-from   email.mime.text      import MIMEText
-from   email.mime.multipart import MIMEMultipart
 from   fuzzywuzzy.process   import fuzz
-from   threading            import Thread
+from   threading            import Event, Lock, Thread
 
 import heapq
+import json
 import os
 import queue
-import smtplib
-import ssl
 import sys
 import time
 import traceback
@@ -83,9 +82,20 @@ class Component(_Startable):
     """
     def __init__(self, state):
         super().__init__()
-        self._state      = state
-        self._status     = None
-        self._status_mod = 0
+        self._state         = state
+        self._status        = None
+        self._status_mod    = 0
+        self._startup_times = {}
+
+
+    @property
+    def startup_times(self):
+        """
+        How long, in seconds, each phase of this component's startup took, as a
+        dict keyed by the name of the phase. Components which do something slow
+        while being created, like loading a model, fill this in.
+        """
+        return dict(self._startup_times)
 
 
     @property
@@ -312,6 +322,10 @@ class Dexter(object):
     # The volume to set to when listening after being prompted by the keyphrase
     _LISTENING_VOLUME = 2
 
+    # How often to poll any inputs which do not push what they get to us, in
+    # seconds
+    _POLL_INTERVAL = 0.1
+
 
     @staticmethod
     def _get_notifier(full_classname, kwargs):
@@ -342,7 +356,23 @@ class Dexter(object):
 
 
     @staticmethod
-    def _get_component(full_classname, kwargs, notifier):
+    def _get_class(full_classname):
+        """
+        Import the given class.
+
+        :type  full_classname: str
+        :param full_classname:
+            The fully qualified classname, e.g. 'dexter.input.AnInput'
+        """
+        (module, classname) = full_classname.rsplit('.', 1)
+        globals = {}
+        exec('from %s import %s'  % (module, classname,), globals)
+        exec('klass = %s'         % (        classname,), globals)
+        return globals['klass']
+
+
+    @staticmethod
+    def _get_component(full_classname, kwargs, notifier, klass=None):
         """
         The the instance of the given L{Component}.
 
@@ -355,13 +385,13 @@ class Dexter(object):
         :type  notifier: L{Notifier}
         :param notifier:
             The notifier for the L{Component}.
+        :type  klass: type
+        :param klass:
+            The class, if it has already been imported.
         """
         try:
-            (module, classname) = full_classname.rsplit('.', 1)
-            globals = {}
-            exec('from %s import %s'  % (module, classname,), globals)
-            exec('klass = %s'         % (        classname,), globals)
-            klass = globals['klass']
+            if klass is None:
+                klass = Dexter._get_class(full_classname)
             if kwargs is None:
                 return klass(notifier)
             else:
@@ -392,6 +422,32 @@ class Dexter(object):
         return tuple(result)
 
 
+    @staticmethod
+    def _get_specs(config):
+        """
+        Get the components which the given configuration asks for.
+
+        :rtype: tuple
+        :return:
+            The ``(kind, classname, kwargs)`` tuples for the components, in
+            order.
+        """
+        components = config.get('components', {})
+        return tuple((kind, classname, kwargs)
+                     for kind in ('inputs', 'outputs', 'services')
+                     for (classname, kwargs) in components.get(kind, []))
+
+
+    @staticmethod
+    def _spec_key(spec):
+        """
+        Turn a component's spec into something which we can use to tell whether
+        two of them would create the same component.
+        """
+        (kind, classname, kwargs) = spec
+        return (kind, classname, json.dumps(kwargs, sort_keys=True, default=str))
+
+
     def __init__(self, config):
         """
         :type  config: configuration
@@ -409,20 +465,26 @@ class Dexter(object):
             for (classname, kwargs) in notifiers
         )
 
-        # Create the components, using our notifier
-        components = config.get('components', {})
-        self._inputs = [
-            Dexter._get_component(classname, kwargs, self._state)
-            for (classname, kwargs) in components.get('inputs', [])
-        ]
-        self._outputs = [
-            Dexter._get_component(classname, kwargs, self._state)
-            for (classname, kwargs) in components.get('outputs', [])
-        ]
-        self._services = [
-            Dexter._get_component(classname, kwargs, self._state)
-            for (classname, kwargs) in components.get('services', [])
-        ]
+        # When each component was imported, created and started
+        self._timeline = Timeline('Startup')
+
+        # Create the components, using our notifier. Many of these import big
+        # libraries and load models, which can take a while, so we can do this
+        # concurrently if we are asked to.
+        specs = Dexter._get_specs(config)
+        self._startup_workers = \
+            int(config.get('startup', {}).get('workers', 1))
+        created = self._create_components(specs, self._timeline)
+        self._inputs   = [c for (kind, c) in created if kind == 'inputs'  ]
+        self._outputs  = [c for (kind, c) in created if kind == 'outputs' ]
+        self._services = [c for (kind, c) in created if kind == 'services']
+
+        # What we created each of the components from, so that we can tell what
+        # has changed when the configuration is reloaded
+        self._config      = config
+        self._specs       = dict((c, Dexter._spec_key(spec))
+                                 for ((_, c), spec) in zip(created, specs))
+        self._reload_lock = Lock()
 
         # See if we have a GUI component
         gui = config.get('gui', None)
@@ -455,6 +517,12 @@ class Dexter(object):
         else:
             self._mailer = None
 
+        # See if we want to evaluate the services concurrently. The evaluator
+        # and its timeout are kept together so that they can be swapped out in
+        # one go by a reload.
+        self._evaluation = \
+            self._create_evaluator(config.get('evaluation', None))
+
         # When we last heard just the keyphrase on its own, in seconds since
         # epoch
         self._last_keyphrase_only = 0
@@ -463,6 +531,19 @@ class Dexter(object):
         self._events       = queue.Queue()
         self._timer_events = []
 
+        # Where the inputs push what they get, as (input, arrival_time, tokens,
+        # final) tuples. Any inputs which don't do that are polled instead.
+        self._input_queue   = queue.Queue()
+        self._polled_inputs = self._hook_up_inputs(self._inputs)
+
+        # How long it takes from something arriving at an input to our starting
+        # to handle it
+        self._input_latency = Histogram('Input latency', unit='s')
+
+        # What we speculatively worked out from the last partial input, as a
+        # tuple of the words and the handlers which the services gave for them
+        self._speculation = None
+
         # And we're off!
         self._running  = True
 
@@ -484,6 +565,43 @@ class Dexter(object):
         return self._state
 
 
+    @property
+    def startup_times(self):
+        """
+        How long, in seconds, each phase of startup took for each component. This
+        is a dict of dicts, keyed by the component and then by the phase.
+        """
+        return {component: dict(component.startup_times, **times)
+                for (component, times) in self._timeline.durations().items()
+                if isinstance(component, Component)}
+
+
+    @property
+    def startup_total(self):
+        """
+        How long, in seconds, each phase of startup took for the system as a
+        whole, as a dict keyed by the phase.
+        """
+        return self._timeline.totals()
+
+
+    @property
+    def startup_timeline(self):
+        """
+        The `Timeline` of the system's startup.
+        """
+        return self._timeline
+
+
+    @property
+    def input_latency(self):
+        """
+        The `Histogram` of the time between input arriving and our starting to
+        handle it, in seconds.
+        """
+        return self._input_latency
+
+
     def run(self):
         """
         Enter the event loop.
@@ -537,30 +655,58 @@ class Dexter(object):
                     except Exception as e:
                         LOG.error("Event %s raised exception: %s", event, e)
 
-                # Loop over all the inputs and see if they have anything pending
-                for input in self._inputs:
+                # Loop over any polled inputs and see if they have anything
+                # pending. Anything which they have goes onto the queue along
+                # with what the other inputs have pushed.
+                for input in self._polled_inputs:
                     # Attempt a read, this will return None if there's nothing
                     # available
                     tokens = input.read()
                     if tokens is not None:
-                        # Okay, we read something, attempt to handle it
-                        LOG.info("Read from %s: %s" %
-                                 (input, [str(t) for t in tokens]))
-                        result = self._handle(tokens)
+                        self._input_queue.put((input, time.time(), tokens, True))
 
-                        # If we got something back then give it back to the user
-                        if result is not None:
-                            # Send it to the outputs
-                            self._respond(result)
+                # Now block until something arrives, or until we next need to
+                # do something else
+                try:
+                    item = self._input_queue.get(timeout=self._get_timeout())
+                except queue.Empty:
+                    continue
+
+                # A None is just a wake-up call
+                if item is None:
+                    continue
+
+                # Anything from an input which has since been reloaded away is
+                # dropped
+                (input, arrival_time, tokens, final) = item
+                if input not in self._inputs:
+                    LOG.info("Dropping input from removed %s" % (input,))
+                    continue
+
+                # If this is only a partial result then we can get a head start
+                # on it, in case the final one is the same
+                if not final:
+                    LOG.debug("Partial from %s: %s" %
+                              (input, [str(t) for t in tokens]))
+                    self._speculate(tokens)
+                    continue
 
-                            # And remember what was said in case the user asks
-                            # for it to be repeated. We remember when we said it
-                            # so that someone doesn't come along much later and
-                            # ask for a repeat (which would be sketchy).
-                            self._last_response = (time.time(), result)
+                # Okay, we read something, attempt to handle it
+                self._input_latency.add(max(0.0, time.time() - arrival_time))
+                LOG.info("Read from %s: %s" %
+                         (input, [str(t) for t in tokens]))
+                result = self._handle(tokens)
 
-                # Wait for a bit before going around again
-                time.sleep(0.1)
+                # If we got something back then give it back to the user
+                if result is not None:
+                    # Send it to the outputs
+                    self._respond(result)
+
+                    # And remember what was said in case the user asks for it to
+                    # be repeated. We remember when we said it so that someone
+                    # doesn't come along much later and ask for a repeat (which
+                    # would be sketchy).
+                    self._last_response = (time.time(), result)
 
             except KeyboardInterrupt:
                 LOG.warning("KeyboardInterrupt received")
@@ -568,9 +714,224 @@ class Dexter(object):
 
         # We're out of the main loop, shut things down
         LOG.info("Stopping the system")
+        LOG.info("%s" % (self._input_latency,))
         self._stop()
 
 
+    def _get_timeout(self):
+        """
+        How long the main loop may block waiting for input before it needs to go
+        and do something else.
+
+        :rtype: float
+        :return:
+            The timeout in seconds, or ``None`` if we may wait forever.
+        """
+        # Any events which are already pending need handling right away
+        if not self._events.empty():
+            return 0.0
+
+        # We need to wake up for the next timer event
+        if len(self._timer_events) > 0:
+            timeout = max(0.0, self._timer_events[0].schedule_time - time.time())
+        else:
+            timeout = None
+
+        # And we need to go around to poll any inputs which need it
+        if len(self._polled_inputs) > 0:
+            if timeout is None or timeout > Dexter._POLL_INTERVAL:
+                timeout = Dexter._POLL_INTERVAL
+
+        return timeout
+
+
+    def reload(self, config):
+        """
+        Apply a new configuration to the running system.
+
+        Only the components whose class or kwargs have changed are touched. Any
+        new ones are created and started while the system carries on running,
+        and then the ones which have gone away are stopped. The others, along
+        with any models and indices which they have loaded, are kept as they
+        are. The key-phrases and the evaluation and startup settings are also
+        updated; changes to anything else, like the notifiers, need a restart.
+
+        If a new component won't start then it's dropped. When it was replacing
+        an old one of the same class, which might be holding onto something it
+        wants, like a port, then the old one is stopped and the new one is tried
+        again. If it still won't start then the old one is started back up, if
+        it can be, and is kept until the next reload.
+
+        New inputs are created after the running outputs and services have
+        imported whatever they use, like pygame. So ones which don't get on with
+        that, like Vosk, may not work when added this way, and need a restart.
+
+        This may take a while, and it should not be called from the main loop's
+        thread.
+
+        :type  config: configuration
+        :param config:
+            The new configuration for the system.
+        """
+        with self._reload_lock:
+            LOG.info("Reloading the configuration")
+            for section in ('notifiers', 'gui', 'email'):
+                if config.get(section) != self._config.get(section):
+                    LOG.warning("Changes to '%s' need a restart" % (section,))
+
+            # Work out what's what. Identical components are matched up in the
+            # order in which they were given.
+            specs   = Dexter._get_specs(config)
+            current = dict()
+            for component in self._inputs + self._outputs + self._services:
+                if component in self._specs:
+                    current.setdefault(self._specs[component], []).append(component)
+            wanted = [(spec, Dexter._spec_key(spec)) for spec in specs]
+            kept   = [current[key].pop(0) if current.get(key) else None
+                      for (spec, key) in wanted]
+            removed = [c for components in current.values() for c in components]
+            added   = [spec for ((spec, _), c) in zip(wanted, kept) if c is None]
+            LOG.info("Keeping %d components, removing %d and adding %d" %
+                     (len(kept) - len(added), len(removed), len(added)))
+
+            # Create the new components while the old ones are still doing their
+            # thing. If this fails then nothing has changed.
+            if 'pygame' in sys.modules and \
+               any(kind == 'inputs' for (kind, _, _) in added):
+                LOG.warning("Creating inputs after pygame has been imported; "
+                            "if they don't work then restart instead")
+            self._startup_workers = \
+                int(config.get('startup', {}).get('workers', 1))
+            timeline = Timeline('Reload')
+            created  = self._create_components(added, timeline)
+
+            # Start them while the old ones are still running, so that if any
+            # won't start then we still have what we had
+            fresh  = [component for (_, component) in created]
+            failed = self._start_components(fresh, timeline, fatal=False)
+
+            # A new one might have failed because the one which it's replacing
+            # is holding onto something which it wants, like a port. So stop
+            # that and try again, and, if it still won't go, have the old one
+            # back.
+            restored = dict()
+            for (index, old) in enumerate(self._predecessors(added, removed)):
+                if not failed[index] or old is None:
+                    continue
+                LOG.info("Retrying %s without %s" % (fresh[index], old))
+                fresh[index].stop()
+                self._stop_component(old)
+                failed[index] = \
+                    self._start_components((fresh[index],), timeline,
+                                           fatal=False)[0]
+                if failed[index]:
+                    try:
+                        LOG.warning("Restarting %s since %s failed to start" %
+                                    (old, fresh[index]))
+                        old.start()
+                        restored[index] = old
+                    except Exception as e:
+                        LOG.error("Failed to restart %s: %s" % (old, e))
+
+            # Now the new ones are going we can stop the old ones
+            removed = [c for c in removed if c not in restored.values()]
+            for component in removed:
+                if component.is_running:
+                    self._stop_component(component)
+                self._specs.pop(component, None)
+
+            # And put it all in place. We build new lists and assign them, rather
+            # than changing the old ones, so that anyone looking at them while we
+            # do so sees something consistent.
+            fresh      = iter(enumerate(zip(fresh, failed)))
+            components = {'inputs' : [], 'outputs' : [], 'services' : []}
+            for (spec, component) in zip(specs, kept):
+                if component is None:
+                    (index, (component, failed)) = next(fresh)
+                    if failed:
+                        component.stop()
+                        if index not in restored:
+                            continue
+                        component = restored[index]
+                    else:
+                        self._specs[component] = Dexter._spec_key(spec)
+                components[spec[0]].append(component)
+
+            # Anything which didn't come from the config, like the GUI's
+            # components, stays where it was
+            others = lambda components: [c for c in components
+                                         if c not in removed and
+                                            c not in self._specs]
+            inputs   = components['inputs'  ] + others(self._inputs  )
+            outputs  = components['outputs' ] + others(self._outputs )
+            services = components['services'] + others(self._services)
+
+            polled = self._hook_up_inputs([i for i in inputs
+                                           if i not in self._inputs])
+            polled.extend(i for i in self._polled_inputs if i in inputs)
+
+            self._key_phrases = tuple(Dexter._parse_key_phrase(p)
+                                      for p in config['key_phrases'])
+            (old_evaluator, _) = self._evaluation
+            self._evaluation = \
+                self._create_evaluator(config.get('evaluation', None),
+                                       len(services))
+            self._inputs        = inputs
+            self._outputs       = outputs
+            self._services      = services
+            self._polled_inputs = polled
+            self._speculation   = None
+            self._config        = config
+            # Anything already handed to the old evaluator still gets done,
+            # and anyone who is too late to use it does without it
+            if old_evaluator is not None:
+                old_evaluator.shutdown(wait=False)
+
+            # Say how it went
+            for line in timeline.format().split('\n'):
+                LOG.info(line)
+            LOG.info("Reloaded the configuration")
+
+            # And make sure that the main loop notices
+            self._input_queue.put(None)
+
+
+    def _predecessors(self, added, removed):
+        """
+        Match up the components being added in a reload with the ones which
+        they are replacing, if any. That is, ones being removed which are of
+        the same kind and class.
+
+        :rtype: list
+        :return:
+            The component which each of the added ones replaces, or ``None``,
+            in order.
+        """
+        removed = list(removed)
+        result  = []
+        for (kind, classname, _) in added:
+            for old in removed:
+                if self._specs[old][:2] == (kind, classname):
+                    removed.remove(old)
+                    result.append(old)
+                    break
+            else:
+                result.append(None)
+        return result
+
+
+    def _stop_component(self, component):
+        """
+        Stop a component which we are done with, logging any failure.
+        """
+        try:
+            LOG.info("Stopping %s" % (component,))
+            component.stop()
+            self._state.update_status(component, Notifier.IDLE)
+        except Exception as e:
+            LOG.error("Failed to stop %s: %s" % (component, e))
+
+
     def _start(self):
         """
         Start the system going.
@@ -582,15 +943,235 @@ class Dexter(object):
             LOG.error("Failed to start notifiers: %s" % (e,))
             raise
 
-        # And the components
-        for component in self._inputs + self._outputs + self._services:
-            # If these throw then it's fatal
+        # And the components. The ones which we created don't depend on one
+        # another so they can be started concurrently. Any others, like the
+        # GUI's, we start one after another in this thread.
+        components = self._inputs + self._outputs + self._services
+        self._start_components([c for c in components if c     in self._specs],
+                               self._timeline)
+        for component in components:
+            if component not in self._specs:
+                self._start_components((component,), self._timeline)
+
+        # Say how it all went
+        for line in self._timeline.format().split('\n'):
+            LOG.info(line)
+
+
+    def _start_components(self, components, timeline, fatal=True):
+        """
+        Start the given components, concurrently if we are doing our startup
+        that way.
+
+        :type  components: list(Component)
+        :param components:
+            The components to start.
+        :type  timeline: Timeline
+        :param timeline:
+            Where to record how long they took.
+        :type  fatal: bool
+        :param fatal:
+            Whether a component failing to start should raise an exception.
+
+        :rtype: list(bool)
+        :return:
+            Whether each of the components failed to start.
+        """
+        def start(component):
             LOG.info("Starting %s" % (component,))
             try:
-                component.start()
+                with timeline.record(component, 'start'):
+                    component.start()
+                return False
             except Exception as e:
                 LOG.error("Failed to start %s: %s" % (component, e))
-                raise
+                if fatal:
+                    raise
+                return True
+
+        return self._map(start, list(components))
+
+
+    def _create_components(self, specs, timeline):
+        """
+        Import and create the given components.
+
+        :type  specs: tuple
+        :param specs:
+            The ``(kind, classname, kwargs)`` tuples for the components.
+        :type  timeline: Timeline
+        :param timeline:
+            Where to record how long they took.
+
+        :rtype: list
+        :return:
+            The ``(kind, component)`` tuples, in the order given.
+
+        :raises Exception:
+            If any of them could not be created, in which case the ones which
+            were are stopped.
+        """
+        # The inputs are all created before anything else is imported or
+        # created. Some of them, like Vosk, load models which break if pygame
+        # has already been imported, and some of the outputs and services
+        # import it. Within each group things are done concurrently, if we are
+        # doing our startup that way.
+        created = [None] * len(specs)
+        error   = None
+        for inputs in (True, False):
+            indices = [i for (i, spec) in enumerate(specs)
+                       if (spec[0] == 'inputs') == inputs]
+            results = self._create_group([specs[i] for i in indices], timeline)
+            for (i, result) in zip(indices, results):
+                if isinstance(result, Exception):
+                    error = error or result
+                else:
+                    created[i] = result
+            if error is not None:
+                break
+
+        # If anything failed then we tidy up what we did create, since some
+        # components kick off threads and the like in their constructors, and
+        # give back nothing
+        if error is not None:
+            for (_, component) in filter(None, created):
+                try:
+                    LOG.info("Stopping %s" % (component,))
+                    component.stop()
+                except Exception as e:
+                    LOG.error("Failed to stop %s: %s" % (component, e))
+            raise error
+
+        return created
+
+
+    def _create_group(self, specs, timeline):
+        """
+        Import and create the given components, concurrently if we are doing
+        our startup that way. Once one fails, any which have not yet been
+        started on are skipped.
+
+        :rtype: list
+        :return:
+            The ``(kind, component)`` tuples, in the order given, with the
+            exception in place of any which failed and ``None`` in place of any
+            which were skipped.
+
+        @see _create_components()
+        """
+        # Import each module once, all at the same time. Python's import lock
+        # is per-module, so concurrent imports don't corrupt one another, and
+        # any module which is wanted more than once is just waited for. That
+        # does nothing for the order in which things get imported though,
+        # which matters to some libraries; Vosk's model loading breaks if
+        # pygame was imported first, for one. _create_components() only
+        # avoids that by creating all the inputs before anything else, and on
+        # a reload the running components will already have imported theirs.
+        def load(classname):
+            try:
+                start = time.monotonic()
+                klass = Dexter._get_class(classname)
+                return (klass, start, time.monotonic())
+            except Exception as e:
+                # Leave it to _get_component() to complain
+                return (None, None, None)
+
+        classnames = tuple(sorted(set(classname for (_, classname, _) in specs)))
+        classes    = dict(zip(classnames, self._map(load, classnames)))
+
+        # And create them. We don't know which component we have until we're
+        # done so the import goes onto the timeline afterwards.
+        failed = Event()
+        def create(spec):
+            if failed.is_set():
+                return None
+            (kind, classname, kwargs) = spec
+            (klass, imported, loaded) = classes[classname]
+            start = time.monotonic()
+            try:
+                component = Dexter._get_component(classname,
+                                                  kwargs,
+                                                  self._state,
+                                                  klass=klass)
+            except Exception as e:
+                failed.set()
+                return e
+            if imported is not None:
+                timeline.add(component, 'import', imported, loaded)
+            timeline.add(component, 'construct', start, time.monotonic())
+            return (kind, component)
+
+        return self._map(create, specs)
+
+
+    def _create_evaluator(self, evaluation, services=None):
+        """
+        Create the pool of threads for evaluating the services concurrently, if
+        we have been asked to. Otherwise they are evaluated one after another in
+        the main thread.
+
+        :type  evaluation: dict
+        :param evaluation:
+            The evaluation configuration, if any.
+        :type  services: int
+        :param services:
+            How many services we have, if not the current number.
+
+        :rtype: tuple
+        :return:
+            The evaluator, or ``None``, and the evaluation timeout.
+        """
+        if evaluation is None:
+            return (None, None)
+
+        if services is None:
+            services = len(self._services)
+        workers = int(evaluation.get('workers', services))
+        timeout = float(evaluation.get('timeout', 2.0))
+        if workers > 0 and services > 0:
+            LOG.info("Evaluating services using %d threads "
+                     "with a timeout of %0.2fs",
+                     workers, timeout)
+            return (ThreadPoolExecutor(max_workers       =workers,
+                                       thread_name_prefix='Evaluator'),
+                    timeout)
+        else:
+            return (None, timeout)
+
+
+    def _hook_up_inputs(self, inputs):
+        """
+        Have the given inputs push what they get onto our input queue, if they
+        can.
+
+        :rtype: list(Input)
+        :return:
+            The inputs which can't, and so need to be polled.
+        """
+        polled = []
+        for input in inputs:
+            if input.is_polled:
+                LOG.info("Input %s will be polled" % (input,))
+                polled.append(input)
+            else:
+                input.set_queue(self._input_queue)
+        return polled
+
+
+    def _map(self, func, values):
+        """
+        Call the function on each of the values, concurrently if we are doing
+        our startup that way, and give back the results in order. If any of the
+        calls throw then the first exception is raised once they're all done.
+        """
+        workers = min(self._startup_workers, len(values))
+        if workers <= 1:
+            return [func(value) for value in values]
+
+        with ThreadPoolExecutor(max_workers       =workers,
+                                thread_name_prefix='Startup') as pool:
+            futures = [pool.submit(func, value) for value in values]
+        return [future.result() for future in futures]
 
 
     def _stop(self):
@@ -610,6 +1191,11 @@ class Dexter(object):
             except Exception as e:
                 LOG.error("Failed to stop %s: %s" % (component, e))
 
+        # And any evaluation threads, without waiting for stragglers
+        (evaluator, _) = self._evaluation
+        if evaluator is not None:
+            evaluator.shutdown(wait=False)
+
 
     def _handle(self, tokens):
         """
@@ -623,6 +1209,11 @@ class Dexter(object):
         :return:
             The textual response, if any.
         """
+        # Anything which we speculatively worked out from a partial result is
+        # only good for this, the final result which followed it
+        speculation       = self._speculation
+        self._speculation = None
+
         # Give back nothing if we have no tokens
         if tokens is None:
             return None
@@ -638,43 +1229,9 @@ class Dexter(object):
             LOG.info("Nothing to do")
             return None
 
-        # See if the key-phrase is in the tokens and use it to determine the
-        # offset of the command.
-        offset = None
-        for key_phrase in self._key_phrases:
-            try:
-                offset = (list_index(words, key_phrase) +
-                          len(key_phrase))
-                LOG.info("Found key-phrase %s at offset %d in %s" %
-                         (key_phrase, offset - len(key_phrase), words))
-            except ValueError:
-                pass
-
-        # If we don't have an offset then we haven't found a key-phrase. Try a
-        # fuzzy match, but only if we are not waiting for someone to say
-        # something after priming with the keypharse.
-        now = time.time()
-        if now - self._last_keyphrase_only < Dexter._KEY_PHRASE_ONLY_TIMEOUT:
-            # Okay, treat what we got as the command, so we have no keypharse
-            # and so the offset is zero.
-            LOG.info("Treating %s as a command", (words,))
-            offset = 0
-        elif offset is None:
-            # Not found, but if we got something which sounded like the key
-            # phrase then set the offset this way too. This allows someone to
-            # just say the keyphrase and we can handle it by waiting for them to
-            # then say something else.
-            LOG.info("Key pharses %s not found in %s" %
-                     (self._key_phrases, words))
-
-            # Check for it being _almost_ the key phrase
-            ratio = 75
-            what = ' '.join(words)
-            for key_phrase in self._key_phrases:
-                if fuzz.ratio(' '.join(key_phrase), what) > ratio:
-                    offset = len(key_phrase)
-                    LOG.info("Fuzzy-matched key-pharse %s in %s" %
-                             (key_phrase, words))
+        # Find where the command starts, after the key-phrase
+        now    = time.time()
+        offset = self._get_offset(words, now)
 
         # Anything?
         if offset is None:
@@ -763,29 +1320,17 @@ class Dexter(object):
                 offset += offset_incr
                 LOG.info("Request now: %s", ' '.join(words[offset:]))
 
-        # See which services want them
-        handlers = []
-        for service in self._services:
-            try:
-                # This service is being woken to so update the status
-                self._state.update_status(service, Notifier.ACTIVE)
-
-                # Get any handler from the service for the given tokens
-                handler = service.evaluate(tokens[offset:])
-                if handler is not None:
-                    LOG.info("Service %s yields handler %s", service, handler)
-                    handlers.append(handler)
-
-            except:
-                LOG.error("Failed to evaluate %s with %s:\n%s" %
-                          ([str(token) for token in tokens],
-                           service,
-                           traceback.format_exc()))
-                return "Sorry, there was a problem"
-
-            finally:
-                # This service is done working now
-                self._state.update_status(service, Notifier.IDLE)
+        # See which services want them. If we already asked them about these
+        # words, when we got a partial result, then we can use what they said.
+        if speculation is not None and speculation[0] == tuple(words[offset:]):
+            LOG.info("Using the handlers from the partial result")
+            handlers = speculation[1]
+        else:
+            if speculation is not None:
+                LOG.info("Discarding the handlers from the partial result")
+            handlers = self._evaluate(tokens[offset:])
+        if handlers is None:
+            return "Sorry, there was a problem"
 
         # Anything?
         if len(handlers) == 0:
@@ -864,6 +1409,224 @@ class Dexter(object):
             return None
 
 
+    def _get_offset(self, words, now):
+        """
+        Find the offset of the command in the given words, after the key-phrase.
+
+        :type  words: list(str)
+        :param words:
+            The words which we heard.
+        :type  now: float
+        :param now:
+            The current time.
+
+        :rtype: int
+        :return:
+            The offset, or ``None`` if the words were not for us.
+        """
+        # See if the key-phrase is in the tokens and use it to determine the
+        # offset of the command.
+        offset = None
+        for key_phrase in self._key_phrases:
+            try:
+                offset = (list_index(words, key_phrase) +
+                          len(key_phrase))
+                LOG.info("Found key-phrase %s at offset %d in %s" %
+                         (key_phrase, offset - len(key_phrase), words))
+            except ValueError:
+                pass
+
+        # If we don't have an offset then we haven't found a key-phrase. Try a
+        # fuzzy match, but only if we are not waiting for someone to say
+        # something after priming with the keypharse.
+        if now - self._last_keyphrase_only < Dexter._KEY_PHRASE_ONLY_TIMEOUT:
+            # Okay, treat what we got as the command, so we have no keypharse
+            # and so the offset is zero.
+            LOG.info("Treating %s as a command", (words,))
+            offset = 0
+        elif offset is None:
+            # Not found, but if we got something which sounded like the key
+            # phrase then set the offset this way too. This allows someone to
+            # just say the keyphrase and we can handle it by waiting for them to
+            # then say something else.
+            LOG.info("Key pharses %s not found in %s" %
+                     (self._key_phrases, words))
+
+            # Check for it being _almost_ the key phrase
+            ratio = 75
+            what = ' '.join(words)
+            for key_phrase in self._key_phrases:
+                if fuzz.ratio(' '.join(key_phrase), what) > ratio:
+                    offset = len(key_phrase)
+                    LOG.info("Fuzzy-matched key-pharse %s in %s" %
+                             (key_phrase, words))
+
+        return offset
+
+
+    def _speculate(self, tokens):
+        """
+        Get a head start on handling a partial result from an input, by looking
+        for the key-phrase and then asking the services about what follows it.
+        If the final result turns out to be the same then `_handle()` will use
+        the handlers which we get back here, else they are thrown away.
+
+        :type  tokens: list(L{Token})
+        :param tokens:
+            The partial tokens.
+        """
+        # Out with the old
+        self._speculation = None
+
+        # Get the words, in the same way that _handle() does
+        words = [to_alphanumeric(token.element).lower()
+                 for token in tokens
+                 if token.verbal]
+        if len(words) == 0:
+            return
+
+        # Anything for us? If we've only heard the key-phrase then there's
+        # nothing to do yet.
+        offset = self._get_offset(words, time.time())
+        if offset is None or offset >= len(words):
+            return
+
+        # Ask the services
+        handlers = self._evaluate(tokens[offset:])
+        if handlers is not None:
+            self._speculation = (tuple(words[offset:]), handlers)
+
+
+    def _evaluate(self, tokens):
+        """
+        Evaluate the given tokens against all the services, possibly
+        concurrently.
+
+        :type  tokens: list(L{Token})
+        :param tokens:
+            The tokens to evaluate, with any key-phrase removed.
+
+        :rtype: list(L{Handler})
+        :return:
+            The handlers which the services yielded, in the order of the
+            services, or ``None`` if there was an error.
+        """
+        # A reload may swap these out from under us, so we look at them just
+        # the once
+        (evaluator, timeout) = self._evaluation
+        services = self._services
+
+        # The simple case, just do them one after another
+        if evaluator is None:
+            handlers = []
+            for service in services:
+                try:
+                    handler = self._evaluate_service(service, tokens)
+                    if handler is not None:
+                        handlers.append(handler)
+                except:
+                    LOG.error("Failed to evaluate %s with %s:\n%s" %
+                              ([str(token) for token in tokens],
+                               service,
+                               traceback.format_exc()))
+                    return None
+            return handlers
+
+        # Otherwise we fan them all out to the evaluator threads and gather the
+        # results back in the order of the services. This means that the
+        # ordering of the handlers is the same as if we had done them one by
+        # one. Each service gets the timeout from when it starts running, so
+        # that the ones queued up behind the others don't lose out. If a reload
+        # shuts down the evaluator while we're doing this then we do what's
+        # left in this thread instead.
+        started = [None] * len(services)
+        def evaluate(index, service):
+            started[index] = time.time()
+            return self._evaluate_service(service, tokens)
+
+        def wait(index, service, future):
+            while True:
+                start = started[index]
+                try:
+                    return future.result(
+                        timeout=max(0.0,
+                                    (start or time.time()) + timeout - time.time())
+                    )
+                except TimeoutError:
+                    if start is not None:
+                        raise
+                    if future.cancel():
+                        # All the threads are busy, maybe with ones which
+                        # timed out before, so we do it ourselves
+                        return self._evaluate_service(service, tokens)
+                    # Otherwise it just started, so now it gets its timeout
+
+        futures = []
+        for (index, service) in enumerate(services):
+            future = None
+            if evaluator is not None:
+                try:
+                    future = evaluator.submit(evaluate, index, service)
+                except RuntimeError:
+                    LOG.info("Evaluator was shut down, "
+                             "evaluating the remaining services serially")
+                    evaluator = None
+            futures.append((service, future))
+        handlers = []
+        failed   = False
+        for (index, (service, future)) in enumerate(futures):
+            try:
+                if future is None:
+                    handler = self._evaluate_service(service, tokens)
+                else:
+                    handler = wait(index, service, future)
+                if handler is not None:
+                    handlers.append(handler)
+            except TimeoutError:
+                # We can't stop it so we leave it to finish in the background,
+                # ignoring whatever it gives back. It keeps hold of its thread
+                # until then.
+                LOG.warning("Service %s took longer than %0.2fs to evaluate %s" %
+                            (service,
+                             timeout,
+                             [str(token) for token in tokens]))
+            except Exception as e:
+                LOG.error("Failed to evaluate %s with %s:\n%s" %
+                          ([str(token) for token in tokens],
+                           service,
+                           ''.join(traceback.format_exception(type(e),
+                                                              e,
+                                                              e.__traceback__))))
+                failed = True
+
+        # Give back what we got, if it went okay
+        return None if failed else handlers
+
+
+    def _evaluate_service(self, service, tokens):
+        """
+        Evaluate the given tokens against a service, updating its status while
+        we do so.
+
+        :rtype: L{Handler}
+        :return:
+            The handler from the service, or ``None`` if it had none.
+        """
+        try:
+            # This service is being woken to so update the status
+            self._state.update_status(service, Notifier.ACTIVE)
+
+            # Get any handler from the service for the given tokens
+            handler = service.evaluate(tokens)
+            if handler is not None:
+                LOG.info("Service %s yields handler %s", service, handler)
+            return handler
+
+        finally:
+            # This service is done working now
+            self._state.update_status(service, Notifier.IDLE)
+
+
     def _respond(self, response):
         """
         Given back the response to the user via the outputs.
@@ -934,7 +1697,9 @@ class _Mailer(Component):
         if self._sender is None:
             raise ValueError("No from address supplied")
 
-        # We'll need this for sending
+        # We'll need this for sending. Lazy import since most people won't have
+        # email set up.
+        import ssl
         self._context = ssl.create_default_context()
 
 
@@ -995,6 +1760,11 @@ class _Mailer(Component):
         """
         Create a handler function.
         """
+        # Lazy imports, like in __init__()
+        from email.mime.text      import MIMEText
+        from email.mime.multipart import MIMEMultipart
+        import smtplib
+
         def f(response):
             try:
                 # Tweak the alias if it have "me" or "my" in it since we want to
@@ -0,0 +1,130 @@
+"""
+Buffering of audio data for the speech-to-text engines.
+"""
+
+import numpy
+
+# ------------------------------------------------------------------------------
+
+class AudioBuffer(object):
+    """
+    A growable arena of float32 samples, normalised to +/-1.0, for accumulating
+    an utterance's worth of raw audio.
+
+    Each chunk is converted straight into the arena, and the arena is only
+    copied when it needs to grow, which it does by doubling. The samples are
+    handed back as a view onto the arena, not a copy, so the caller should be
+    done with them before clearing or appending to the buffer.
+
+    >>> b = AudioBuffer(4, initial_secs=1)
+    >>> b.append(numpy.array([0, 16384, -32768], dtype=numpy.int16).tobytes())
+    >>> b.view()
+    array([ 0. ,  0.5, -1. ], dtype=float32)
+    >>> b.append(numpy.array([8192, -8192], dtype=numpy.int16).tobytes())
+    >>> b.view()
+    array([ 0.  ,  0.5 , -1.  ,  0.25, -0.25], dtype=float32)
+    >>> (len(b), b.capacity, b.copies)
+    (5, 8, 1)
+    >>> b.clear()
+    >>> (len(b), b.capacity)
+    (0, 8)
+    """
+    # The numpy types for the different sample widths, along with their maximum
+    # values
+    _TYPES = {
+        1 : (numpy.int8,  2.0**7 ),
+        2 : (numpy.int16, 2.0**15),
+        4 : (numpy.int32, 2.0**31),
+    }
+
+    def __init__(self, rate, width=2, initial_secs=10.0):
+        """
+        :type  rate: int
+        :param rate:
+            The sample rate of the audio.
+        :type  width: int
+        :param width:
+            The width, in bytes, of each sample.
+        :type  initial_secs: float
+        :param initial_secs:
+            How many seconds of audio to make room for up front.
+        """
+        if width not in self._TYPES:
+            raise ValueError("Unsupported sample width: %s" % (width,))
+
+        (self._dtype, maximum) = self._TYPES[width]
+        self._scale  = numpy.float32(1.0 / maximum)
+        self._buffer = numpy.empty(max(1, int(rate * initial_secs)),
+                                   dtype=numpy.float32)
+        self._length = 0
+        self._copies = 0
+
+
+    @property
+    def capacity(self):
+        """
+        How many samples the arena can currently hold.
+        """
+        return len(self._buffer)
+
+
+    @property
+    def copies(self):
+        """
+        How many times the arena has been copied in order to grow it.
+        """
+        return self._copies
+
+
+    def append(self, data):
+        """
+        Add raw audio to the end of the buffer.
+
+        :type  data: bytes
+        :param data:
+            The raw audio samples.
+        """
+        samples = numpy.frombuffer(data, self._dtype)
+        end     = self._length + len(samples)
+        if end > len(self._buffer):
+            self._grow(end)
+
+        # Convert directly into the arena, without any temporaries
+        numpy.multiply(samples,
+                       self._scale,
+                       out=self._buffer[self._length:end],
+                       casting='unsafe')
+        self._length = end
+
+
+    def view(self):
+        """
+        Get the samples in the buffer.
+
+        :rtype: numpy.ndarray
+        :return:
+            A float32 view onto the buffer's samples.
+        """
+        return self._buffer[:self._length]
+
+
+    def clear(self):
+        """
+        Empty the buffer, keeping the arena for reuse.
+        """
+        self._length = 0
+
+
+    def _grow(self, needed):
+        """
+        Grow the arena so that it can hold at least the given number of samples.
+        """
+        buffer = numpy.empty(max(needed, 2 * len(self._buffer)),
+                             dtype=numpy.float32)
+        buffer[:self._length] = self._buffer[:self._length]
+        self._buffer  = buffer
+        self._copies += 1
+
+
+    def __len__(self):
+        return self._length
@@ -2,13 +2,22 @@
 A way to index media.
 """
 
-from   dexter.core.log import LOG
-from   fuzzywuzzy      import process
-from   threading       import Lock
-
-import math
+from   array               import array
+from   collections         import Counter, deque
+from   concurrent.futures  import (Future,
+                                  ProcessPoolExecutor,
+                                  ThreadPoolExecutor)
+from   dexter.core.log     import LOG
+from   dexter.core.watcher import create_watcher
+from   fuzzywuzzy          import process, utils
+from   threading           import Event, Lock
+
+import heapq
 import mutagen
+import numpy
 import os
+import sqlite3
+import sys
 import time
 
 # ------------------------------------------------------------------------------
@@ -16,14 +25,57 @@ import time
 class MusicIndex:
     """
     Index music in various ways.
+
+    Looking up a key fuzzily means scoring it against every key which we have,
+    which is slow when there are a lot of them. So we keep a trigram index of
+    the keys and only score the ones which look most like what we're after,
+    falling back to scoring them all if none of those are much good.
+
+    Lookups don't take any lock. Instead, changes are made to the indices under
+    the lock and, every so often, a snapshot of them is swapped in for lookups
+    to use. That way lookups never wait for the index to be added to, and adding
+    to it never waits for a slow lookup. The snapshot shares the indices with
+    us, rather than being a copy of them. We copy the dicts, but not what's in
+    them, when we first change them after it's taken.
     """
+    # How many candidate keys we score, at most, when looking something up
+    _CANDIDATES = 256
+
+    # How many of the best matching keys we take from each index when looking
+    # something up
+    _TOP_KEYS = 5
+
+    # If the best candidate scores less than this then we score all the keys
+    # instead, just in case
+    _GOOD_ENOUGH = 80
+
+    # How often, at most, we take a new snapshot while being changed in bulk
+    _SNAPSHOT_SECS = 1.0
+
     def __init__(self):
-        # The various indices. These are of the form <str,tuple(_Entry)>.
-        self._by_name   = {}
-        self._by_artist = {}
-        self._by_album  = {}
-        self._count     = 0
-        self._lock      = Lock()
+        # The various indices. These are of the form <str,tuple(_Entry)>. Each
+        # has a trigram index of its keys. These are only touched under the
+        # lock.
+        self._by_name      = {}
+        self._by_artist    = {}
+        self._by_album     = {}
+        self._name_grams   = _TrigramIndex()
+        self._artist_grams = _TrigramIndex()
+        self._album_grams  = _TrigramIndex()
+        self._count        = 0
+        self._lock         = Lock()
+
+        # What lookups use: the (index, trigrams) pairs for the names, albums
+        # and artists, as they were when we last took a snapshot. We take the
+        # next one once there are changes and it's time; the first changes are
+        # seen right away. Until we make changes, our indices are the ones in
+        # the snapshot.
+        self._snapshot      = None
+        self._shared        = False
+        self._copy_secs     = 0
+        self._changes       = 0
+        self._take_snapshot()
+        self._next_snapshot = 0
 
 
     def lookup(self, name=None, artist=None, album=None):
@@ -43,53 +95,91 @@ class MusicIndex:
         :rtype: tuple<Entry>
         :return:
            The potential entries, in order of likely match. Possibly empty.
+
+        We look at the few best matches in each index, rather than just the
+        best one, so that a close second for one constraint can still win if
+        it's the only one which fits the others.
+
+        >>> index = MusicIndex()
+        >>> index._add_entries((
+        ...     AudioEntry('Yesterday',  'file:///1.mp3', 'mp3', 1, 'Help',
+        ...                'The Beatles'),
+        ...     AudioEntry('Yesterdays', 'file:///2.mp3', 'mp3', 1, 'Use Your',
+        ...                "Guns N' Roses"),
+        ... ))
+        >>> index._publish()
+        >>> [entry.url for entry in index.lookup(name='Yesterdays')]
+        ['file:///2.mp3', 'file:///1.mp3']
+        >>> [entry.url for entry in index.lookup(name='Yesterdays',
+        ...                                      artist='Beatles')]
+        ['file:///1.mp3', 'file:///2.mp3']
         """
-        # Look in all our indices. We will create lists of (Entry,score) pairs
-        # for each. We do this under the lock so that nothing changes in the
-        # dicts.
-        with self._lock:
-            if name is not None and len(self._by_name) > 0:
-                key, score = process.extractOne(name, self._by_name.keys())
-                by_name    = [(entry, score) for entry in self._by_name[key]]
-            else:
-                by_name = None
+        # Look in all our indices. For each we get the scores of the entries
+        # which matched, keyed by the entries' IDs. The snapshot never changes
+        # so we don't need the lock for this.
+        entries = {}
+        fields  = []
+        for (query, (index, grams)) in zip((name, album, artist),
+                                           self._snapshot):
+            if query is not None and len(index) > 0:
+                scores = {}
+                for (key, score) in self._find(query,
+                                               index,
+                                               grams,
+                                               self._TOP_KEYS):
+                    for entry in index[key]:
+                        entries[id(entry)] = entry
+                        scores [id(entry)] = score
+                fields.append(scores)
+
+        # Now combine the results by intersecting all the matches. The entries
+        # are in the order of the first constraint's matches, so that ties are
+        # broken by that.
+        if len(fields) == 0:
+            return tuple()
+        ids = [id_
+               for id_ in fields[0]
+               if all(id_ in scores for scores in fields[1:])]
+        if len(ids) == 0:
+            return tuple()
 
-            if artist is not None and len(self._by_artist) > 0:
-                key, score = process.extractOne(artist, self._by_artist.keys())
-                by_artist  = [(entry, score) for entry in self._by_artist[key]]
-            else:
-                by_artist = None
+        # And give them back, best first. The combined score is the magnitude
+        # of the vector of the individual ones.
+        scores   = numpy.array([[scores[id_] for id_ in ids]
+                                for scores in fields],
+                               dtype=numpy.float64)
+        combined = numpy.sqrt(numpy.square(scores).sum(axis=0))
+        return tuple(entries[ids[i]]
+                     for i in numpy.argsort(-combined, kind='stable'))
 
-            if album is not None and len(self._by_album) > 0:
-                key, score = process.extractOne(album, self._by_album.keys())
-                by_album   = [(entry, score) for entry in self._by_album[key]]
-            else:
-                by_album = None
-
-        # Now combine the results by intersecting all the matches
-        results = None
-        for matches in (by_name, by_album, by_artist):
-            if results is None:
-                results = matches
-            elif matches is not None:
-                new = []
-                for match in matches:
-                    for result in results:
-                        if match[0] is result[0]:
-                            new.append(
-                                (match[0], math.sqrt(match [1] * match [1] +
-                                                     result[1] * result[1]))
-                            )
-                results = new
-
-        # And give them back
-        if results is None:
-            return tuple()
-        else:
-            return tuple(
-                result[0]
-                for result in sorted(results, key=lambda e: e[1], reverse=True)
-            )
+
+    def _find(self, query, index, grams, limit):
+        """
+        Find the keys in the given index which best match the query.
+
+        :type  query: str
+        :param query:
+            What to look for.
+        :type  index: dict
+        :param index:
+            The index to look in, which must not be empty.
+        :type  grams: _TrigramIndex
+        :param grams:
+            The trigram index of the index's keys.
+        :type  limit: int
+        :param limit:
+            The most keys to give back.
+
+        :rtype: list(tuple(str, int))
+        :return:
+            The keys and their scores, best first.
+        """
+        candidates = grams.candidates(query, self._CANDIDATES)
+        if len(candidates) > 0:
+            matches = process.extract(query, candidates, limit=limit)
+            if matches[0][1] >= self._GOOD_ENOUGH:
+                return matches
+        return process.extract(query, index.keys(), limit=limit)
 
 
     def _add_entry(self, entry):
@@ -100,112 +190,519 @@ class MusicIndex:
         :param entry:
             The entry to add to the index.
         """
-        # Ignore entries with no name
-        if entry.name is None:
-            return
-        LOG.debug("Adding '%s'", entry.name if entry.name else entry.url)
-
-        # Sanitise the strings thusly. This attempts to do a little data
-        # cleaning along the way.
-        def tidy(string):
-            # Deal with empty strings
-            string = _clean_string(string)
-            if string is None:
-                return None
-
-            # Handle "_"s instead of spaces
-            string = string.replace('_', ' ')
-            string = _clean_string(string)
-            if string is None:
-                return None
-
-            # Put ", The" back on the front
-            if string.endswith(' The'):
-                if string.endswith(', The'):
-                    string = "The " + string[:-5]
-                else:
-                    string = "The " + string[:-4]
+        self._add_entries((entry,))
+
 
-            # And, finally, make it all lower case so that we don't get fooled
-            # by funny capitalisation
-            string = string.lower()
+    def _add_entries(self, entries):
+        """
+        Add a batch of entries to the index, taking the lock just the once.
 
-            # And give it back
-            return string.lower()
+        :type  entries: iterable(_Entry)
+        :param entries:
+            The entries to add to the index. These may not be seen by `lookup()`
+            until `_publish()` is called.
+        """
+        # Ignore entries with no name
+        entries = [entry for entry in entries if entry.name is not None]
+        if len(entries) == 0:
+            return
+        for entry in entries:
+            LOG.debug("Adding '%s'", entry.name)
 
         # How we add the entry to an index
-        def add(key, index, entry_):
+        def add(key, index, grams, entry_):
             if key is not None:
                 if key in index:
-                    index[key].append(entry_)
+                    index[key] += (entry_,)
                 else:
-                    index[key] = [entry_]
-
-        # Add to the various indices. We do this under the lock so that readers
-        # are not confused.
+                    index[key] = (entry_,)
+                    grams.add(key)
+
+        # Add to the various indices. We do this under the lock so that writers
+        # don't trip over one another. Tidying the strings doesn't need the lock
+        # so that's done first.
+        keys = [(_tidy(entry.name), _tidy(entry.artist), _tidy(entry.album))
+                for entry in entries]
         with self._lock:
-            add(tidy(entry.name  ), self._by_name,   entry)
-            add(tidy(entry.artist), self._by_artist, entry)
-            add(tidy(entry.album ), self._by_album,  entry)
+            self._unshare()
+            for (entry, (name, artist, album)) in zip(entries, keys):
+                add(name,   self._by_name,   self._name_grams,   entry)
+                add(artist, self._by_artist, self._artist_grams, entry)
+                add(album,  self._by_album,  self._album_grams,  entry)
+            self._changed(len(entries))
 
         # And update the stats
-        self._count += 1
-        if (self._count % 1000) == 0:
-            LOG.info("Added a total of %d entries: %s", self._count, entry)
+        before = self._count
+        self._count += len(entries)
+        if (self._count // 1000) > (before // 1000):
+            LOG.info("Added a total of %d entries: %s", self._count, entries[-1])
+
+
+    def _remove_entry(self, entry):
+        """
+        Remove an entry which was previously added to the index.
+
+        :type  entry: _Entry
+        :param entry:
+            The entry to remove from the index.
+        """
+        self._remove_entries((entry,))
+
+
+    def _remove_entries(self, entries):
+        """
+        Remove a batch of entries which were previously added to the index,
+        taking the lock just the once.
+
+        :type  entries: iterable(_Entry)
+        :param entries:
+            The entries to remove from the index. These may still be seen by
+            `lookup()` until `_publish()` is called.
+        """
+        # Entries with no name were never added
+        entries = [entry for entry in entries if entry.name is not None]
+        if len(entries) == 0:
+            return
+        for entry in entries:
+            LOG.debug("Removing '%s'", entry.name)
+
+        # How we remove the entry from an index, dropping the key if that leaves
+        # it empty
+        def remove(key, index, grams, entry_):
+            entries_ = index.get(key)
+            if entries_ is not None:
+                entries_ = tuple(e for e in entries_ if e is not entry_)
+                if len(entries_) > 0:
+                    index[key] = entries_
+                else:
+                    del index[key]
+                    grams.remove(key)
+
+        # Remove from the various indices, again under the lock
+        keys = [(_tidy(entry.name), _tidy(entry.artist), _tidy(entry.album))
+                for entry in entries]
+        with self._lock:
+            self._unshare()
+            for (entry, (name, artist, album)) in zip(entries, keys):
+                remove(name,   self._by_name,   self._name_grams,   entry)
+                remove(artist, self._by_artist, self._artist_grams, entry)
+                remove(album,  self._by_album,  self._album_grams,  entry)
+            self._changed(len(entries))
+
+        self._count -= len(entries)
+
+
+    def _publish(self):
+        """
+        Make sure that `lookup()` sees all the changes which have been made to
+        the index. This should be called once a bunch of changes are done.
+        """
+        with self._lock:
+            if self._changes > 0:
+                self._take_snapshot()
+
+
+    def _changed(self, count):
+        """
+        Note that we changed the indices, taking a new snapshot of them if it's
+        been a while since the last one. This must be called under the lock.
+
+        :type  count: int
+        :param count:
+            How many entries were changed.
+        """
+        self._changes += count
+        if time.monotonic() >= self._next_snapshot:
+            self._take_snapshot()
+
+
+    def _take_snapshot(self):
+        """
+        Swap in a new snapshot of the indices for `lookup()` to use. This must
+        be called under the lock, or before anyone else can see us.
+
+        The snapshot is just the indices as they are now, so this is cheap. We
+        leave them alone from then on, and make our own copies when we next
+        change them. If that starts to take a while then we take snapshots
+        less often. @see _unshare()
+        """
+        self._snapshot = ((self._by_name,   self._name_grams  .snapshot()),
+                          (self._by_album,  self._album_grams .snapshot()),
+                          (self._by_artist, self._artist_grams.snapshot()))
+        self._shared        = True
+        self._changes       = 0
+        self._next_snapshot = \
+            time.monotonic() + max(self._SNAPSHOT_SECS, 10 * self._copy_secs)
+
+
+    def _unshare(self):
+        """
+        Make sure that our indices aren't the ones in the snapshot, before we
+        change them. This must be called under the lock.
+
+        Copying the dicts is cheap enough since their values are immutable
+        tuples, and we only do it once per snapshot. The trigram indices look
+        after themselves.
+        """
+        if self._shared:
+            start = time.monotonic()
+            self._by_name   = self._by_name  .copy()
+            self._by_album  = self._by_album .copy()
+            self._by_artist = self._by_artist.copy()
+            self._shared    = False
+            self._copy_secs = time.monotonic() - start
 
 
     def __len__(self):
         return self._count
 
 
+class _TrigramIndex:
+    """
+    An inverted index of the character trigrams in a set of keys, for finding
+    the keys which look most like a query before doing any expensive fuzzy
+    matching.
+
+    Since there's a posting for every trigram of every key, we hold them as
+    arrays of the keys' ordinal numbers, rather than as sets of the keys
+    themselves, which takes a fraction of the memory. Removed keys are blanked
+    out and are only dropped from the postings once enough of them build up.
+
+    The postings are only ever added to, with ever larger ordinal numbers, so a
+    snapshot can share them with the index and just ignore anything past where
+    it was taken. The same goes for the keys, except that we make our own copy
+    of them before blanking any out. So taking a snapshot costs next to nothing.
+
+    >>> grams = _TrigramIndex()
+    >>> for key in ('yesterday', 'yellow submarine', 'let it be', 'help'):
+    ...     grams.add(key)
+    >>> grams.candidates('yesturday', 2)
+    ['yesterday', 'yellow submarine']
+    >>> snapshot = grams.snapshot()
+    >>> grams.remove('yesterday')
+    >>> grams.add('yesterdays')
+    >>> grams.candidates('yesturday', 2)
+    ['yellow submarine', 'yesterdays']
+    >>> snapshot.candidates('yesturday', 2)
+    ['yesterday', 'yellow submarine']
+    """
+    def __init__(self):
+        self._clear()
+
+
+    def add(self, key):
+        """
+        Add a key to the index.
+
+        :type  key: str
+        :param key:
+            The key to add.
+        """
+        if key in self._ids:
+            return
+        grams = _trigrams(key)
+        id_   = len(self._keys)
+        for gram in grams:
+            postings = self._postings.get(gram)
+            if postings is None:
+                self._postings[gram] = array('I', (id_,))
+            else:
+                postings.append(id_)
+        self._keys .append(key)
+        self._sizes.append(min(len(grams), 0xffff))
+        self._ids[key] = id_
+
+
+    def remove(self, key):
+        """
+        Remove a key from the index.
+
+        :type  key: str
+        :param key:
+            The key to remove.
+        """
+        id_ = self._ids.pop(key, None)
+        if id_ is None:
+            return
+
+        # Any snapshot still wants to see the key
+        if self._shared:
+            self._keys   = self._keys[:]
+            self._shared = False
+        self._keys[id_] = None
+
+        # Once most of the postings are for removed keys we start afresh
+        self._removed += 1
+        if self._removed > len(self._ids):
+            keys = [key_ for key_ in self._keys if key_ is not None]
+            self._clear()
+            for key_ in keys:
+                self.add(key_)
+
+
+    def snapshot(self):
+        """
+        Make a snapshot of this index, which won't see any changes made to it.
+        This is cheap since it shares everything with the index. The snapshot
+        may only be used to find candidates.
+
+        :rtype: _TrigramIndex
+        :return:
+            The snapshot.
+        """
+        result = _TrigramIndex()
+        result._postings = self._postings
+        result._keys     = self._keys
+        result._sizes    = self._sizes
+        result._ids      = None
+        result._end      = len(self._keys)
+        self._shared     = True
+        return result
+
+
+    def candidates(self, query, limit):
+        """
+        Find the keys which look most like the query. These are the ones with
+        the largest proportions of trigrams in common with it.
+
+        :type  query: str
+        :param query:
+            What to look for.
+        :type  limit: int
+        :param limit:
+            The most keys to give back.
+
+        :rtype: list(str)
+        :return:
+            The keys, in the order in which they were added. This is the same
+            order as the index's dict has them in, so ties are broken in the
+            same way as scoring all of its keys does.
+        """
+        grams  = _trigrams(query)
+        shared = Counter()
+        for gram in grams:
+            shared.update(self._postings.get(gram, ()))
+
+        keys  = self._keys
+        sizes = self._sizes
+        end   = len(keys) if self._end is None else self._end
+        best  = heapq.nlargest(
+            limit,
+            ((id_, count)
+             for (id_, count) in shared.items()
+             if id_ < end and keys[id_] is not None),
+            key=lambda item: item[1] / (len(grams) + sizes[item[0]] - item[1])
+        )
+        return [keys[id_] for id_ in sorted(id_ for (id_, _) in best)]
+
+
+    def _clear(self):
+        """
+        Empty the index.
+        """
+        # The ordinal numbers of the keys which have each trigram, the keys by
+        # their ordinal numbers (None for removed ones), how many trigrams each
+        # key has, and the ordinal numbers by key
+        self._postings = {}
+        self._keys     = []
+        self._sizes    = array('H')
+        self._ids      = {}
+        self._removed  = 0
+
+        # Whether the keys are shared with a snapshot and, if we are one, where
+        # we stop
+        self._shared = False
+        self._end    = None
+
+
 class FileMusicIndex(MusicIndex):
     """
     Index music from a filesystem.
+
+    Reading the tags of every file in a large library can take a very long time,
+    so the index may be given a file to cache what it finds in. The index is
+    then filled from the cache up front and, when it is built, only the files
+    which have been added or changed since then are read.
+
+    The tags are read by a pool of workers, since doing so is slow on network
+    storage, and the results are added to the index in batches.
+
+    Once built, the index may be kept up to date by watching the roots for
+    changes, using `watch()`.
     """
-    def __init__(self, roots):
+    # How many files each worker reads at a time
+    _BATCH_SIZE = 64
+
+    # How often to say how we're doing, in seconds
+    _PROGRESS_INTERVAL = 10
+
+    def __init__(self,
+                 roots,
+                 cache    =None,
+                 create   =True,
+                 workers  =4,
+                 processes=False):
         """
         :type  roots: tuple(str)
         :param roots:
             The list of URLs to search for music on. In the simplest form these
             will likely just be a bunch of strings looking something like:
                 C{file:///home/pi/Music}
+        :type  cache: str
+        :param cache:
+            The path of the file to cache the index in, if any.
+        :type  create: bool
+        :param create:
+            Whether to build the index right away. If not then `create()` should
+            be called to do so.
+        :type  workers: int
+        :param workers:
+            How many workers to read the files' tags with. If this is ``1`` then
+            they are read in the calling thread.
+        :type  processes: bool
+        :param processes:
+            Whether the workers should be processes, rather than threads. This
+            helps when parsing the tags, rather than reading the files, is the
+            slow part.
         """
         super().__init__()
 
         # Tupleize, just in case someone passed in a string or whathaveyou
-        if isinstance(roots, str):
+        if roots is None:
+            roots = ()
+        elif isinstance(roots, str):
             roots = (roots,)
         elif not isinstance(roots, (tuple, list)):
             roots = tuple(roots)
+        self._roots     = roots
+        self._workers   = max(1, int(workers))
+        self._processes = bool(processes)
+
+        # The entries which we have, keyed by the path of their file. Files
+        # which aren't music have None. Changes to this, and to the cache, are
+        # made under the update lock.
+        self._by_path     = {}
+        self._update_lock = Lock()
+
+        # How we keep up to date, and whether we have been told to stop doing
+        # so. The watch lock guards both.
+        self._watcher    = None
+        self._watch_lock = Lock()
+        self._stopped    = Event()
+
+        # Fill in what we can from the cache
+        if cache is not None:
+            start = time.time()
+            self._cache = _MusicIndexCache(cache)
+            for root in self._roots:
+                self._set_entries(self._cache.load(self._get_dirname(root)))
+            self._publish()
+            end = time.time()
+            LOG.info("Loaded %d entries from %s in %0.1f seconds",
+                     self._count, cache, end - start)
+        else:
+            self._cache = None
+
+        if create:
+            self.create()
 
-        if roots is not None:
-            for root in roots:
+
+    def create(self):
+        """
+        Build the index, or bring it up to date if it came from the cache. If
+        `stop()` is called while this is going on then it gives up part way.
+        """
+        with self._update_lock:
+            for root in self._roots:
+                if self._stopped.is_set():
+                    LOG.info("Stopped indexing")
+                    break
                 start = time.time()
                 self._build(root)
+                self._publish()
                 end  = time.time()
                 LOG.info("Indexed %s in %0.1f seconds", root, end - start)
 
 
-    def _build(self, root):
+    def watch(self, poll=False, interval=300):
         """
-        Build an index based on the given root.
+        Start keeping the index up to date by watching the roots for files being
+        added, changed or removed. This may be called before `create()`, in
+        which case any changes are applied once that's done.
+
+        :type  poll: bool
+        :param poll:
+            Whether to poll for changes, rather than being told about them. This
+            is needed to see changes which other machines make to network
+            storage.
+        :type  interval: float
+        :param interval:
+            How often to poll, in seconds, if we do.
+        """
+        with self._watch_lock:
+            if self._watcher is None and not self._stopped.is_set():
+                self._watcher = create_watcher(
+                    [self._get_dirname(root) for root in self._roots],
+                    self._update,
+                    poll    =poll,
+                    interval=interval
+                )
+                self._watcher.start()
+
+
+    def unwatch(self):
+        """
+        Stop watching the roots for changes.
+        """
+        with self._watch_lock:
+            if self._watcher is not None:
+                self._watcher.stop()
+                self._watcher = None
+
+
+    def stop(self):
+        """
+        Stop watching the roots for changes, for good, and have any `create()`
+        which is under way give up as soon as it can. What it has read so far
+        is kept, and saved to the cache, but nothing is dropped because it
+        wasn't seen.
+        """
+        with self._watch_lock:
+            self._stopped.set()
+        self.unwatch()
+
+
+    def _get_dirname(self, root):
+        """
+        Get the directory name for the given root.
 
         :type  root: str
         :param root:
-            The URL of the root to build from.
+            The URL of the root.
         """
-        if root is None:
-            return
         if not isinstance(root, str):
             raise ValueError("Root was not a string: %r", root)
         if root.startswith('file://'):
-            self._build_file(root[len('file://'):])
+            return root[len('file://'):]
         elif root.startswith('/'):
-            self._build_from_dirname(root)
+            return root
         else:
             raise ValueError("Unhandled root type: %s", root)
 
 
+    def _build(self, root):
+        """
+        Build an index based on the given root.
+
+        :type  root: str
+        :param root:
+            The URL of the root to build from.
+        """
+        if root is None:
+            return
+        self._build_from_dirname(self._get_dirname(root))
+
+
     def _build_from_dirname(self, dirname):
         """
         Build an index based on the given directory root.
@@ -214,24 +711,373 @@ class FileMusicIndex(MusicIndex):
         :param dirname:
             The directory name to build from.
         """
-        # Walk the tree
-        for (subdir, subdirs, files) in os.walk(dirname, followlinks=True):
+        # Everything which we had from under here. Whatever we don't see as we
+        # go has been removed.
+        prefix = os.path.join(dirname, '')
+        stale  = set(path for path in self._by_path if path.startswith(prefix))
+
+        # How we're doing
+        start    = time.time()
+        progress = start
+        seen     = 0
+        read     = 0
+
+        # Walk the tree, handing batches of files to the workers to read. We
+        # only have so many batches on the go at once, so that we don't end up
+        # holding the whole tree in memory.
+        pool    = self._create_pool()
+        pending = deque()
+        batch   = []
+        for (subdir, _, filenames) in os.walk(dirname, followlinks=True):
+            if self._stopped.is_set():
+                break
             LOG.info("Indexing %s", subdir)
+            for filename in filenames:
+                path = os.path.join(subdir, filename)
+                stale.discard(path)
+                seen += 1
+                try:
+                    # If the cache has this file as it is now then we already
+                    # have it
+                    stat = os.stat(path) if self._cache is not None else None
+                    if stat is not None and self._cache.is_current(path, stat):
+                        continue
+                    batch.append((path, stat))
+                except Exception as e:
+                    LOG.warning("Failed to index %s: %s", path, e)
 
-            # Handle all the files which we can find
-            for filename in files:
+                if len(batch) >= self._BATCH_SIZE:
+                    pending.append(self._submit(pool, batch))
+                    batch = []
+                while (len(pending) > 2 * self._workers or
+                       (len(pending) > 0 and pending[0].done())):
+                    read += self._gather(pending.popleft())
+
+                # Say how we're getting on, every so often
+                now = time.time()
+                if now - progress >= self._PROGRESS_INTERVAL:
+                    progress = now
+                    LOG.info("Indexing %s: looked at %d files and read %d, "
+                             "%0.1f files/sec",
+                             dirname, seen, read, read / (now - start))
+
+        # Finish up
+        if len(batch) > 0:
+            pending.append(self._submit(pool, batch))
+        while len(pending) > 0:
+            read += self._gather(pending.popleft())
+        if pool is not None:
+            pool.shutdown()
+
+        # Drop anything which has gone away, if we looked everywhere
+        if not self._stopped.is_set():
+            self._drop(stale)
+        if self._cache is not None:
+            self._cache.flush()
+
+        elapsed = max(1e-6, time.time() - start)
+        LOG.info("Indexing %s: looked at %d files and read %d, %0.1f files/sec",
+                 dirname, seen, read, read / elapsed)
+
+
+    def _update(self, paths):
+        """
+        Update the index with the files which have been added, changed or
+        removed. This is called by the watcher.
+
+        :type  paths: list(str)
+        :param paths:
+            The paths which have changed. These may be directories.
+        """
+        with self._update_lock:
+            # Work out what's what. Files which we see by walking a directory
+            # may well not have changed; that directory might have been moved
+            # here or we might have missed the changes in it, for example.
+            direct  = set()
+            walked  = set()
+            removed = set()
+            for path in paths:
+                if os.path.isdir(path):
+                    prefix = os.path.join(path, '')
+                    for (subdir, _, filenames) in os.walk(path, followlinks=True):
+                        for filename in filenames:
+                            walked.add(os.path.join(subdir, filename))
+                    removed.update(p for p in self._by_path
+                                   if p.startswith(prefix) and p not in walked)
+                elif os.path.exists(path):
+                    direct.add(path)
+                elif path in self._by_path:
+                    removed.add(path)
+                else:
+                    # Possibly a directory which has gone away
+                    prefix = os.path.join(path, '')
+                    removed.update(p for p in self._by_path
+                                   if p.startswith(prefix))
+
+            # Read what's new. There are usually only a few of these so we do
+            # it right here.
+            files = []
+            for path in direct | walked:
                 try:
-                    # Use mutagen to grab details
-                    path = os.path.join(subdir, filename)
-                    info = mutagen.File(path)
-                    if isinstance(info, mutagen.mp3.MP3):
-                        self._add_entry(AudioEntry.from_mp3(info))
-                    elif isinstance(info, mutagen.flac.FLAC):
-                        self._add_entry(AudioEntry.from_flac(info))
-                    else:
-                        LOG.debug("Ignoring %s", path)
+                    stat = os.stat(path) if self._cache is not None else None
+                    if path not in direct and path in self._by_path and \
+                       (stat is None or self._cache.is_current(path, stat)):
+                        continue
+                    files.append((path, stat))
                 except Exception as e:
                     LOG.warning("Failed to index %s: %s", path, e)
+            read = 0
+            for i in range(0, len(files), self._BATCH_SIZE):
+                read += self._gather(
+                    self._submit(None, files[i:i + self._BATCH_SIZE])
+                )
+
+            # And drop what's gone
+            self._drop(removed)
+            self._publish()
+            if self._cache is not None:
+                self._cache.flush()
+            LOG.info("Updated the index with %d files and dropped %d; "
+                     "now have %d entries",
+                     read, len(removed), self._count)
+
+
+    def _drop(self, paths):
+        """
+        Drop the given files from the index.
+
+        :type  paths: iterable(str)
+        :param paths:
+            The paths of the files.
+        """
+        paths = tuple(paths)
+        self._set_entries((path, None) for path in paths)
+        for path in paths:
+            LOG.debug("Dropping %s", path)
+            del self._by_path[path]
+            if self._cache is not None:
+                self._cache.remove(path)
+
+
+    def _create_pool(self):
+        """
+        Create the pool of workers to read the files with, if we want one.
+        """
+        if self._workers <= 1:
+            return None
+        elif self._processes:
+            return ProcessPoolExecutor(max_workers=self._workers)
+        else:
+            return ThreadPoolExecutor(max_workers       =self._workers,
+                                      thread_name_prefix='MusicIndexer')
+
+
+    def _submit(self, pool, batch):
+        """
+        Have the pool read the given batch of files, or read them right away if
+        we have no pool.
+
+        :rtype: concurrent.futures.Future
+        :return:
+            The future for what `_read_entries()` gives back.
+        """
+        if pool is not None:
+            return pool.submit(_read_entries, batch)
+
+        future = Future()
+        future.set_result(_read_entries(batch))
+        return future
+
+
+    def _gather(self, future):
+        """
+        Add what a worker read into the index.
+
+        :rtype: int
+        :return:
+            How many files were read.
+        """
+        # Replace whatever we had for the files. We remember the files which
+        # weren't music too, so that we don't look at them again next time.
+        results = future.result()
+        self._set_entries((path, entry) for (path, _, entry) in results)
+        if self._cache is not None:
+            for (path, stat, entry) in results:
+                self._cache.store(path, stat, entry)
+        return len(results)
+
+
+    def _set_entries(self, entries):
+        """
+        Set the entries for the given files, replacing any which they already
+        had.
+
+        :type  entries: iterable(tuple(str, AudioEntry))
+        :param entries:
+            The ``(path, entry)`` pairs, where the entry is ``None`` if the file
+            is not music.
+        """
+        old = []
+        new = []
+        for (path, entry) in entries:
+            if self._by_path.get(path) is not None:
+                old.append(self._by_path[path])
+            self._by_path[path] = entry
+            if entry is not None:
+                new.append(entry)
+        self._remove_entries(old)
+        self._add_entries(new)
+
+
+class _MusicIndexCache:
+    """
+    An SQLite database of the entries in a `FileMusicIndex`. These are keyed by
+    the path of their file, along with its modification time and size so that we
+    can tell when it changes.
+    """
+    # The version of the schema below. If this changes then any existing cache
+    # is thrown away.
+    _VERSION = 1
+
+    # How many changes we make before writing them out
+    _BATCH_SIZE = 1000
+
+    def __init__(self, filename):
+        """
+        :type  filename: str
+        :param filename:
+            The path of the database file, which is created if need be.
+        """
+        self._db      = sqlite3.connect(filename, check_same_thread=False)
+        self._stats   = {}
+        self._pending = 0
+
+        # Make sure that we have the right schema
+        (version,) = self._db.execute('PRAGMA user_version').fetchone()
+        if version != self._VERSION:
+            if version != 0:
+                LOG.info("Discarding version %d music index cache in %s",
+                         version, filename)
+            self._db.execute('DROP TABLE IF EXISTS files')
+            self._db.execute("""
+                CREATE TABLE files (
+                    path      TEXT PRIMARY KEY,
+                    mtime_ns  INTEGER NOT NULL,
+                    size      INTEGER NOT NULL,
+                    file_type TEXT,
+                    name      TEXT,
+                    url       TEXT,
+                    track     INTEGER,
+                    album     TEXT,
+                    artist    TEXT
+                )
+            """)
+            self._db.execute('PRAGMA user_version = %d' % (self._VERSION,))
+            self._db.commit()
+
+
+    def load(self, dirname):
+        """
+        Load the entries for all the files under the given directory.
+
+        :type  dirname: str
+        :param dirname:
+            The directory to load the entries for.
+
+        :return:
+            An iterator of ``(path, entry)`` tuples, where the entry is ``None``
+            for files which aren't music.
+        """
+        prefix = os.path.join(dirname, '')
+        cursor = self._db.execute(
+            'SELECT path, mtime_ns, size, file_type, name, url, track, album, '
+            'artist FROM files WHERE substr(path, 1, ?) = ?',
+            (len(prefix), prefix)
+        )
+        for (path, mtime_ns, size,
+             file_type, name, url, track, album, artist) in cursor:
+            self._stats[path] = (mtime_ns, size)
+            if file_type is None:
+                yield (path, None)
+            else:
+                yield (path,
+                       AudioEntry(name, url, file_type, track, album, artist))
+
+
+    def is_current(self, path, stat):
+        """
+        Whether we have the given file as it currently is.
+
+        :type  path: str
+        :param path:
+            The path of the file.
+        :type  stat: os.stat_result
+        :param stat:
+            The file's current details.
+        """
+        return self._stats.get(path) == (stat.st_mtime_ns, stat.st_size)
+
+
+    def store(self, path, stat, entry):
+        """
+        Store the entry for the given file.
+
+        :type  path: str
+        :param path:
+            The path of the file.
+        :type  stat: os.stat_result
+        :param stat:
+            The file's current details.
+        :type  entry: AudioEntry
+        :param entry:
+            The entry for the file, or ``None`` if it's not music.
+        """
+        if entry is None:
+            values = (None,) * 6
+        else:
+            values = (entry.file_type,
+                      entry.name,
+                      entry.url,
+                      entry.track,
+                      entry.album,
+                      entry.artist)
+        self._db.execute(
+            'INSERT OR REPLACE INTO files VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)',
+            (path, stat.st_mtime_ns, stat.st_size) + values
+        )
+        self._stats[path] = (stat.st_mtime_ns, stat.st_size)
+        self._changed()
+
+
+    def remove(self, path):
+        """
+        Remove the given file.
+
+        :type  path: str
+        :param path:
+            The path of the file.
+        """
+        self._db.execute('DELETE FROM files WHERE path = ?', (path,))
+        self._stats.pop(path, None)
+        self._changed()
+
+
+    def flush(self):
+        """
+        Write out any pending changes.
+        """
+        self._db.commit()
+        self._pending = 0
+
+
+    def _changed(self):
+        """
+        Note that we changed something. The changes are written out every so
+        often so that we don't lose them all if we're stopped partway through.
+        """
+        self._pending += 1
+        if self._pending >= self._BATCH_SIZE:
+            self.flush()
 
 
 
@@ -239,12 +1085,16 @@ class _Entry:
     """
     An entry in the media index. This contains all the details which you need to
     know about a particular piece of media.
+
+    There can be a great many of these, so they have no ``__dict__``.
     """
     # The types of file which we know about
     MP3    = 'mp3'
     FLAC   = 'flac'
     STREAM = 'stream'
 
+    __slots__ = ('_name', '_url', '_type')
+
 
     def __init__(self, name, url, file_type):
         """
@@ -260,7 +1110,7 @@ class _Entry:
         """
         self._name = _clean_string(name)
         self._url  = _clean_string(url)
-        self._type = file_type
+        self._type = _intern(file_type)
 
 
     @property
@@ -310,7 +1160,12 @@ class _Entry:
 class AudioEntry(_Entry):
     """
     An entry for an audio file, like MP3 or Flac.
+
+    Lots of tracks share the same album and artist, so we intern those strings
+    in order to only hold one copy of each.
     """
+    __slots__ = ('_track', '_album', '_artist')
+
     @staticmethod
     def from_mp3(info):
         """
@@ -418,7 +1273,7 @@ class AudioEntry(_Entry):
 
         # Pull out the info
         name   = (getattr(track, 'title',                 '') or '').strip() or None
-        track  = (getattr(track, 'original_track_number', '') or '').strip() or None
+        number = (getattr(track, 'original_track_number', '') or '').strip() or None
         album  = (getattr(track, 'album',                 '') or '').strip() or None
         artist = (getattr(track, 'artist',                '') or '').strip() or None
 
@@ -427,7 +1282,7 @@ class AudioEntry(_Entry):
             return
 
         # And construct
-        return AudioEntry(name, url, _Entry.STREAM, track, album, artist)
+        return AudioEntry(name, url, _Entry.STREAM, number, album, artist)
 
 
     def __init__(self, name, url, file_type, track, album, artist):
@@ -448,9 +1303,22 @@ class AudioEntry(_Entry):
             The name of the artist, if any
         """
         super().__init__(name, url, file_type)
-        self._track  = _clean_int   (track)
-        self._album  = _clean_string(album)
-        self._artist = _clean_string(artist)
+        self._track  = _clean_int(track)
+        self._album  = _intern(_clean_string(album))
+        self._artist = _intern(_clean_string(artist))
+
+
+    def __reduce__(self):
+        """
+        Pickle by way of the constructor, so that the strings are interned
+        again when the entry comes back from an indexing process.
+        """
+        return (AudioEntry, (self._name,
+                             self._url,
+                             self._type,
+                             self._track,
+                             self._album,
+                             self._artist))
 
 
     @property
@@ -491,6 +1359,103 @@ class AudioEntry(_Entry):
 
 # ------------------------------------------------------------------------------
 
+def _read_entries(batch):
+    """
+    Read the tags of the given files. This is done in the indexing workers,
+    which may be other processes.
+
+    :type  batch: list(tuple(str, os.stat_result))
+    :param batch:
+        The ``(path, stat)`` pairs for the files to read.
+
+    :rtype: list(tuple(str, os.stat_result, AudioEntry))
+    :return:
+        The ``(path, stat, entry)`` tuples, where the entry is ``None`` if the
+        file is not music. Any files which could not be read are left out.
+    """
+    results = []
+    for (path, stat) in batch:
+        try:
+            # Use mutagen to grab details
+            info = mutagen.File(path)
+            if isinstance(info, mutagen.mp3.MP3):
+                entry = AudioEntry.from_mp3(info)
+            elif isinstance(info, mutagen.flac.FLAC):
+                entry = AudioEntry.from_flac(info)
+            else:
+                LOG.debug("Ignoring %s", path)
+                entry = None
+            results.append((path, stat, entry))
+        except Exception as e:
+            LOG.warning("Failed to index %s: %s", path, e)
+    return results
+
+
+def _trigrams(string):
+    """
+    Get the character trigrams of a string, after it has been processed in the
+    same way as the fuzzy matching does. Each word is padded so that the starts
+    and ends of words count for more.
+
+    :type  string: str
+    :param string:
+        The string to get the trigrams of.
+
+    :rtype: set(str)
+    :return:
+        The trigrams.
+
+    >>> sorted(_trigrams('Let It-Be'))
+    ['  b', '  i', '  l', ' be', ' it', ' le', 'be ', 'et ', 'it ', 'let']
+    """
+    result = set()
+    for word in utils.full_process(string, force_ascii=True).split():
+        padded = '  %s ' % (word,)
+        result.update(padded[i:i + 3] for i in range(len(padded) - 2))
+    return result
+
+
+def _tidy(string):
+    """
+    Sanitise a string for use as a key in the indices. This attempts to do a
+    little data cleaning along the way.
+
+    :type  string: str
+    :param string:
+        The string to tidy.
+
+    :rtype: str
+    :return:
+       The tidied string, or None.
+
+    >>> _tidy(' Beatles,_The ')
+    'the beatles'
+    >>> _tidy('_') is None
+    True
+    """
+    # Deal with empty strings
+    string = _clean_string(string)
+    if string is None:
+        return None
+
+    # Handle "_"s instead of spaces
+    string = string.replace('_', ' ')
+    string = _clean_string(string)
+    if string is None:
+        return None
+
+    # Put ", The" back on the front
+    if string.endswith(' The'):
+        if string.endswith(', The'):
+            string = "The " + string[:-5]
+        else:
+            string = "The " + string[:-4]
+
+    # And, finally, make it all lower case so that we don't get fooled by funny
+    # capitalisation
+    return string.lower()
+
+
 def _clean_string(string):
     """
     Turn empty strings into None and remove surrounding whitespace.
@@ -515,6 +1480,28 @@ def _clean_string(string):
     return string
 
 
+def _intern(string):
+    """
+    Intern a string, so that equal ones share the same memory.
+
+    :type  string: str
+    :param string:
+        The string to intern, or None.
+
+    :rtype: str
+    :return:
+       The interned string, or None.
+
+    >>> _intern(None) is None
+    True
+    >>> _intern(''.join(('A', 'BBA'))) is _intern(''.join(('AB', 'BA')))
+    True
+    """
+    if string is None:
+        return None
+    return sys.intern(string)
+
+
 def _clean_int(integer):
     """
     Turn a value into an integer, taking strings and yielding None where
@@ -0,0 +1,342 @@
+"""
+Simple metrics for keeping an eye on how the system is performing.
+"""
+
+from   contextlib import contextmanager
+from   threading  import Lock
+
+import math
+import time
+
+# ------------------------------------------------------------------------------
+
+class Histogram(object):
+    """
+    A thread-safe histogram of values, bucketed on a logarithmic scale.
+
+    This is intended for things like latencies, where we care about the order of
+    magnitude more than the exact value.
+
+    >>> h = Histogram('latency', unit='s')
+    >>> for v in (0.001, 0.002, 0.002, 0.010, 0.500):
+    ...     h.add(v)
+    >>> h.count
+    5
+    >>> round(h.mean, 4)
+    0.103
+    >>> h.percentile(50) <= 0.0025
+    True
+    >>> h.percentile(100) >= 0.5
+    True
+    >>> h.add(-1)
+    Traceback (most recent call last):
+    ...
+    ValueError: Negative value: -1
+    """
+    def __init__(self, name, unit='', base=2.0, minimum=1e-6):
+        """
+        :type  name: str
+        :param name:
+            The name of the histogram, for printing.
+        :type  unit: str
+        :param unit:
+            The units of the values, for printing.
+        :type  base: float
+        :param base:
+            The ratio between the upper bounds of adjacent buckets.
+        :type  minimum: float
+        :param minimum:
+            The upper bound of the smallest bucket. Anything smaller than this
+            is placed into that bucket.
+        """
+        if base <= 1.0:
+            raise ValueError("Base must be greater than 1: %s" % (base,))
+        if minimum <= 0.0:
+            raise ValueError("Minimum must be positive: %s" % (minimum,))
+
+        self._name    = str(name)
+        self._unit    = str(unit)
+        self._base    = float(base)
+        self._minimum = float(minimum)
+        self._buckets = {}
+        self._count   = 0
+        self._total   = 0.0
+        self._max     = None
+        self._lock    = Lock()
+
+
+    @property
+    def name(self):
+        """
+        The name of this histogram.
+        """
+        return self._name
+
+
+    @property
+    def count(self):
+        """
+        How many values have been added.
+        """
+        return self._count
+
+
+    @property
+    def mean(self):
+        """
+        The mean of the values added, or ``None`` if there are none.
+        """
+        with self._lock:
+            if self._count == 0:
+                return None
+            return self._total / self._count
+
+
+    @property
+    def max(self):
+        """
+        The largest value added, or ``None`` if there are none.
+        """
+        return self._max
+
+
+    def add(self, value):
+        """
+        Add a value to the histogram.
+
+        :type  value: float
+        :param value:
+            The value to add. Must not be negative.
+        """
+        if value < 0:
+            raise ValueError("Negative value: %s" % (value,))
+
+        index = self._index(value)
+        with self._lock:
+            self._buckets[index] = self._buckets.get(index, 0) + 1
+            self._count += 1
+            self._total += value
+            if self._max is None or value > self._max:
+                self._max = value
+
+
+    def percentile(self, pct):
+        """
+        Get the upper bound of the bucket which holds the given percentile.
+
+        :type  pct: float
+        :param pct:
+            The percentile, between 0 and 100.
+
+        :return: The bucket's upper bound, or ``None`` if nothing was added.
+        """
+        with self._lock:
+            if self._count == 0:
+                return None
+            want = max(1, math.ceil(self._count * pct / 100.0))
+            seen = 0
+            for index in sorted(self._buckets):
+                seen += self._buckets[index]
+                if seen >= want:
+                    return self._upper(index)
+            return self._upper(max(self._buckets))
+
+
+    def buckets(self):
+        """
+        Get the non-empty buckets.
+
+        :rtype: tuple
+        :return:
+            A tuple of ``(upper_bound, count)`` pairs, in ascending order.
+        """
+        with self._lock:
+            return tuple((self._upper(index), self._buckets[index])
+                         for index in sorted(self._buckets))
+
+
+    def reset(self):
+        """
+        Clear out all the values.
+        """
+        with self._lock:
+            self._buckets = {}
+            self._count   = 0
+            self._total   = 0.0
+            self._max     = None
+
+
+    def _index(self, value):
+        """
+        The bucket index for the given value.
+        """
+        if value <= self._minimum:
+            return 0
+        return int(math.ceil(math.log(value / self._minimum, self._base)))
+
+
+    def _upper(self, index):
+        """
+        The upper bound of the bucket with the given index.
+        """
+        return self._minimum * self._base ** index
+
+
+    def __str__(self):
+        if self._count == 0:
+            return "%s: <empty>" % (self._name,)
+        return "%s: count=%d mean=%0.4g%s p50<=%0.4g%s p90<=%0.4g%s " \
+               "p99<=%0.4g%s max=%0.4g%s" % (
+                   self._name,
+                   self._count,
+                   self.mean,            self._unit,
+                   self.percentile(50),  self._unit,
+                   self.percentile(90),  self._unit,
+                   self.percentile(99),  self._unit,
+                   self._max,            self._unit
+               )
+
+
+class Timeline(object):
+    """
+    A thread-safe record of when the phases of something happened, like the
+    startup of the components, so that we can see where the time went.
+
+    >>> t = Timeline('Startup', start=0.0)
+    >>> t.add('Foo', 'import', 0.0, 0.5)
+    >>> t.add('Foo', 'start',  0.5, 1.0)
+    >>> t.add('Bar', 'import', 0.0, 1.0)
+    >>> t.durations()
+    {'Foo': {'import': 0.5, 'start': 0.5}, 'Bar': {'import': 1.0}}
+    >>> t.totals()
+    {'import': 1.0, 'start': 0.5}
+    >>> print(t.format(width=10))
+    Startup took 1.00s
+      Foo |iiiiisssss| import=0.50s start=0.50s
+      Bar |iiiiiiiiii| import=1.00s
+    """
+    def __init__(self, name, start=None):
+        """
+        :type  name: str
+        :param name:
+            The name of the timeline, for printing.
+        :type  start: float
+        :param start:
+            When the timeline starts, in ``time.monotonic()`` seconds. If this is
+            not given then it starts now.
+        """
+        self._name   = str(name)
+        self._start  = time.monotonic() if start is None else float(start)
+        self._events = []
+        self._lock   = Lock()
+
+
+    def add(self, who, phase, start, end):
+        """
+        Add a phase to the timeline.
+
+        :param who:
+            What the phase is for, like a component.
+        :type  phase: str
+        :param phase:
+            The name of the phase.
+        :type  start: float
+        :param start:
+            When the phase started, in ``time.monotonic()`` seconds.
+        :type  end: float
+        :param end:
+            When the phase ended, in ``time.monotonic()`` seconds.
+        """
+        with self._lock:
+            self._events.append((who, phase, start, end))
+
+
+    @contextmanager
+    def record(self, who, phase):
+        """
+        A context manager which adds a phase covering its body.
+
+        @see add()
+        """
+        start = time.monotonic()
+        try:
+            yield
+        finally:
+            self.add(who, phase, start, time.monotonic())
+
+
+    def durations(self):
+        """
+        How long each phase took for each thing.
+
+        :rtype: dict
+        :return:
+            A dict of dicts, keyed by who and then by phase, in the order in
+            which they were added.
+        """
+        result = {}
+        for (who, phase, start, end) in self._snapshot():
+            times = result.setdefault(who, {})
+            times[phase] = times.get(phase, 0.0) + (end - start)
+        return result
+
+
+    def totals(self):
+        """
+        How long each phase took overall, from when the first one of its kind
+        started to when the last one ended.
+
+        :rtype: dict
+        :return:
+            A dict keyed by phase, in the order in which they were added.
+        """
+        spans = {}
+        for (_, phase, start, end) in self._snapshot():
+            (first, last) = spans.get(phase, (start, end))
+            spans[phase] = (min(first, start), max(last, end))
+        return {phase: last - first for (phase, (first, last)) in spans.items()}
+
+
+    def format(self, width=40):
+        """
+        Render the timeline as text, with a bar for each thing showing when its
+        phases happened. Each phase is drawn using its first letter.
+
+        :type  width: int
+        :param width:
+            How many characters wide to make the bars.
+        """
+        events = self._snapshot()
+        end    = max([e for (_, _, _, e) in events] + [self._start])
+        scale  = width / max(end - self._start, 1e-9)
+
+        # Draw the bars, rounding the ends of the phases to the nearest char
+        bars = {}
+        for (who, phase, start, stop) in events:
+            bar   = bars.setdefault(who, [' '] * width)
+            left  = min(width - 1, round((start - self._start) * scale))
+            right = min(width, max(left + 1, round((stop - self._start) * scale)))
+            for index in range(left, right):
+                bar[index] = phase[0]
+
+        durations = self.durations()
+        name_len  = max([len(str(who)) for who in bars] + [0])
+        lines = ["%s took %0.2fs" % (self._name, end - self._start)]
+        for (who, bar) in bars.items():
+            lines.append("  %-*s |%s| %s" %
+                         (name_len, who, ''.join(bar),
+                          ' '.join('%s=%0.2fs' % item
+                                   for item in durations[who].items())))
+        return '\n'.join(lines)
+
+
+    def _snapshot(self):
+        """
+        A copy of the events, safe to iterate over.
+        """
+        with self._lock:
+            return tuple(self._events)
+
+
+    def __str__(self):
+        return self.format()
@@ -7,7 +7,7 @@ from   dexter.core.log import LOG
 from   fuzzywuzzy      import fuzz
 from   threading       import Lock
 
-import numpy
+import functools
 import re
 
 # ------------------------------------------------------------------------------
@@ -250,6 +250,10 @@ COLORS = _Colors()
 
 _PYGAME_LOCK = Lock()
 
+# The memoised functions, by name, and how many values each one remembers
+_MEMOISED      = dict()
+_MEMOISE_LIMIT = 4096
+
 _WORDS_TO_NUMBERS = _WordsToNumbers()
 
 _LOWER   = ''.join(chr(i) for i in range(ord('a'), ord('z') + 1))
@@ -525,6 +529,65 @@ def get_pygame():
         return pygame
 
 
+def _memoise(function):
+    """
+    Decorate a pure function so that its results are remembered, in a bounded
+    and thread-safe way. Calls with unhashable arguments are passed straight
+    through.
+    """
+    cached = functools.lru_cache(maxsize=_MEMOISE_LIMIT, typed=True)(function)
+
+    @functools.wraps(function)
+    def wrapper(*args):
+        try:
+            hash(args)
+        except TypeError:
+            return function(*args)
+        return cached(*args)
+
+    wrapper.cache_info  = cached.cache_info
+    wrapper.cache_clear = cached.cache_clear
+    _MEMOISED[function.__name__] = wrapper
+    return wrapper
+
+
+def normaliser_stats():
+    """
+    Get the hit and miss counts of the memoised word normalisation functions.
+
+    >>> to_letters('xyzzy')
+    'xyzzy'
+    >>> to_letters('xyzzy')
+    'xyzzy'
+    >>> normaliser_stats()['to_letters']['hits'] > 0
+    True
+
+    :rtype: dict
+    :return:
+        A dict of function name to a dict of its ``hits``, ``misses``, current
+        ``size`` and ``limit``.
+    """
+    result = dict()
+    for (name, function) in _MEMOISED.items():
+        info = function.cache_info()
+        result[name] = {
+            'hits'   : info.hits,
+            'misses' : info.misses,
+            'size'   : info.currsize,
+            'limit'  : info.maxsize,
+        }
+    return result
+
+
+def clear_normaliser_caches():
+    """
+    Forget everything which the memoised word normalisation functions have
+    remembered, and reset their counts.
+    """
+    for function in _MEMOISED.values():
+        function.cache_clear()
+
+
 def _strip_to(string, alphabet):
     """
     Remove non-alphabet contents from a word.
@@ -542,6 +605,7 @@ def _strip_to(string, alphabet):
                    if  char in alphabet)
 
 
+@_memoise
 def to_letters(string):
     """
     Remove non-letters from a string.
@@ -562,6 +626,7 @@ def to_letters(string):
     return _strip_to(string, _UPPER + _LOWER)
 
 
+@_memoise
 def to_alphanumeric(string):
     """
     Remove non-letters and non-numbers from a string.
@@ -657,11 +722,8 @@ def parse_number(words):
             return None
 
         # Split up the digits to parse them.
-        digits = numpy.array([parse_number(digit)
-                              for digit in decimal.split(' ')])
-        if None in digits        or \
-           numpy.any(digits < 0) or \
-           numpy.any(digits > 9):
+        digits = [parse_number(digit) for digit in decimal.split(' ')]
+        if any(d is None or d < 0 or d > 9 for d in digits):
             LOG.error("'%s' was not a valid decimal" % (words,))
             return None
 
@@ -677,6 +739,7 @@ def parse_number(words):
             return None
 
 
+@_memoise
 def number_to_words(value):
     """
     Turn a number into words.
@@ -914,6 +977,10 @@ def fuzzy_list_range(list_,
     (0, 2, 86)
     >>> fuzzy_list_range(['format', 'c', 'colon'], ('format', 'sea', 'colon'))
     (0, 3, 100)
+    >>> fuzzy_list_range('set a timer for 5 minutes'.split(), ('set', 'a', 'timer'))
+    (0, 3, 100)
+    >>> fuzzy_list_range('please could you set a timer'.split(), ('set', 'timer'))
+    (3, 6, 90)
     """
     # Sanity
     if list_ is None:
@@ -929,26 +996,9 @@ def fuzzy_list_range(list_,
     LOG.debug("Given '%s' to look for in '%s'",
               ' '.join(sublist), ' '.join(list_[start:]))
 
-    # Since we're doing fuzzy matching let's make these into words
-    def as_word(entry):
-        """
-        Perform normalisation on the given word.
-        """
-        try:
-            value = float(entry)
-            if value == int(value):
-                value = number_to_words(int(value))
-            else:
-                value = number_to_words(value)
-        except:
-            value = to_alphanumeric(entry.lower())
-        if homonize_words:
-            value = homonize(value)
-        return value
-
-    # Turn the given lists into words
-    subwords = tuple(as_word(e) for e in sublist)
-    words    = tuple(as_word(e) for e in list_  )
+    # Since we're doing fuzzy matching let's turn the given lists into words
+    subwords = tuple(_as_word(e, homonize_words) for e in sublist)
+    words    = tuple(_as_word(e, homonize_words) for e in list_  )
     LOG.debug("Looking for '%s' in '%s'",
               ' '.join(subwords), ' '.join(words[start:]))
 
@@ -976,10 +1026,24 @@ def fuzzy_list_range(list_,
                 best = (index, len(words), score)
     else:
         # We have a multi-element sublist, we are going to look for the best
-        # matching sublist. This is going to be O(n^2) I'm afraid.
-        query = ' '.join(subwords)
+        # matching sublist. There are O(n^2) slices but we only score the ones
+        # whose length means that they could beat what we have so far. For any
+        # given start that's a window which is bounded by the query's length.
+        query   = ' '.join(subwords)
+        offsets = _slice_offsets(words)
         for s in range(start, len(words)):
             for e in range(s + 1, len(words) + 1):
+                # Skip this slice if it can't do better than what we have. If
+                # it's too long then all the following ones will be too.
+                length = offsets[e] - offsets[s] - 1
+                needed = threshold if best is None else max(threshold,
+                                                            best[2] + 1)
+                if _max_ratio(len(query), length) < needed - 0.5:
+                    if length > len(query):
+                        break
+                    else:
+                        continue
+
                 phrase = ' '.join(words[s:e])
                 score = fuzz.ratio(query, phrase)
                 LOG.debug("Checking '%s' in [%d:%d] '%s' gives %d",
@@ -994,6 +1058,276 @@ def fuzzy_list_range(list_,
         return best
 
 
+def _slice_offsets(words):
+    """
+    Get the offsets of the words in the string formed by joining them with
+    spaces, plus one. This means that the length of ``' '.join(words[s:e])`` is
+    ``offsets[e] - offsets[s] - 1``, for ``s < e``.
+
+    >>> words = ('what', 'is', 'a', 'fish')
+    >>> offsets = _slice_offsets(words)
+    >>> offsets[4] - offsets[1] - 1 == len(' '.join(words[1:4]))
+    True
+    """
+    offsets = [0]
+    for word in words:
+        offsets.append(offsets[-1] + len(word) + 1)
+    return offsets
+
+
+def _max_ratio(length_a, length_b):
+    """
+    The highest score which `fuzz.ratio()` could give back for two strings with
+    the given lengths, before rounding. The ratio is based on twice the number of
+    matching characters over the total length, and the number of matching
+    characters can be no more than the length of the shorter string.
+
+    >>> _max_ratio(4, 4)
+    100.0
+    >>> _max_ratio(2, 6)
+    50.0
+    >>> _max_ratio(0, 0)
+    100.0
+    """
+    total = length_a + length_b
+    if total == 0:
+        # Two empty strings are the same
+        return 100.0
+    return 200.0 * min(length_a, length_b) / total
+
+
+@_memoise
+def _as_word(entry, homonize_words):
+    """
+    Perform normalisation on the given word, for the purposes of fuzzy matching.
+
+    >>> _as_word('7', True)
+    'seven'
+    >>> _as_word('Sea', True)
+    'see'
+    >>> _as_word('Sea', False)
+    'sea'
+    """
+    try:
+        value = float(entry)
+        if value == int(value):
+            value = number_to_words(int(value))
+        else:
+            value = number_to_words(value)
+    except:
+        value = to_alphanumeric(entry.lower())
+    if homonize_words:
+        value = homonize(value)
+    return value
+
+
+class PhraseIndex(object):
+    """
+    A registry of the fixed phrases which services look for in what they are
+    given.
+
+    The phrases are normalised once, when they are registered, and an utterance
+    is matched against all of them in one go, the first time that any service
+    asks about it. Subsequent lookups for the same utterance are answered from
+    the results of that.
+
+    >>> index = PhraseIndex()
+    >>> index.register(('a', 'fish'))
+    >>> index.register(('whit', 'is'))
+    >>> index.find('whot is a fash'.split(' '), ('a', 'fish'))
+    (2, 4, 83)
+    >>> index.find(['what', 'is', 'a', 'fish'], ('whit', 'is'))
+    (0, 2, 86)
+    >>> index.match(['what', 'is', 'a', 'fish'])[('a', 'fish')]
+    (2, 4, 100)
+    >>> index.find(['a', 'dog'], ('a', 'fish'))
+    Traceback (most recent call last):
+    ...
+    ValueError: ('a', 'fish') not found in ['a', 'dog']
+    >>> index.unregister(('a', 'fish'))
+    >>> len(index)
+    1
+    """
+    # How many of the most recent utterances we remember the results for. We
+    # need more than one since different services may normalise the words
+    # differently before asking about them.
+    _CACHE_SIZE = 16
+
+    # The lowest score which we keep track of. This lets us skip slices which
+    # could never score well enough to be interesting. Anything which wants a
+    # lower threshold than this goes to fuzzy_list_range() instead.
+    _MIN_THRESHOLD = 50
+
+    def __init__(self):
+        # Phrase to (normalised words, reference count)
+        self._phrases = {}
+
+        # The cache of results for recently seen utterances, keyed by their
+        # normalised words. This is a dict since they preserve insertion order,
+        # which we use to evict the oldest entries.
+        self._cache = {}
+
+        # For guarding the above
+        self._lock = Lock()
+
+
+    def register(self, phrase):
+        """
+        Register a phrase to be looked for in utterances.
+
+        Phrases are reference counted so that multiple services may register,
+        and unregister, the same ones.
+
+        :type  phrase: tuple<str>
+        :param phrase:
+            The words of the phrase.
+        """
+        phrase = tuple(phrase)
+        if len(phrase) == 0:
+            raise ValueError("Empty phrase")
+        with self._lock:
+            if phrase in self._phrases:
+                (subwords, count) = self._phrases[phrase]
+            else:
+                (subwords, count) = (tuple(_as_word(e, True) for e in phrase),
+                                     0)
+            self._phrases[phrase] = (subwords, count + 1)
+            self._cache.clear()
+
+
+    def unregister(self, phrase):
+        """
+        Remove a phrase which was previously registered.
+
+        :type  phrase: tuple<str>
+        :param phrase:
+            The words of the phrase.
+        """
+        phrase = tuple(phrase)
+        with self._lock:
+            if phrase not in self._phrases:
+                return
+            (subwords, count) = self._phrases[phrase]
+            if count > 1:
+                self._phrases[phrase] = (subwords, count - 1)
+            else:
+                del self._phrases[phrase]
+            self._cache.clear()
+
+
+    def match(self, words):
+        """
+        Match all the registered phrases against the given words.
+
+        :type  words: list<str> or tuple<str>
+        :param words:
+            The words of the utterance.
+
+        :rtype: dict
+        :return:
+            A dict of phrase to its best C{start, end, score} tuple, in the same
+            form as `fuzzy_list_range()` gives back. Phrases which didn't score
+            at least `_MIN_THRESHOLD` anywhere will be missing. The score may be
+            below any threshold that the caller cares about.
+        """
+        words = tuple(_as_word(e, True) for e in words)
+        with self._lock:
+            results = self._cache.get(words)
+            if results is None:
+                results = self._match(words)
+                while len(self._cache) >= self._CACHE_SIZE:
+                    del self._cache[next(iter(self._cache))]
+                self._cache[words] = results
+            return results
+
+
+    def find(self, list_, sublist, start=0, threshold=80):
+        """
+        A drop-in replacement for `fuzzy_list_range()`, for when C{list_} is an
+        utterance and C{sublist} is a phrase. If the phrase is registered then
+        the answer comes from `match()`, else we fall back to calling
+        `fuzzy_list_range()`.
+
+        @see fuzzy_list_range()
+        """
+        if (start == 0                         and
+            threshold >= self._MIN_THRESHOLD   and
+            list_     is not None              and
+            sublist   is not None):
+            sublist = tuple(sublist)
+            if sublist in self._phrases and len(list_) > 0:
+                best = self.match(list_).get(sublist)
+                if best is not None and best[2] >= threshold:
+                    return best
+                else:
+                    raise ValueError("%s not found in %s" % (sublist, list_))
+
+        # Not one of ours
+        return fuzzy_list_range(list_,
+                                sublist,
+                                start    =start,
+                                threshold=threshold)
+
+
+    def _match(self, words):
+        """
+        Match all the phrases against the given normalised words. This has the
+        same semantics as `fuzzy_list_range()`, including for ties, but it only
+        creates each slice of the words once.
+        """
+        phrases = dict((phrase, subwords)
+                       for (phrase, (subwords, _)) in self._phrases.items())
+        results = dict()
+        if len(words) == 0:
+            return results
+
+        # The simple case of a single word
+        if len(words) == 1:
+            for (phrase, subwords) in phrases.items():
+                query = subwords[0]
+                if query == words[0]:
+                    results[phrase] = (0, 1, 100)
+                else:
+                    results[phrase] = (0, 1, fuzz.ratio(query, words[0]))
+            return results
+
+        # Otherwise look at all the slices, just once, and score all the phrases
+        # against each one. As with fuzzy_list_range() we skip scoring any
+        # phrases which can't do better than what they have, given the slice's
+        # length, and we stop looking at longer slices once none of the
+        # phrases could match them.
+        queries = tuple((phrase, ' '.join(subwords))
+                        for (phrase, subwords) in phrases.items())
+        longest = max(len(query) for (_, query) in queries)
+        offsets = _slice_offsets(words)
+        for s in range(len(words)):
+            for e in range(s + 1, len(words) + 1):
+                length = offsets[e] - offsets[s] - 1
+                if (length > longest and
+                    _max_ratio(longest, length) < self._MIN_THRESHOLD - 0.5):
+                    break
+
+                slice_ = None
+                for (phrase, query) in queries:
+                    best   = results.get(phrase)
+                    needed = (self._MIN_THRESHOLD if best is None else
+                              max(self._MIN_THRESHOLD, best[2] + 1))
+                    if _max_ratio(len(query), length) < needed - 0.5:
+                        continue
+                    if slice_ is None:
+                        slice_ = ' '.join(words[s:e])
+                    score = fuzz.ratio(query, slice_)
+                    if score >= self._MIN_THRESHOLD and (best is None or
+                                                         best[2] < score):
+                        results[phrase] = (s, e, score)
+        return results
+
+
+    def __len__(self):
+        return len(self._phrases)
+
+
+@_memoise
 def homonize(word):
     """
     Given a word, return its "normlised" homophone. Case and punctuation will
@@ -1079,4 +1413,6 @@ def as_tuple(obj):
     except TypeError:
         return [obj]
 
-    
+# ------------------------------------------------------------------------------
+
+PHRASES = PhraseIndex()
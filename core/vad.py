@@ -0,0 +1,459 @@
+"""
+Voice activity detection, for spotting when someone starts and stops talking.
+
+The detectors are fed successive chunks of raw audio and say whether they think
+that someone is talking. They run continuously, often on small machines which
+are also busy decoding speech, so they try to do a small, fixed amount of work
+for each chunk.
+"""
+
+from   bisect          import bisect_left, insort
+from   collections     import deque
+from   dexter.core.log import LOG
+
+import audioop
+import math
+import numpy
+
+# ------------------------------------------------------------------------------
+
+class RunningMedian(object):
+    """
+    The median of a sliding window of values, maintained incrementally.
+
+    The median is the value at ``int(len(window) * 0.5)`` in the sorted window,
+    i.e. the upper median for an even-sized window.
+
+    >>> m = RunningMedian(3)
+    >>> m.median is None
+    True
+    >>> [m.push(v) for v in (5, 1, 3, 9)]
+    [None, None, None, 5]
+    >>> m.median
+    3
+    >>> (len(m), m.is_full)
+    (3, True)
+    """
+    def __init__(self, size):
+        """
+        :type  size: int
+        :param size:
+            The size of the window.
+        """
+        if size < 1:
+            raise ValueError("Bad window size: %s" % (size,))
+
+        # The values in the order which they arrived, and also in sorted order.
+        # The windows are small (tens of values) so keeping a sorted list is
+        # cheaper than anything cleverer.
+        self._window = deque(maxlen=int(size))
+        self._sorted = []
+
+
+    @property
+    def median(self):
+        """
+        The median of the window, or ``None`` if it is empty.
+        """
+        if len(self._sorted) == 0:
+            return None
+        return self._sorted[int(len(self._sorted) * 0.5)]
+
+
+    @property
+    def is_full(self):
+        """
+        Whether the window is full.
+        """
+        return len(self._window) == self._window.maxlen
+
+
+    def push(self, value):
+        """
+        Add a value into the window.
+
+        :return: The value which fell out of the window, if any.
+        """
+        evicted = None
+        if self.is_full:
+            evicted = self._window.popleft()
+            del self._sorted[bisect_left(self._sorted, evicted)]
+        self._window.append(value)
+        insort(self._sorted, value)
+        return evicted
+
+
+    def __len__(self):
+        return len(self._window)
+
+
+class VoiceDetector(object):
+    """
+    The base class for voice activity detectors.
+    """
+    def __init__(self, read_rate, min_secs, max_secs):
+        """
+        :type  read_rate: float
+        :param read_rate:
+            The number of chunks which we expect to be given per second.
+        :type  min_secs: float
+        :param min_secs:
+            The minimum amount of time someone is deemed to be talking for.
+        :type  max_secs: float
+        :param max_secs:
+            The maximum amount of time someone is deemed to be talking for.
+            After this we give up on them, since we were probably fooled.
+        """
+        self._read_rate     = float(read_rate)
+        self._min_secs      = float(min_secs)
+        self._max_secs      = float(max_secs)
+        self._talking       = False
+        self._talking_start = 0
+
+
+    @property
+    def lead_chunks(self):
+        """
+        How many chunks before the detected start of speech might also contain
+        it. The caller should keep at least these around for recording.
+        """
+        # Subclasses should implement this
+        raise NotImplementedError("Abstract method called")
+
+
+    @property
+    def talking(self):
+        """
+        Whether we currently think that someone is talking.
+        """
+        return self._talking
+
+
+    def update(self, chunk, now):
+        """
+        Feed in the next chunk of audio.
+
+        :type  chunk: bytes
+        :param chunk:
+            The raw audio data.
+        :type  now: float
+        :param now:
+            The time at which the chunk was read.
+
+        :rtype: bool
+        :return:
+            Whether someone is talking, or ``None`` if we have not yet heard
+            enough to be able to say.
+        """
+        if not self._analyse(chunk):
+            return None
+
+        if not self._talking:
+            if self._is_start():
+                self._talking       = True
+                self._talking_start = now
+        elif now - self._talking_start > self._min_secs and self._is_end():
+            self._talking = False
+
+        # If the talking has been going on too long then just stop it. Quite
+        # possibly the capture was fooled.
+        if self._talking and now - self._talking_start > self._max_secs:
+            LOG.info("Talking lasted over %ds; pushing to False" %
+                     self._max_secs)
+            self._talking = False
+
+        return self._talking
+
+
+    def _analyse(self, chunk):
+        """
+        Take in the next chunk of audio.
+
+        :return: Whether we have now seen enough audio to be able to detect.
+        """
+        # Subclasses should implement this
+        raise NotImplementedError("Abstract method called")
+
+
+    def _is_start(self):
+        """
+        Whether the latest audio looks like the start of speech.
+        """
+        # Subclasses should implement this
+        raise NotImplementedError("Abstract method called")
+
+
+    def _is_end(self):
+        """
+        Whether the latest audio looks like the end of speech.
+        """
+        # Subclasses should implement this
+        raise NotImplementedError("Abstract method called")
+
+
+class LevelDetector(VoiceDetector):
+    """
+    Detects speech by looking for a step change in the median level of the
+    audio, as measured by the RMS of each chunk.
+
+    The last few seconds of levels are split into an earlier and a later window
+    and we look for the later one being much louder (the start of speech) or
+    quieter (the end of speech) than the earlier one.
+    """
+    def __init__(self, read_rate, width, min_secs=2, max_secs=10):
+        """
+        @see VoiceDetector.__init__()
+
+        :type  width: int
+        :param width:
+            The number of bytes in each audio frame.
+        """
+        super().__init__(read_rate, min_secs, max_secs)
+
+        # We look at the last four seconds of levels. The index from the end at
+        # which we cut it into two is where we look for a change from
+        # background to noisy, or vice versa.
+        size = int(4.0 * read_rate)
+        self._avg_idx = size // 3
+        self._width   = int(width)
+
+        # Chunks flow into the later window, and from there into the earlier
+        # one
+        self._from = RunningMedian(size - self._avg_idx)
+        self._to   = RunningMedian(self._avg_idx)
+
+        # The level when speech started
+        self._start_median = None
+
+
+    @property
+    def lead_chunks(self):
+        """
+        @see VoiceDetector.lead_chunks
+        """
+        return self._avg_idx
+
+
+    def _analyse(self, chunk):
+        """
+        @see VoiceDetector._analyse()
+        """
+        # It looks like rms() is the the best measure of the volume but I could
+        # be wrong.
+        level = abs(audioop.rms(chunk, self._width))
+        moved = self._to.push(level)
+        if moved is not None:
+            self._from.push(moved)
+        if not self._from.is_full:
+            return False
+
+        LOG.debug("Levels are from=%0.2f to=%0.2f",
+                  self._from.median, self._to.median)
+        return True
+
+
+    def _is_start(self):
+        """
+        @see VoiceDetector._is_start()
+        """
+        # Looking for a step up in the latter part
+        from_median = self._from.median
+        to_median   = self._to  .median
+        if from_median * 2.0 < to_median:
+            LOG.info("Detected start of speech "
+                     "with levels going from %0.2f to %0.2f" %
+                     (from_median, to_median))
+            self._start_median = from_median
+            return True
+        else:
+            return False
+
+
+    def _is_end(self):
+        """
+        @see VoiceDetector._is_end()
+        """
+        # Looking for a step down in the latter part
+        from_median = self._from.median
+        to_median   = self._to  .median
+        if (from_median > to_median * 1.5 or
+            to_median < self._start_median * 1.1):
+            LOG.info("Detected end of speech "
+                     "with levels going from %0.2f to %0.2f (start %0.2f)" %
+                     (from_median, to_median, self._start_median))
+            return True
+        else:
+            return False
+
+
+class EnergyDetector(VoiceDetector):
+    """
+    Detects speech by classifying short frames of audio as voiced or not, in the
+    style of the WebRTC VAD.
+
+    A frame is voiced if its energy is well above the background noise floor and
+    its zero-crossing rate is that of speech, rather than hiss. Speech starts
+    when most of the recent frames are voiced and ends when nearly all of them
+    are not. Since the window of recent frames is short this notices the end of
+    speech much sooner than the `LevelDetector` does.
+    """
+    def __init__(self,
+                 read_rate,
+                 width,
+                 channels,
+                 rate,
+                 min_secs   =2,
+                 max_secs   =10,
+                 frame_secs =0.02,
+                 window_secs=0.4,
+                 margin_db  =9.0,
+                 max_zcr    =0.35,
+                 start_ratio=0.6,
+                 end_ratio  =0.9,
+                 learn_secs =1.0):
+        """
+        @see VoiceDetector.__init__()
+
+        :type  width: int
+        :param width:
+            The number of bytes in each audio frame. Only 16bit samples are
+            supported.
+        :type  channels: int
+        :param channels:
+            The number of audio channels.
+        :type  rate: int
+        :param rate:
+            The sample rate.
+        :type  frame_secs: float
+        :param frame_secs:
+            The length of the frames which we classify.
+        :type  window_secs: float
+        :param window_secs:
+            The length of the window of frames which we use to decide whether
+            speech is starting or ending.
+        :type  margin_db: float
+        :param margin_db:
+            How far above the noise floor a frame has to be to be voiced.
+        :type  max_zcr: float
+        :param max_zcr:
+            The largest zero-crossing rate which a quieter voiced frame may have.
+        :type  start_ratio: float
+        :param start_ratio:
+            The fraction of the window which must be voiced for speech to start.
+        :type  end_ratio: float
+        :param end_ratio:
+            The fraction of the window which must be unvoiced for speech to end.
+        :type  learn_secs: float
+        :param learn_secs:
+            How long to listen for to learn the noise floor, before we start
+            detecting.
+        """
+        super().__init__(read_rate, min_secs, max_secs)
+
+        if int(width) != 2 * int(channels):
+            raise ValueError(
+                "Only 16bit audio is supported, got width %s for %s channels" %
+                (width, channels)
+            )
+
+        self._channels    = int(channels)
+        self._rate        = int(rate)
+        self._frame_len   = max(1, int(frame_secs * rate))
+        self._window      = deque(maxlen=max(1, int(window_secs / frame_secs)))
+        self._voiced      = 0
+        self._margin_db   = float(margin_db)
+        self._max_zcr     = float(max_zcr)
+        self._start_count = start_ratio * self._window.maxlen
+        self._end_count   = end_ratio   * self._window.maxlen
+        self._learn       = int(learn_secs / frame_secs)
+        self._floor       = None
+        self._in_speech   = False
+
+
+    @property
+    def lead_chunks(self):
+        """
+        @see VoiceDetector.lead_chunks
+        """
+        window_secs = self._window.maxlen * self._frame_len / self._rate
+        return int(math.ceil(window_secs * self._read_rate))
+
+
+    def _analyse(self, chunk):
+        """
+        @see VoiceDetector._analyse()
+        """
+        # Cut the chunk into frames, mixing down to mono if need be. Any
+        # trailing partial frame is dropped; chunks are typically a whole
+        # number of frames long anyhow.
+        samples = numpy.frombuffer(chunk, dtype=numpy.int16)
+        if self._channels > 1:
+            count   = len(samples) // self._channels
+            samples = samples[:count * self._channels]\
+                          .reshape(count, self._channels)\
+                          .mean(axis=1)
+        count  = len(samples) // self._frame_len
+        frames = samples[:count * self._frame_len]\
+                     .reshape(count, self._frame_len)\
+                     .astype(numpy.float32)
+
+        # The energy, in dB, and zero-crossing rate of each frame
+        energies = 10.0 * numpy.log10((frames * frames).mean(axis=1) + 1.0)
+        signs    = numpy.signbit(frames)
+        zcrs     = (signs[:, 1:] != signs[:, :-1]).mean(axis=1)
+
+        # Now classify each frame in turn and see what that does to our state
+        for (energy, zcr) in zip(energies.tolist(), zcrs.tolist()):
+            if self._floor is None:
+                self._floor = energy
+            above  = energy - self._floor
+            voiced = (above > self._margin_db and
+                      (zcr < self._max_zcr or above > 2 * self._margin_db))
+
+            # Track the noise floor. It falls quickly and rises slowly, and
+            # even more slowly when we think someone is talking.
+            if above < 0:
+                self._floor += 0.5   * above
+            elif not voiced:
+                self._floor += 0.05  * above
+            else:
+                self._floor += 0.001 * above
+
+            # Keep count of how many frames in the window are voiced
+            if len(self._window) == self._window.maxlen:
+                self._voiced -= self._window.popleft()
+            self._window.append(int(voiced))
+            self._voiced += int(voiced)
+
+            # And flip with some hysteresis
+            if not self._in_speech:
+                if self._voiced >= self._start_count:
+                    self._in_speech = True
+            else:
+                if self._window.maxlen - self._voiced >= self._end_count:
+                    self._in_speech = False
+
+            if self._learn > 0:
+                self._learn -= 1
+
+        return self._learn == 0
+
+
+    def _is_start(self):
+        """
+        @see VoiceDetector._is_start()
+        """
+        if self._in_speech:
+            LOG.info("Detected start of speech with noise floor %0.1fdB" %
+                     (self._floor,))
+        return self._in_speech
+
+
+    def _is_end(self):
+        """
+        @see VoiceDetector._is_end()
+        """
+        if not self._in_speech:
+            LOG.info("Detected end of speech with noise floor %0.1fdB" %
+                     (self._floor,))
+        return not self._in_speech
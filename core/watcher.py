@@ -0,0 +1,351 @@
+"""
+Watching directory trees for files being added, changed or removed.
+
+On Linux this is done using inotify, via ``ctypes``, so that it costs next to
+nothing while nothing is changing. Elsewhere, or if inotify can't be used (for
+example if we've run out of watches), the trees are polled instead.
+
+Note that inotify only sees changes which are made by this machine, so changes
+made to network storage by other machines will only be noticed by polling.
+"""
+
+from   dexter.core.log import LOG
+from   threading       import Thread
+
+import ctypes
+import ctypes.util
+import os
+import select
+import struct
+import time
+
+# ------------------------------------------------------------------------------
+
+class DirectoryWatcher:
+    """
+    Watch directory trees and tell a callback about the paths which have
+    changed. The changes are gathered up until things settle down, and then
+    handed over in one go.
+    """
+    def __init__(self, dirnames, callback, settle_secs=2.0):
+        """
+        :type  dirnames: tuple(str)
+        :param dirnames:
+            The roots of the directory trees to watch.
+        :type  callback: function(list(str))
+        :param callback:
+            What to call with the paths which have been added, changed or
+            removed. These may be directories, if a whole directory was added or
+            removed. This is called from the watcher's thread.
+        :type  settle_secs: float
+        :param settle_secs:
+            How long to wait for things to go quiet before calling the callback.
+        """
+        self._dirnames = tuple(dirnames)
+        self._callback = callback
+        self._settle   = float(settle_secs)
+        self._running  = False
+        self._thread   = None
+
+
+    def start(self):
+        """
+        Start watching, in a background thread.
+        """
+        if self._running:
+            return
+        self._running = True
+        self._thread = Thread(name=type(self).__name__, target=self._run)
+        self._thread.daemon = True
+        self._thread.start()
+
+
+    def stop(self):
+        """
+        Stop watching.
+        """
+        self._running = False
+
+
+    def _run(self):
+        """
+        Watch for changes until we're stopped. Runs in its own thread.
+        """
+        # Subclasses should implement this
+        raise NotImplementedError("Abstract method called")
+
+
+    def _report(self, paths):
+        """
+        Hand the given paths to the callback.
+        """
+        if len(paths) == 0:
+            return
+        LOG.info("Saw %d changes under %s", len(paths), ', '.join(self._dirnames))
+        try:
+            self._callback(sorted(paths))
+        except Exception as e:
+            LOG.error("Failed to handle changes to %s: %s",
+                      ', '.join(sorted(paths)[:10]), e)
+
+
+class InotifyWatcher(DirectoryWatcher):
+    """
+    Watch directory trees using Linux's inotify.
+    """
+    # The inotify constants which we care about, from <sys/inotify.h>
+    _IN_CLOSE_WRITE = 0x00000008
+    _IN_MOVED_FROM  = 0x00000040
+    _IN_MOVED_TO    = 0x00000080
+    _IN_CREATE      = 0x00000100
+    _IN_DELETE      = 0x00000200
+    _IN_DELETE_SELF = 0x00000400
+    _IN_Q_OVERFLOW  = 0x00004000
+    _IN_IGNORED     = 0x00008000
+    _IN_ONLYDIR     = 0x01000000
+    _IN_ISDIR       = 0x40000000
+
+    # What we ask to be told about
+    _MASK = (_IN_CLOSE_WRITE |
+             _IN_MOVED_FROM  |
+             _IN_MOVED_TO    |
+             _IN_CREATE      |
+             _IN_DELETE      |
+             _IN_DELETE_SELF |
+             _IN_ONLYDIR)
+
+    # The fixed-size part of each event
+    _EVENT = struct.Struct('iIII')
+
+    def __init__(self, dirnames, callback, settle_secs=2.0):
+        """
+        @see DirectoryWatcher.__init__()
+
+        :raises OSError:
+            If inotify can't be used.
+        """
+        super().__init__(dirnames, callback, settle_secs=settle_secs)
+
+        # Hook up to the C library
+        self._libc = ctypes.CDLL(ctypes.util.find_library('c') or 'libc.so.6',
+                                 use_errno=True)
+        if not hasattr(self._libc, 'inotify_init1'):
+            raise OSError("inotify is not available")
+        self._libc.inotify_add_watch.argtypes = (ctypes.c_int,
+                                                 ctypes.c_char_p,
+                                                 ctypes.c_uint32)
+
+        self._fd = self._libc.inotify_init1(os.O_NONBLOCK | os.O_CLOEXEC)
+        if self._fd < 0:
+            errno = ctypes.get_errno()
+            raise OSError(errno, "inotify_init1: %s" % os.strerror(errno))
+
+        # The directories which we're watching, keyed by their watch
+        # descriptors. We add all the watches up front so that, if we're going
+        # to run out of them, we find out now.
+        self._watches = {}
+        try:
+            for dirname in self._dirnames:
+                self._add_watches(dirname, strict=True)
+        except:
+            os.close(self._fd)
+            raise
+        LOG.info("Watching %d directories under %s",
+                 len(self._watches), ', '.join(self._dirnames))
+
+
+    def _add_watches(self, dirname, strict=False):
+        """
+        Watch the given directory, and all the ones under it.
+
+        :type  strict: bool
+        :param strict:
+            Whether failing to add a watch should raise an exception, rather than
+            being grumbled about.
+        """
+        for (subdir, _, _) in os.walk(dirname, followlinks=True):
+            wd = self._libc.inotify_add_watch(self._fd,
+                                              os.fsencode(subdir),
+                                              self._MASK)
+            if wd < 0:
+                errno = ctypes.get_errno()
+                message = "Failed to watch %s: %s" % (subdir,
+                                                      os.strerror(errno))
+                if strict:
+                    raise OSError(errno, message)
+                LOG.warning(message)
+            else:
+                self._watches[wd] = subdir
+
+
+    def _run(self):
+        """
+        @see DirectoryWatcher._run()
+        """
+        changed = set()
+        quiet   = None
+        try:
+            while self._running:
+                # Wait for something to happen. If we have changes then we wait
+                # until things have been quiet for a bit before reporting them.
+                if quiet is None:
+                    timeout = 1.0
+                else:
+                    timeout = max(0.0, min(1.0, quiet - time.monotonic()))
+                (readable, _, _) = select.select((self._fd,), (), (), timeout)
+                if readable:
+                    self._read(changed)
+                    quiet = time.monotonic() + self._settle
+                elif quiet is not None and time.monotonic() >= quiet:
+                    self._report(changed)
+                    changed = set()
+                    quiet   = None
+
+        except Exception as e:
+            LOG.error("Stopped watching %s: %s", ', '.join(self._dirnames), e)
+
+        finally:
+            os.close(self._fd)
+
+
+    def _read(self, changed):
+        """
+        Read all the events which are waiting and note what they changed.
+
+        :type  changed: set(str)
+        :param changed:
+            Where to add the paths which have changed.
+        """
+        while True:
+            try:
+                data = os.read(self._fd, 65536)
+            except BlockingIOError:
+                return
+
+            offset = 0
+            while offset < len(data):
+                (wd, mask, _, length) = self._EVENT.unpack_from(data, offset)
+                offset += self._EVENT.size
+                name = os.fsdecode(data[offset:offset + length].rstrip(b'\0'))
+                offset += length
+
+                # If we missed things then everything might have changed
+                if mask & self._IN_Q_OVERFLOW:
+                    LOG.warning("Missed changes under %s",
+                                ', '.join(self._dirnames))
+                    changed.update(self._dirnames)
+                    continue
+
+                # Forget about directories which have gone away
+                if mask & self._IN_IGNORED:
+                    self._watches.pop(wd, None)
+                    continue
+
+                dirname = self._watches.get(wd)
+                if dirname is None:
+                    continue
+                if mask & self._IN_DELETE_SELF:
+                    changed.add(dirname)
+                    continue
+                path = os.path.join(dirname, name)
+
+                # New directories need watching. Files are only noted once
+                # they've been written, rather than when they're created.
+                if mask & self._IN_ISDIR:
+                    if mask & (self._IN_CREATE | self._IN_MOVED_TO):
+                        self._add_watches(path)
+                    changed.add(path)
+                elif not mask & self._IN_CREATE:
+                    changed.add(path)
+
+
+class PollingWatcher(DirectoryWatcher):
+    """
+    Watch directory trees by looking at all the files in them every so often.
+    """
+    def __init__(self, dirnames, callback, interval=300):
+        """
+        @see DirectoryWatcher.__init__()
+
+        :type  interval: float
+        :param interval:
+            How often to look, in seconds.
+        """
+        super().__init__(dirnames, callback)
+        self._interval = float(interval)
+
+
+    def _run(self):
+        """
+        @see DirectoryWatcher._run()
+        """
+        LOG.info("Polling %s every %0.0fs",
+                 ', '.join(self._dirnames), self._interval)
+        before = self._snapshot()
+        while self._running:
+            # Wait for the next go, noticing if we're stopped
+            wake = time.monotonic() + self._interval
+            while self._running and time.monotonic() < wake:
+                time.sleep(min(1.0, wake - time.monotonic()))
+            if not self._running:
+                break
+
+            # See what's different
+            after = self._snapshot()
+            self._report(set(path
+                             for path in before.keys() | after.keys()
+                             if before.get(path) != after.get(path)))
+            before = after
+
+
+    def _snapshot(self):
+        """
+        Get the modification time and size of all the files.
+
+        :rtype: dict
+        :return:
+            The ``(mtime_ns, size)`` tuples, keyed by path.
+        """
+        result = {}
+        for dirname in self._dirnames:
+            for (subdir, _, filenames) in os.walk(dirname, followlinks=True):
+                for filename in filenames:
+                    path = os.path.join(subdir, filename)
+                    try:
+                        stat = os.stat(path)
+                        result[path] = (stat.st_mtime_ns, stat.st_size)
+                    except OSError:
+                        pass
+        return result
+
+# ------------------------------------------------------------------------------
+
+def create_watcher(dirnames, callback, poll=False, interval=300):
+    """
+    Create the best watcher which we can for the given directory trees. It still
+    needs to be started.
+
+    :type  dirnames: tuple(str)
+    :param dirnames:
+        The roots of the directory trees to watch.
+    :type  callback: function(list(str))
+    :param callback:
+        What to call with the paths which have changed.
+    :type  poll: bool
+    :param poll:
+        Whether to always poll, rather than using inotify.
+    :type  interval: float
+    :param interval:
+        How often to poll, in seconds, if we do.
+
+    :rtype: DirectoryWatcher
+    :return:
+        The watcher.
+    """
+    if not poll:
+        try:
+            return InotifyWatcher(dirnames, callback)
+        except Exception as e:
+            LOG.warning("Can't use inotify to watch %s, polling instead: %s",
+                        ', '.join(dirnames), e)
+    return PollingWatcher(dirnames, callback, interval=interval)
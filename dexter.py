@@ -1,10 +1,13 @@
 #!/usr/bin/env python3
 
+from   threading import Thread
+
 import argh
 import getpass
 import logging
 import pyjson5
 import os
+import signal
 import socket
 import sys
 
@@ -120,31 +123,16 @@ def _replace_envvars_dict(value):
 
 # ------------------------------------------------------------------------------
 
-# Main entry point
-@argh.arg('--log-level', '-L',
-          help="The logging level to use")
-@argh.arg('--config', '-c',
-          help="The JSON configuration file to use")
-def main(log_level=None, config=None):
-    """
-    Dexter is a personal assistant which responds to natural language for its
-    commands.
+def _load_config(filename):
     """
-    # Set the log level, if supplied
-    if log_level is not None:
-        try:
-            LOG.getLogger().setLevel(int(log_level))
-        except:
-            LOG.getLogger().setLevel(log_level.upper())
+    Load in the configuration from the given file, or use the default one if
+    there is no file.
 
-    # Load in any configuration
-    if config is not None:
-        try:
-            with open(config) as fh:
-                configuration = pyjson5.load(fh)
-        except Exception as e:
-            LOG.fatal("Failed to parse config file '%s': %s" % (config, e))
-            sys.exit(1)
+    :return: The configuration, with any environment variables expanded.
+    """
+    if filename is not None:
+        with open(filename) as fh:
+            configuration = pyjson5.load(fh)
     else:
         configuration = CONFIG
 
@@ -168,8 +156,103 @@ def main(log_level=None, config=None):
                     )
                     kwargs[name] = updated[name]
 
+    return configuration
+
+
+def _reload(dexter, filename):
+    """
+    Reload the configuration from the given file and apply it.
+
+    :return: Whether it worked.
+    """
+    try:
+        dexter.reload(_load_config(filename))
+        return True
+    except Exception as e:
+        LOG.error("Failed to reload config file '%s': %s" % (filename, e))
+        return False
+
+
+def _control(dexter, filename, port):
+    """
+    Listen for commands on the given port, on localhost. Each command is a line
+    of text, and the only one which we understand is ``reload``. Each gets a
+    line back saying whether it worked. Runs in its own thread.
+    """
+    listener = socket.create_server(('localhost', port))
+    LOG.info("Listening for control commands on localhost:%d" % (port,))
+    while True:
+        (conn, addr) = listener.accept()
+        try:
+            with conn, conn.makefile('r') as fh:
+                for line in fh:
+                    command = line.strip()
+                    if command == 'reload':
+                        LOG.info("Got reload command from %s" % (addr,))
+                        ok = _reload(dexter, filename)
+                        conn.sendall(b"OK\n" if ok else b"ERROR\n")
+                    elif command:
+                        conn.sendall(
+                            ("ERROR Unknown command: %s\n" % (command,)).encode()
+                        )
+        except Exception as e:
+            LOG.warning("Error handling control connection from %s: %s" %
+                        (addr, e))
+
+
+# ------------------------------------------------------------------------------
+
+# Main entry point
+@argh.arg('--log-level', '-L',
+          help="The logging level to use")
+@argh.arg('--config', '-c',
+          help="The JSON configuration file to use")
+@argh.arg('--control-port',
+          help="The localhost port to listen for commands, like 'reload', on")
+def main(log_level=None, config=None, control_port=None):
+    """
+    Dexter is a personal assistant which responds to natural language for its
+    commands.
+
+    Sending it a SIGHUP, or a 'reload' command via the control port, makes it
+    reload its config file. Only the components which have changed are
+    recreated.
+    """
+    # Set the log level, if supplied
+    if log_level is not None:
+        try:
+            LOG.getLogger().setLevel(int(log_level))
+        except:
+            LOG.getLogger().setLevel(log_level.upper())
+
+    # Load in any configuration
+    try:
+        configuration = _load_config(config)
+    except Exception as e:
+        LOG.fatal("Failed to parse config file '%s': %s" % (config, e))
+        sys.exit(1)
+
     # And spawn it
     dexter = Dexter(configuration)
+
+    # Reloading can take a while, so it happens in its own thread rather than
+    # the signal handler's (which is likely Dexter's main loop)
+    if config is not None:
+        def reload(*args):
+            thread = Thread(name='Reload', target=_reload, args=(dexter, config))
+            thread.daemon = True
+            thread.start()
+        if hasattr(signal, 'SIGHUP'):
+            signal.signal(signal.SIGHUP, reload)
+        if control_port is not None:
+            thread = Thread(name='Control',
+                            target=_control,
+                            args=(dexter, config, int(control_port)))
+            thread.daemon = True
+            thread.start()
+    elif control_port is not None:
+        LOG.warning("Ignoring the control port since there is no config file")
+
     dexter.run()
 
 
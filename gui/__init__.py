@@ -183,15 +183,13 @@ class _GuiInput(Input):
                         for word in str(key_pharse).strip().split()
                         if word]
 
-        self._input = []
-
 
     def write(self, text):
         """
         Write some text to the input.
         """
         if text:
-            self._input.append(
+            self._put(
                 self._prefix +
                 [Token(word.strip(), 1.0, True)
                  for word in str(text).strip().split()
@@ -199,17 +197,6 @@ class _GuiInput(Input):
             )
 
 
-    def read(self):
-        """
-        @see Input.read
-        """
-        if len(self._input) > 0:
-            try:
-                return self._input.pop(0)
-            except:
-                pass
-
-
 
 class _GuiOutput(Output):
     """
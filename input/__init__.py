@@ -4,7 +4,10 @@ How Dexter gets instructions from outside world.
 This might be via speech recognition, a network connection, etc.
 """
 
-from dexter.core import Component
+from   collections import deque
+from   dexter.core import Component
+
+import time
 
 # ------------------------------------------------------------------------------
 
@@ -56,6 +59,15 @@ class Token(object):
 class Input(Component):
     """
     A way to get text from the outside world.
+
+    Inputs hand what they receive to the system by calling `_put()`, which will
+    push it into the queue given to `set_queue()`, waking up the main loop. Older
+    inputs may instead override `read()`, in which case they will be polled.
+
+    Inputs which can tell what is being received before it is complete, like
+    streaming speech-to-text engines, may also hand over their best guess so far
+    via `_put_partial()`. This lets the system get a head start on working out
+    what to do.
     """
     def __init__(self, state):
         """
@@ -63,6 +75,11 @@ class Input(Component):
         """
         super().__init__(state)
 
+        # Where we push what we get, and what we hold if we have nowhere to
+        # push it to yet
+        self._queue   = None
+        self._pending = deque()
+
 
     @property
     def is_input(self):
@@ -72,16 +89,89 @@ class Input(Component):
         return True
 
 
+    @property
+    def is_polled(self):
+        """
+        Whether this input has to be polled via `read()`, rather than it pushing
+        what it gets via `_put()`.
+        """
+        return type(self).read is not Input.read
+
+
+    def set_queue(self, queue):
+        """
+        Set the queue into which this input should push what it receives. Each
+        entry put onto the queue is an ``(input, arrival_time, tokens, final)``
+        tuple, where ``final`` is ``False`` for a partial result.
+
+        Anything which was received before the queue was set is moved onto it.
+
+        :type  queue: queue.Queue
+        :param queue:
+            The queue to push into.
+        """
+        self._queue = queue
+        while queue is not None and len(self._pending) > 0:
+            (arrival_time, tokens) = self._pending.popleft()
+            queue.put((self, arrival_time, tokens, True))
+
+
     def read(self):
         """
         A non-blocking call to get a list of C{element}s from the outside world.
 
         Each C{element} is either a L{str} representing a word or a L{Token}.
 
+        Inputs which push what they get via `_put()` do not need to override
+        this; it will only yield values if no queue has been set.
+
         :rtype: tuple(C{element})
         :return:
             The list of elements received from the outside world, or None if
             nothing was available.
         """
-        # Subclasses should implement this
-        raise NotImplementedError("Abstract method called")
+        try:
+            (_, tokens) = self._pending.popleft()
+            return tokens
+        except IndexError:
+            return None
+
+
+    def _put(self, tokens):
+        """
+        Hand a list of tokens, received from the outside world, to the system.
+
+        :type  tokens: tuple(L{Token})
+        :param tokens:
+            What we received. If this is ``None`` then nothing is done.
+        """
+        if tokens is None:
+            return
+
+        now   = time.time()
+        queue = self._queue
+        if queue is None:
+            self._pending.append((now, tokens))
+        else:
+            queue.put((self, now, tokens, True))
+
+
+    def _put_partial(self, tokens):
+        """
+        Hand a partial list of tokens to the system. This is a guess at what is
+        being received, which will later be superseded by a call to `_put()`.
+
+        Partial results are dropped if no queue has been set, since they would
+        be stale by the time that anyone read them.
+
+        :type  tokens: tuple(L{Token})
+        :param tokens:
+            What we think we have received so far. If this is ``None`` then
+            nothing is done.
+        """
+        if tokens is None:
+            return
+
+        queue = self._queue
+        if queue is not None:
+            queue.put((self, time.time(), tokens, False))
@@ -6,18 +6,22 @@ from   collections     import deque
 from   dexter.input    import Input, Token
 from   dexter.core     import Notifier
 from   dexter.core.log import LOG
-from   threading       import Thread
+from   dexter.core.vad import EnergyDetector, LevelDetector
+from   threading       import Event, Thread
 
-import audioop
-import math
-import numpy
 import os
 import pyaudio
+import queue
 import time
 import wave
 
 # ------------------------------------------------------------------------------
 
+# What we put on the decode queue to tell the handler thread to stop
+_STOP = object()
+
+# ------------------------------------------------------------------------------
+
 class AudioInput(Input):
     """
     Base class for input from audio.
@@ -28,13 +32,22 @@ class AudioInput(Input):
     decoding has fallen behind for some reason.
     """
 
+    _PARTIAL_INTERVAL = 0.5
+    """
+    The minimum number of seconds between attempts to get a partial decoding of
+    what is being heard, when we are doing that.
+    """
+
     def __init__(self,
                  state,
                  chunk_secs=0.1,
                  format    =pyaudio.paInt16,
                  channels  =1,
                  rate      =16000,
-                 wav_dir   =None):
+                 wav_dir   =None,
+                 vad       ='level',
+                 partials  =False,
+                 warmup    =False):
         """
         :type  state: L{State}
         :param state:
@@ -55,6 +68,20 @@ class AudioInput(Input):
         :type  wav_dir: str
         :param wav_dir:
             Where to save WAV files to, if we are doing so.
+        :type  vad: str
+        :param vad:
+            How to detect speech. Either ``level``, which looks for a step change
+            in the audio level over a few seconds, or ``energy``, which
+            classifies short frames using their energy and zero-crossing rate
+            and so notices the end of speech sooner.
+        :type  partials: bool
+        :param partials:
+            Whether to hand over partial decodings of what is being said, while
+            it is still being said. This is only supported by some decoders.
+        :type  warmup: bool
+        :param warmup:
+            Whether to decode some silence once the decoder is ready, so that any
+            lazy initialisation is done then and not for the first utterance.
         """
         super().__init__(state)
 
@@ -68,8 +95,10 @@ class AudioInput(Input):
                                self._width    *
                                self._rate) # makes chunk_size in bytes
 
-        # How we hand off to another thread to decode and handle asynchronously
-        self._decode_queue    = deque()
+        # How we hand off to another thread to decode and handle asynchronously.
+        # This carries a timestamp, then the audio as bytes, and then a None to
+        # denote the end of each clip.
+        self._decode_queue    = queue.Queue()
         self._max_queue_lenth = 100
 
         # Where to save the wav files, if anywhere. This should already exist.
@@ -77,20 +106,16 @@ class AudioInput(Input):
             raise IOError("Not a directory: %s" % wav_dir)
         self._wav_dir = wav_dir
 
-        # What we receive
-        self._output = list()
+        # How we detect speech
+        if vad not in ('level', 'energy'):
+            raise ValueError("Unknown VAD mode: %s" % (vad,))
+        self._vad = vad
 
+        # Whether we want partial results
+        self._partials = bool(partials)
 
-    def read(self):
-        """
-        @see Input.read
-        """
-        if len(self._output) > 0:
-            try:
-                return self._output.pop()
-            except:
-                pass
-        return None
+        # Whether to warm up the decoder
+        self._warmup = bool(warmup)
 
 
     def _start(self):
@@ -107,6 +132,25 @@ class AudioInput(Input):
         thread.start()
 
 
+    def _warm_up(self):
+        """
+        Decode a second of silence, if we were asked to, and note how long it
+        took. Subclasses should call this once their decoder is ready to go.
+        """
+        if not self._warmup:
+            return
+
+        start = time.monotonic()
+        try:
+            self._feed_raw(b'\0' * (self._width * self._rate))
+            self._decode()
+        except Exception as e:
+            LOG.warning("Failed to warm up %s: %s" % (self, e))
+        self._startup_times['warmup'] = time.monotonic() - start
+        LOG.info("Warmed up %s in %0.2fs" %
+                 (self, self._startup_times['warmup']))
+
+
     def _save_bytes(self, data):
         """
         Save the raw bytes to a wav file.
@@ -128,6 +172,36 @@ class AudioInput(Input):
             wf.close()
 
 
+    def _create_detector(self, read_rate, min_secs, max_secs):
+        """
+        Create the voice activity detector for the audio stream.
+
+        :type  read_rate: float
+        :param read_rate:
+            The number of chunks which we will read per second.
+        :type  min_secs: float
+        :param min_secs:
+            The minimum length of a recording.
+        :type  max_secs: float
+        :param max_secs:
+            The maximum length of a recording.
+
+        :rtype: L{VoiceDetector}
+        """
+        if self._vad == 'energy':
+            return EnergyDetector(read_rate,
+                                  self._width,
+                                  self._channels,
+                                  self._rate,
+                                  min_secs=min_secs,
+                                  max_secs=max_secs)
+        else:
+            return LevelDetector(read_rate,
+                                 self._width,
+                                 min_secs=min_secs,
+                                 max_secs=max_secs)
+
+
     def _feed_raw(self, data):
         """
         Feed a chunk of raw data to the decoder.
@@ -140,6 +214,18 @@ class AudioInput(Input):
         raise NotImplementedError("Abstract method called")
 
 
+    def _partial(self):
+        """
+        Decode the raw data fed so far, without finishing the decoding.
+
+        :rtype: tuple(L{Token})
+        :return:
+           The decoded tokens, or ``None`` if the decoder can't do this.
+        """
+        # Subclasses may implement this
+        return None
+
+
     def _decode(self):
         """
         Decode the raw fed data.
@@ -163,22 +249,19 @@ class AudioInput(Input):
         # to many entries in a buffer constitute a second's worth of data.
         read_rate = self._rate / self._chunk_size
 
-        # The buffer of historical audio data. We use the level buffer
-        # to see how the sound is changing.
-        level_buf = deque(maxlen=int(4.0 * read_rate))
+        # Limits on recording
+        min_secs =  2 # <-- Enough for the key-phrase only
+        max_secs = 10 # <-- Plenty?
 
-        # The index from the level buffer's end at which we cut the
-        # level buffer for the purposes of looking for a change in the
-        # audio going from background to noisy, or vice versa. This is
-        # what we are looking for when detecting to start or end of
-        # speech input.
-        avg_idx = level_buf.maxlen // 3
+        # What we use to spot when someone is talking. This keeps track of the
+        # historical audio levels, or similar, to see how the sound is changing.
+        detector = self._create_detector(read_rate, min_secs, max_secs)
 
         # The audio buffer captures the sound up to before we decide
         # to start recording, so that we ensure we've captured
-        # enough. We use the detected start of speech as the size, or
-        # a second, whichever is the bigger.
-        audio_buf = deque(maxlen=max(avg_idx, int(1.0 * read_rate)))
+        # enough. We use the detector's notion of how far back speech
+        # might have started, or a second, whichever is the bigger.
+        audio_buf = deque(maxlen=max(detector.lead_chunks, int(1.0 * read_rate)))
 
         # Start pulling in the audio stream
         p      = pyaudio.PyAudio()
@@ -189,12 +272,9 @@ class AudioInput(Input):
                         frames_per_buffer=self._chunk_size)
 
         # State
-        talking = None  # True when we have detect talking
-        speech  = None  # What we will process as speech data
-
-        # Limits on recording
-        min_secs =  2 # <-- Enough for the key-phrase only
-        max_secs = 10 # <-- Plenty?
+        listening = False # True once the detector is primed
+        recording = False # True when we are recording speech
+        speech    = None  # What we have recorded, if we are saving it
 
         # Init is done, we start off idle
         self._notify(Notifier.IDLE)
@@ -209,113 +289,69 @@ class AudioInput(Input):
             # We'll need this here and there below
             now = time.time()
 
-            # Read in the next lump of data and get its volume. It looks like
-            # rms() is the the best measure of this but I could be wrong.
+            # Read in the next lump of data and accumulate it
             chunk = stream.read(self._chunk_size, exception_on_overflow=False)
-            level = abs(audioop.rms(chunk, self._width))
-
-            # Accumulate into our buffers
             audio_buf.append(chunk)
-            level_buf.append(level)
 
-            # If we have not yet filled up the level buffer then we're done
-            # here. Any analysis etc. will be inaccurate.
-            if len(level_buf) != level_buf.maxlen:
+            # See whether someone is talking. If the detector has not yet heard
+            # enough then we're done here, any analysis etc. will be inaccurate.
+            talking = detector.update(chunk, now)
+            if talking is None:
                 continue
 
-            # Get the averaging window as a numpy array so that we can cut it
-            # and so forth
-            levels = numpy.array(level_buf)
-
-            # Determine the background level of sound. We only do this if we
-            # don't think that anyone is talking. If we are doing this for the
-            # first time then we can note that we have become actively
-            # listening.
-            if talking is None:
+            # If we are doing this for the first time then we can note that we
+            # have become actively listening.
+            if not listening:
                 LOG.info("Listening")
                 self._notify(Notifier.IDLE, expected_mod=expected_mod)
-                talking       = False
-                talking_start = 0
-
-            # We are looking for the background levels. If we think that someone
-            # is talking then the background sound going to be at the end of the
-            # levels, else it will be at the start.
-
-            # Get the median level as we transition
-            from_levels = levels[        :-avg_idx] # From start to avg_idx
-            to_levels   = levels[-avg_idx:        ] # From avg_idx to end
-            from_median = numpy.sort(from_levels)[int(len(from_levels) * 0.5)]
-            to_median   = numpy.sort(to_levels  )[int(len(to_levels  ) * 0.5)]
-            LOG.debug("Levels are from=%0.2f to=%0.2f", from_median, to_median)
-
-            # Different detection based on what we are looking for
-            if not talking:
-                # Looking for a step up in the latter part
-                if from_median * 2.0 < to_median:
-                    LOG.info("Detected start of speech "
-                             "with levels going from %0.2f to %0.2f" %
-                             (from_median, to_median))
-                    talking = True
-                    talking_start = now
-                    start_median = from_median
-            else:
-                # Looking for a step down in the latter part
-                if (now - talking_start > min_secs and
-                    (from_median > to_median * 1.5 or to_median < start_median * 1.1)):
-                    LOG.info("Detected end of speech "
-                             "with levels going from %0.2f to %0.2f (start %0.2f)" %
-                             (from_median, to_median, start_median))
-                    talking = False
-
-            # If the talking has been going on too long then just stop it. Quite
-            # possibly the capture was fooled.
-            if talking and now - talking_start > max_secs:
-                LOG.info("Talking lasted over %ds; pushing to False" % max_secs)
-                talking = False
+                listening = True
 
             # Different behaviour depending on whether we think someone is
             # talking or not
             if talking:
                 # If we don't yet have any audio then we're starting the
                 # recording
-                if speech is None:
+                if not recording:
                     # Move the rolling window of recording to be the start of
-                    # the audio
+                    # the audio. We only hang onto a copy of it all if we are
+                    # going to save it out.
                     LOG.info("Starting recording")
                     expected_mod = self._notify(Notifier.ACTIVE)
-                    speech = []
+                    recording = True
+                    if self._wav_dir is not None:
+                        speech = bytearray()
 
                     # Start off by putting the current time on the queue, so the
                     # recipient knows how old this data is when it gets it.
-                    self._decode_queue.append(time.time())
+                    self._decode_queue.put(time.time())
 
                     # Push in everything that we have
                     while audio_buf:
                         prev = audio_buf.popleft()
-                        speech.append(prev)
-                        self._decode_queue.append(prev)
+                        if speech is not None:
+                            speech += prev
+                        self._decode_queue.put(prev)
                 else:
                     # Add on what we just recorded
-                    speech.append(chunk)
-                    self._decode_queue.append(chunk)
+                    if speech is not None:
+                        speech += chunk
+                    self._decode_queue.put(chunk)
 
             # We deem that talking is still happening if it started only a
             # little while ago
-            elif speech is not None:
+            elif recording:
                 # There's no talking but there is recorded audio. That means
                 # someone just stopped talking.
                 LOG.info("Finished recording")
+                recording = False
 
-                # Turn the stream into a list of bytes and junk the speech
-                # buffer
-                audio  = b''.join(speech)
-                speech = None
-
-                # Maybe save then as a wav file
-                self._save_bytes(audio)
+                # Maybe save it as a wav file, and junk the speech buffer
+                if speech is not None:
+                    self._save_bytes(speech)
+                    speech = None
 
                 # Now decode. We do this by denoting the end of the audio with a None.
-                self._decode_queue.append(None)
+                self._decode_queue.put(None)
 
                 # Ensure the old queue is empty before we start again
                 audio_buf.clear()
@@ -325,7 +361,7 @@ class AudioInput(Input):
 
         # If we got here then _running was set to False and we're done
         LOG.info("Done listening")
-        self._decode_queue = None
+        self._decode_queue.put(_STOP)
         stream.close()
         p.terminate()
 
@@ -338,60 +374,70 @@ class AudioInput(Input):
         # Whether we are skipping the current input
         gobble = False
 
+        # When we last got a partial result, and what it was
+        partial_time  = 0
+        partial_words = None
+
         LOG.info("Started decoding handler")
         while True:
             try:
-                # Get a handle on the queue. This will be nulled out when we're
-                # done.
-                queue = self._decode_queue
-                if queue is None:
+                # Wait for the next thing to be handed to us. The listener
+                # thread tells us when it's done.
+                item = self._decode_queue.get()
+                if item is _STOP:
                     break
 
-                # Anything?
-                if len(queue) > 0:
-                    item = queue.popleft()
-                    if item is None:
-                        # A None denotes the end of the data so we look to
-                        # decode what we've been given if we're not throwing it
-                        # away.
-                        if gobble:
-                            LOG.info("Dropped audio")
-                        else:
-                            # Decode what we got. We use the expected_mod to
-                            # avoid tripping over the listener thread when
-                            # transitioning to IDLE.
-                            LOG.info("Decoding audio")
-                            expected_mod = self._notify(Notifier.WORKING)
-                            self._output.append(self._decode())
-                            self._notify(Notifier.IDLE,
-                                         expected_mod=expected_mod)
-                    elif isinstance(item, float) :
-                        # This is the timestamp of the clip. If it's too old
-                        # then we throw it away.
-                        age = time.time() - item
-                        if int(age) > 0:
-                            LOG.info("Upcoming audio clip is %0.2fs old" % (age,))
-                        gobble = age > self._GOBBLE_LIMIT
-                    elif isinstance(item, bytes):
-                        # Something to feed the decoder
-                        if gobble:
-                            LOG.debug("Ignoring %d bytes" % len(item))
-                        else:
-                            LOG.debug("Feeding %d bytes" % len(item))
-                            self._feed_raw(item)
+                if item is None:
+                    # A None denotes the end of the data so we look to decode
+                    # what we've been given if we're not throwing it away.
+                    if gobble:
+                        LOG.info("Dropped audio")
                     else:
-                        LOG.warning("Ignoring junk on decode queue: %r" % (item,))
-
-                    # Go around again
-                    continue
+                        # Decode what we got. We use the expected_mod to avoid
+                        # tripping over the listener thread when transitioning
+                        # to IDLE.
+                        LOG.info("Decoding audio")
+                        expected_mod = self._notify(Notifier.WORKING)
+                        self._put(self._decode())
+                        self._notify(Notifier.IDLE,
+                                     expected_mod=expected_mod)
+                elif isinstance(item, float) :
+                    # This is the timestamp of the clip. If it's too old then we
+                    # throw it away.
+                    age = time.time() - item
+                    if int(age) > 0:
+                        LOG.info("Upcoming audio clip is %0.2fs old" % (age,))
+                    gobble = age > self._GOBBLE_LIMIT
+                    partial_words = None
+                elif isinstance(item, bytes):
+                    # Something to feed the decoder
+                    if gobble:
+                        LOG.debug("Ignoring %d bytes" % len(item))
+                    else:
+                        LOG.debug("Feeding %d bytes" % len(item))
+                        self._feed_raw(item)
+
+                        # See what we have so far, if we want to know. We only
+                        # hand it over if it's changed.
+                        now = time.time()
+                        if (self._partials and
+                            now - partial_time >= self._PARTIAL_INTERVAL):
+                            partial_time = now
+                            tokens = self._partial()
+                            if tokens:
+                                words = tuple(t.element for t in tokens)
+                                if words != partial_words:
+                                    LOG.debug("Partial result: %s" %
+                                              ' '.join(words))
+                                    partial_words = words
+                                    self._put_partial(tokens)
+                else:
+                    LOG.warning("Ignoring junk on decode queue: %r" % (item,))
 
             except Exception as e:
                 # Be robust but log it
                 LOG.error("Got an error in the decoder queue: %s" % (e,))
 
-            # Don't busy-wait
-            time.sleep(0.001)
-
         # And we're done!
         LOG.info("Stopped decoding handler")
 
@@ -402,7 +448,7 @@ class _Future(object):
     """
     def __init__(self):
         self._result = None
-        self._ready  = False
+        self._ready  = Event()
 
 
     def set_result(self, result):
@@ -410,19 +456,30 @@ class _Future(object):
         Set the result.
         """
         self._result = result
-        self._ready  = True
+        self._ready.set()
 
 
-    def get_result(self):
+    @property
+    def is_ready(self):
+        """
+        Whether the result has been set.
+        """
+        return self._ready.is_set()
+
+
+    def get_result(self, timeout=None):
         """
         Get the result, blocking until it's ready.
 
         If the result was an exception then it will be thrown.
+
+        :type  timeout: float
+        :param timeout:
+            How long to wait for, in seconds, or ``None`` to wait forever.
         """
-        while True:
-            if self._ready:
-                if isinstance(self._result, Exception):
-                    raise self._result
-                else:
-                    return self._result
-            time.sleep(0.001)
+        if not self._ready.wait(timeout):
+            raise TimeoutError("Timed out waiting for result")
+        if isinstance(self._result, Exception):
+            raise self._result
+        else:
+            return self._result
@@ -37,7 +37,10 @@ class CoquiInput(AudioInput):
                  rate   =None,
                  wav_dir=None,
                  model  =os.path.join(_MODEL_DIR, 'model'),
-                 scorer =os.path.join(_MODEL_DIR, 'scorer')):
+                 scorer =os.path.join(_MODEL_DIR, 'scorer'),
+                 vad    ='level',
+                 partials=False,
+                 warmup  =False):
         """
         @see AudioInput.__init__()
 
@@ -59,13 +62,14 @@ class CoquiInput(AudioInput):
             raise IOError("Not found: %s" % (model,))
 
         # Load in and configure the model.
-        start = time.time()
+        start = time.monotonic()
         LOG.info("Loading model from %s" % (model,))
         self._model = Model(model)
         if os.path.exists(scorer):
             LOG.info("Loading scorer from %s" % (scorer,))
             self._model.enableExternalScorer(scorer)
-        LOG.info("Models loaded in %0.2fs" % (time.time() - start,))
+        load_secs = time.monotonic() - start
+        LOG.info("Models loaded in %0.2fs" % (load_secs,))
 
         # Handle any rate override
         if rate is None:
@@ -77,12 +81,19 @@ class CoquiInput(AudioInput):
             format=pyaudio.paInt16,
             channels=1,
             rate=rate,
-            wav_dir=wav_dir
+            wav_dir=wav_dir,
+            vad=vad,
+            partials=partials,
+            warmup=warmup
         )
+        self._startup_times['load'] = load_secs
 
         # Where we put the stream context
         self._context = None
 
+        # Now we're ready
+        self._warm_up()
+
 
     def _feed_raw(self, data):
         """
@@ -94,6 +105,20 @@ class CoquiInput(AudioInput):
         self._context.feedAudioContent(audio)
 
 
+    def _partial(self):
+        """
+        @see AudioInput._partial()
+        """
+        if self._context is None:
+            return None
+
+        # Decode what we have so far, leaving the stream open
+        words = self._context.intermediateDecode()
+        return [Token(word.strip(), 1.0, True)
+                for word in words.split(' ')
+                if len(word.strip()) > 0]
+
+
     def _decode(self):
         """
         @see AudioInput._decode()
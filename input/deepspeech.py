@@ -14,6 +14,7 @@ from   dexter.core.log    import LOG
 import numpy
 import os
 import pyaudio
+import time
 
 # ------------------------------------------------------------------------------
 
@@ -31,7 +32,10 @@ class DeepSpeechInput(AudioInput):
                  rate=None,
                  wav_dir=None,
                  model =os.path.join(_MODEL_DIR, 'models.pbmm'),
-                 scorer=os.path.join(_MODEL_DIR, 'models.scorer')):
+                 scorer=os.path.join(_MODEL_DIR, 'models.scorer'),
+                 vad   ='level',
+                 partials=False,
+                 warmup=False):
         """
         @see AudioInput.__init__()
 
@@ -54,10 +58,12 @@ class DeepSpeechInput(AudioInput):
 
         # Load in and configure the model.
         LOG.info("Loading model from %s" % (model,))
+        start = time.monotonic()
         self._model = Model(model)
         if os.path.exists(scorer):
             LOG.info("Loading scorer from %s" % (scorer,))
             self._model.enableExternalScorer(scorer)
+        load_secs = time.monotonic() - start
 
         # Handle any rate override
         if rate is None:
@@ -68,11 +74,18 @@ class DeepSpeechInput(AudioInput):
                          format  =pyaudio.paInt16,
                          channels=1,
                          rate    =rate,
-                         wav_dir =wav_dir)
+                         wav_dir =wav_dir,
+                         vad     =vad,
+                         partials=partials,
+                         warmup  =warmup)
+        self._startup_times['load'] = load_secs
 
         # Where we put the stream context
         self._context = None
 
+        # Now we're ready
+        self._warm_up()
+
 
     def _feed_raw(self, data):
         """
@@ -84,6 +97,20 @@ class DeepSpeechInput(AudioInput):
         self._context.feedAudioContent(audio)
 
 
+    def _partial(self):
+        """
+        @see AudioInput._partial()
+        """
+        if self._context is None:
+            return None
+
+        # Decode what we have so far, leaving the stream open
+        words = self._context.intermediateDecode()
+        return [Token(word.strip(), 1.0, True)
+                for word in words.split(' ')
+                if len(word.strip()) > 0]
+
+
     def _decode(self):
         """
         @see AudioInput._decode()
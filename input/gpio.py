@@ -69,20 +69,6 @@ class _HatMiniInput(Input):
         self._x_button = None
         self._y_button = None
 
-        # And where we put the tokens
-        self._output = []
-
-
-    def read(self):
-        """
-        @see Input.read
-        """
-        if len(self._output) > 0:
-            try:
-                return self._output.pop()
-            except:
-                pass
-
 
     def _start(self):
         """
@@ -122,7 +108,7 @@ class _HatMiniInput(Input):
         LOG.info("Got button on pin GPIO%d" % (number,))
         tokens = self._bindings.get(number, [])
         if len(tokens) > 0:
-            self._output.append(tuple(self._prefix + tokens))
+            self._put(tuple(self._prefix + tokens))
 
 
 
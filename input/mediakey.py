@@ -65,20 +65,6 @@ class MediaKeyInput(Input):
         # The GLib main loop
         self._loop = None
 
-        # And where we put the tokens
-        self._output = []
-
-
-    def read(self):
-        """
-        @see Input.read
-        """
-        if len(self._output) > 0:
-            try:
-                return self._output.pop()
-            except:
-                pass
-
 
     def _start(self):
         """
@@ -130,4 +116,4 @@ class MediaKeyInput(Input):
             LOG.info("Got media key '%s'" % (what,))
             tokens = self._bindings.get(what, [])
             if len(tokens) > 0:
-                self._output.append(tuple(self._prefix + tokens))
+                self._put(tuple(self._prefix + tokens))
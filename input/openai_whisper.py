@@ -10,15 +10,14 @@ will need a more up-to-date version of numpy too.) However, it's _slow_; it
 takes about 20s to decode 5s of audio.
 """
 
-from   dexter.input       import Token
-from   dexter.input.audio import AudioInput
-from   dexter.core.log    import LOG
+from   dexter.input             import Token
+from   dexter.input.audio       import AudioInput
+from   dexter.core.audio_buffer import AudioBuffer
+from   dexter.core.log          import LOG
 
-import numpy
 import os
 import pyaudio
 import time
-import whisper
 
 # ------------------------------------------------------------------------------
 
@@ -36,7 +35,9 @@ class WhisperInput(AudioInput):
                  rate     =16000,
                  model    ='base',
                  translate=True,
-                 wav_dir  =None):
+                 wav_dir  =None,
+                 vad      ='level',
+                 warmup   =False):
         """
         @see AudioInput.__init__()
 
@@ -57,43 +58,47 @@ class WhisperInput(AudioInput):
             format=pyaudio.paInt16,
             channels=1,
             rate=rate,
-            wav_dir=wav_dir
+            wav_dir=wav_dir,
+            vad=vad,
+            warmup=warmup
         )
 
-        # Set up the actual model and our params
+        # Set up the actual model and our params. Whisper pulls in torch, which
+        # is slow to import, so we only do that when we need it.
+        start = time.monotonic()
+        import whisper
         self._model = whisper.load_model(model)
         self._task = 'translate' if bool(translate) else 'transcribe'
+        self._startup_times['load'] = time.monotonic() - start
 
-        # Where we buffer to
-        self._audio = None
+        # Where we buffer to. Whisper expects a numpy float32 array normalised
+        # to +/-1.0, which is what this gives us.
+        self._audio = AudioBuffer(self._rate)
+
+        # Now we're ready
+        self._warm_up()
 
 
     def _feed_raw(self, data):
         """
         @see AudioInput._feed_raw()
         """
-        # Buffer it up. Whisper expects a numpy float32 array normalised to
-        # +/-1.0 so we convert and divide by max-short.
-        audio = numpy.frombuffer(data, numpy.int16  ) \
-                     .astype    (      numpy.float32) / 2.0**15
-        if self._audio is None:
-            self._audio = audio
-        else:
-            self._audio = numpy.concatenate((self._audio, audio))
+        # Buffer it up
+        self._audio.append(data)
 
 
     def _decode(self):
         """
         @see AudioInput._decode()
         """
-        if self._audio is None:
+        if len(self._audio) == 0:
             return None
 
         # Turn the audio into speech
         try:
-            result = self._model.transcribe(self._audio, task=self._task)
+            result = self._model.transcribe(self._audio.view(), task=self._task)
         finally:
-            self._audio = None
+            self._audio.clear()
 
         # Give it right back
         return [
@@ -7,6 +7,7 @@ from dexter.input.audio        import AudioInput
 from pocketsphinx.pocketsphinx import *
 
 import os
+import time
 
 # ------------------------------------------------------------------------------
 
@@ -19,20 +20,29 @@ class PocketSphinxInput(AudioInput):
     """
     def __init__(self,
                  state,
-                 wav_dir=None):
+                 wav_dir=None,
+                 vad    ='level',
+                 warmup =False):
         """
         @see AudioInput.__init__()
         """
         super().__init__(state,
-                         wav_dir=wav_dir)
+                         wav_dir=wav_dir,
+                         vad    =vad,
+                         warmup =warmup)
 
         # Create a decoder with certain model.
+        start = time.monotonic()
         config = Decoder.default_config()
         config.set_string('-hmm',  os.path.join(_MODEL_DIR, 'en-us/en-us'))
         config.set_string('-lm',   os.path.join(_MODEL_DIR, 'en-us/en-us.lm.bin'))
         config.set_string('-dict', os.path.join(_MODEL_DIR, 'en-us/cmudict-en-us.dict'))
         self._decoder = Decoder(config)
         self._data    = b''
+        self._startup_times['load'] = time.monotonic() - start
+
+        # Now we're ready
+        self._warm_up()
 
 
     def _feed_raw(self, data):
@@ -3,17 +3,37 @@ Input using a remote server to to the decoding.
 
 This can be used in conjunction with something like the C{deepspeech_server.py}
 script in order to have a fast machine do the actual speech-to-text decoding.
+
+See C{stt_server.py} for a description of the protocols which are spoken. By
+default we use version 2, keeping a connection open to the server, and fall back
+to version 1 if the server looks like it doesn't support that. We keep trying
+version 2 every so often, in case it does after all.
 """
 
 from   dexter.input       import Token
-from   dexter.input.audio import AudioInput
+from   dexter.input.audio import AudioInput, _Future
 from   dexter.core.log    import LOG
+from   threading          import Lock, Thread
 
 import numpy
 import os
 import pyaudio
 import socket
 import struct
+import time
+
+# ------------------------------------------------------------------------------
+
+# The version 2 protocol, see stt_server.py
+_V2_HELLO = b'DEXTERv2' + struct.pack('!qq', 2, 0)
+_FRAME    = struct.Struct('!Bqq')
+_START    = 1
+_DATA     = 2
+_END      = 3
+_PING     = 4
+_PONG     = 5
+_RESULT   = 6
+_ERROR    = 7
 
 # ------------------------------------------------------------------------------
 
@@ -21,11 +41,46 @@ class RemoteInput(AudioInput):
     """
     Use a remote server to do the audio decoding for us.
     """
+    _KEEPALIVE_SECS = 10
+    """
+    How long the connection may be idle before we ping the server.
+    """
+
+    _CONNECT_TIMEOUT = 5
+    """
+    How long to wait when connecting to the server.
+    """
+
+    _REJECT_SECS = 1
+    """
+    How quickly the server has to close the connection on our version 2 hello
+    for us to think that it only speaks version 1.
+    """
+
+    _SEND_TIMEOUT = 5
+    """
+    How long sending something to the server may take before we give up on the
+    connection.
+    """
+
+    _RESULT_TIMEOUT = 60
+    """
+    How long to wait for the server to give back a result.
+    """
+
+    _MIN_BACKOFF = 0.5
+    _MAX_BACKOFF = 30
+    """
+    The bounds of how long we wait between reconnection attempts.
+    """
+
     def __init__(self,
                  state,
-                 host   ='localhost',
-                 port   =8008,
-                 wav_dir=None):
+                 host    ='localhost',
+                 port    =8008,
+                 wav_dir =None,
+                 vad     ='level',
+                 protocol=2):
         """
         @see AudioInput.__init__()
 
@@ -35,14 +90,63 @@ class RemoteInput(AudioInput):
         :type  port: int
         :param port:
             The port to connect to.
+        :type  protocol: int
+        :param protocol:
+            The version of the protocol to speak, 1 or 2.
         """
         super().__init__(state,
-                         wav_dir=wav_dir)
-        self._host   = host
-        self._port   = int(port)
-        self._sckt   = None
-        self._header = struct.pack('!qqq',
-                                    self._channels, self._width, self._rate)
+                         wav_dir=wav_dir,
+                         vad    =vad)
+        if int(protocol) not in (1, 2):
+            raise ValueError("Unknown protocol version: %s" % (protocol,))
+
+        self._host     = host
+        self._port     = int(port)
+        self._protocol = int(protocol)
+        self._header   = struct.pack('!qqq',
+                                     self._channels, self._width, self._rate)
+
+        # Version 1 state, the connection for the current utterance
+        self._sckt = None
+
+        # Version 2 state. The lock guards the connection and the futures for
+        # the results, and the send lock makes sure that what we send on the
+        # connection doesn't get jumbled up. If the server seems to only speak
+        # version 1 then we fall back to that until it says otherwise.
+        self._lock         = Lock()
+        self._send_lock    = Lock()
+        self._conn         = None
+        self._fallen_back  = False
+        self._futures      = dict()
+        self._next_uid     = 1
+        self._utterance    = None
+        self._last_heard   = 0
+        self._last_sent    = 0
+        self._backoff      = 0
+        self._next_attempt = 0
+
+
+    def _start(self):
+        """
+        @see Component._start()
+        """
+        super()._start()
+
+        # Connect in the background, and keep the connection alive
+        if self._protocol == 2:
+            thread = Thread(name='RemoteKeepalive', target=self._keepalive)
+            thread.daemon = True
+            thread.start()
+
+
+    def _stop(self):
+        """
+        @see Component._stop()
+        """
+        super()._stop()
+        conn = self._conn
+        if conn is not None:
+            self._drop(conn, "Stopping")
 
 
     def _feed_raw(self, data):
@@ -53,6 +157,268 @@ class RemoteInput(AudioInput):
         if data is None or len(data) == 0:
             return
 
+        # If this is the start of an utterance then tell the server about it.
+        # This might reveal that it only speaks version 1, in which case we
+        # stick with that for the rest of the utterance.
+        if (self._protocol  == 2    and
+            self._utterance is None and
+            self._sckt      is None):
+            self._utterance = self._start_utterance()
+
+        if self._utterance is None:
+            self._feed_raw_v1(data)
+        elif self._utterance[0] is not None:
+            # Send off the chunk, giving up on the utterance if that fails
+            (uid, conn) = self._utterance
+            LOG.debug("Sending %d bytes of data to %s" %
+                      (len(data), self._host))
+            if not self._send(conn, _DATA, uid, data):
+                self._utterance = (None, None)
+
+
+    def _decode(self):
+        """
+        @see AudioInput._decode()
+        """
+        # Version 2 utterance?
+        utterance       = self._utterance
+        self._utterance = None
+        if utterance is None:
+            return self._decode_v1()
+
+        (uid, conn) = utterance
+        if uid is None:
+            LOG.warning("Had no utterance to decode")
+            return []
+
+        try:
+            # Tell the server that we're done and wait for it to tell us what it
+            # heard
+            if not self._send(conn, _END, uid):
+                return []
+            LOG.info("Waiting for result...")
+            result = self._futures[uid].get_result(timeout=self._RESULT_TIMEOUT)
+            LOG.info("Result is: '%s'" % (result,))
+            return self._tokenise(result)
+
+        except Exception as e:
+            # Just grumble on exceptions
+            LOG.info("Failed to do remote processing: %s" % e)
+            return []
+
+        finally:
+            with self._lock:
+                self._futures.pop(uid, None)
+
+
+    def _start_utterance(self):
+        """
+        Tell the server that a new utterance is starting.
+
+        :rtype: tuple
+        :return:
+            The utterance ID and the connection which it's using. These will be
+            ``None`` if the utterance can't be sent. If we have fallen back to
+            version 1 then we give back ``None``.
+        """
+        conn = self._connect()
+        if conn is None:
+            if self._fallen_back:
+                return None
+            LOG.info("No connection to %s:%d, dropping audio" %
+                     (self._host, self._port))
+            return (None, None)
+
+        with self._lock:
+            uid = self._next_uid
+            self._next_uid += 1
+            self._futures[uid] = _Future()
+
+        if self._send(conn, _START, uid, self._header):
+            return (uid, conn)
+        else:
+            return (None, None)
+
+
+    def _connect(self):
+        """
+        Get the connection to the server, making it if need be. If a connection
+        attempt fails then we back off before trying again.
+
+        If the server accepts the connection but then closes it straight away,
+        without saying anything, then it likely only speaks version 1 and we
+        fall back to that. It might also be a version 2 server which is having a
+        moment, so we keep on trying version 2 in the same way as for any other
+        failure.
+
+        :return: The connection, or ``None`` if we don't have one.
+        """
+        with self._lock:
+            if self._conn is not None or self._protocol != 2:
+                return self._conn
+
+            # Don't hammer on the server
+            now = time.time()
+            if now < self._next_attempt:
+                return None
+
+            # Connect and see if it speaks our language. A version 1 server will
+            # just close the connection on us.
+            conn     = None
+            rejected = False
+            try:
+                LOG.info("Opening connection to %s:%d" %
+                         (self._host, self._port,))
+                conn = socket.create_connection((self._host, self._port),
+                                                timeout=self._CONNECT_TIMEOUT)
+                conn.sendall(_V2_HELLO)
+                sent  = time.time()
+                hello = conn.recv(len(_V2_HELLO))
+                if len(hello) == 0:
+                    rejected = time.time() - sent < self._REJECT_SECS
+                    raise EOFError("Connection closed on hello")
+                hello += self._recv(conn, len(_V2_HELLO) - len(hello))
+                if hello != _V2_HELLO:
+                    raise ValueError("Bad hello")
+
+                # From now on the timeout is only for sending, since the server
+                # is allowed to be quiet. See _recv().
+                conn.settimeout(self._SEND_TIMEOUT)
+
+            except Exception as e:
+                self._backoff = min(self._MAX_BACKOFF,
+                                    max(self._MIN_BACKOFF, 2 * self._backoff))
+                self._next_attempt = now + self._backoff
+                if rejected and not self._fallen_back:
+                    LOG.warning("Server %s:%d may not speak protocol version 2, "
+                                "falling back to version 1 and trying again "
+                                "in %0.1fs" %
+                                (self._host, self._port, self._backoff))
+                    self._fallen_back = True
+                else:
+                    LOG.info("Failed to connect to %s:%d, "
+                             "retrying in %0.1fs: %s" %
+                             (self._host, self._port, self._backoff, e))
+                self._close(conn)
+                return None
+
+            # We're good
+            LOG.info("Connected to %s:%d" % (self._host, self._port))
+            self._conn         = conn
+            self._fallen_back  = False
+            self._backoff      = 0
+            self._last_heard   = now
+            self._last_sent    = now
+
+        # Listen for what the server tells us
+        thread = Thread(name='RemoteReader', target=self._read_frames, args=(conn,))
+        thread.daemon = True
+        thread.start()
+
+        return conn
+
+
+    def _keepalive(self):
+        """
+        Keep the connection to the server alive, reconnecting if it's lost. Runs
+        in its own thread.
+        """
+        while self.is_running and self._protocol == 2:
+            try:
+                conn = self._conn
+                now  = time.time()
+                if conn is None:
+                    # Reconnect now, so that we don't have to when someone
+                    # starts talking
+                    self._connect()
+                elif (len(self._futures) == 0 and
+                      now - self._last_heard > 3 * self._KEEPALIVE_SECS):
+                    # The server has gone quiet on us. (If it's decoding then
+                    # it's allowed to be quiet.)
+                    self._drop(conn, "No response from server")
+                elif now - self._last_sent > self._KEEPALIVE_SECS:
+                    self._send(conn, _PING, 0)
+
+            except Exception as e:
+                LOG.warning("Error in keepalive: %s" % (e,))
+
+            time.sleep(1.0)
+
+
+    def _read_frames(self, conn):
+        """
+        Read the frames which the server sends us on the given connection. Runs
+        in its own thread.
+        """
+        reason = "Connection closed"
+        try:
+            while True:
+                (kind, uid, length) = _FRAME.unpack(self._recv(conn,
+                                                               _FRAME.size))
+                payload = self._recv(conn, length)
+                self._last_heard = time.time()
+
+                if kind == _PONG:
+                    continue
+
+                future = self._futures.get(uid)
+                if future is None:
+                    LOG.warning("Got a result for unknown utterance %d" % uid)
+                elif kind == _RESULT:
+                    future.set_result(payload.decode())
+                elif kind == _ERROR:
+                    future.set_result(IOError(payload.decode()))
+                else:
+                    LOG.warning("Ignoring unknown frame type %d" % kind)
+
+        except Exception as e:
+            reason = str(e)
+
+        finally:
+            self._drop(conn, reason)
+
+
+    def _send(self, conn, kind, uid, payload=b''):
+        """
+        Send a frame on the given connection, if it's still the current one. We
+        don't hold the main lock while sending, and the connection has a send
+        timeout, so a stalled server can't hold everyone else up for long.
+
+        :return: Whether it was sent.
+        """
+        if conn is not self._conn:
+            return False
+        try:
+            with self._send_lock:
+                conn.sendall(_FRAME.pack(kind, uid, len(payload)) + payload)
+            self._last_sent = time.time()
+            return True
+        except Exception as e:
+            self._drop(conn, str(e))
+            return False
+
+
+    def _drop(self, conn, reason):
+        """
+        Drop the given connection, failing any results which we were waiting for
+        on it.
+        """
+        with self._lock:
+            if conn is not self._conn:
+                return
+            LOG.info("Lost connection to %s:%d: %s" %
+                     (self._host, self._port, reason))
+            self._conn = None
+            self._close(conn)
+            for future in self._futures.values():
+                if not future.is_ready:
+                    future.set_result(IOError(reason))
+
+
+    def _feed_raw_v1(self, data):
+        """
+        Send the chunk using protocol version 1.
+        """
         # Don't let exceptions kill the thread
         try:
             # Connect?
@@ -83,9 +449,9 @@ class RemoteInput(AudioInput):
             return
 
 
-    def _decode(self):
+    def _decode_v1(self):
         """
-        @see AudioInput._decode()
+        Get the result using protocol version 1.
         """
         if self._sckt is None:
             # No context means no tokens
@@ -100,30 +466,15 @@ class RemoteInput(AudioInput):
             #   8 bytes for the length
             #   data...
             LOG.info("Waiting for result...")
-            length = b''
-            while len(length) < 8:
-                got = self._sckt.recv(8 - len(length))
-                if len(got) == 0:
-                    raise IOError("EOF in recv()")
-                length += got
-            (count,) = struct.unpack("!q", length)
+            (count,) = struct.unpack("!q", self._recv(self._sckt, 8))
 
             # Read in the string
             LOG.debug("Reading %d chars" % (count,))
-            result = b''
-            while len(result) < count:
-                got = self._sckt.recv(count - len(result))
-                if len(got) == 0:
-                    raise IOError("EOF in recv()")
-                result += got
-            result = result.decode()
+            result = self._recv(self._sckt, count).decode()
             LOG.info("Result is: '%s'" % (result,))
 
             # Convert to tokens
-            tokens = [Token(word.strip(), 1.0, True)
-                      for word in result.split(' ')
-                      if word.strip() != '']
-            return tokens
+            return self._tokenise(result)
 
         except Exception as e:
             # Again, just grumble on exceptions
@@ -132,11 +483,46 @@ class RemoteInput(AudioInput):
 
         finally:
             # Close it out, best effort
+            LOG.info("Closing connection")
+            self._close(self._sckt)
+            self._sckt = None
+
+
+    def _tokenise(self, result):
+        """
+        Turn the string which the server gave us into tokens.
+        """
+        return [Token(word.strip(), 1.0, True)
+                for word in result.split(' ')
+                if word.strip() != '']
+
+
+    def _recv(self, conn, count):
+        """
+        Read exactly the given number of bytes from the connection. Our version
+        2 connection has a timeout for sending, which we ignore here while it's
+        still the current one.
+        """
+        result = b''
+        while len(result) < count:
             try:
-                LOG.info("Closing connection")
-                self._sckt.shutdown(socket.SHUT_RDWR)
-                self._sckt.close()
-            except:
-                pass
-            finally:
-                self._sckt = None
+                got = conn.recv(count - len(result))
+            except socket.timeout:
+                if conn is self._conn:
+                    continue
+                raise
+            if len(got) == 0:
+                raise EOFError("EOF in recv()")
+            result += got
+        return result
+
+
+    def _close(self, conn):
+        """
+        Close the given connection, best effort.
+        """
+        try:
+            conn.shutdown(socket.SHUT_RDWR)
+            conn.close()
+        except:
+            pass
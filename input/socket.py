@@ -39,18 +39,6 @@ class SocketInput(Input):
             self._prefix = None
 
         self._socket = None
-        self._output = []
-
-
-    def read(self):
-        """
-        @see Input.read
-        """
-        if len(self._output) > 0:
-            try:
-                return self._output.pop(0)
-            except:
-                pass
 
 
     def _start(self):
@@ -67,7 +55,12 @@ class SocketInput(Input):
         # Start the acceptor thread
         def acceptor():
             while self._running:
-                (sckt, addr) = self._socket.accept()
+                try:
+                    (sckt, addr) = self._socket.accept()
+                except OSError as e:
+                    if self._running:
+                        LOG.error("Failed to accept connection: %s" % (e,))
+                    return
                 LOG.info("Got connection from %s" % (addr,))
                 thread = Thread(name='SocketInput',
                                 target=lambda: self._handle(sckt))
@@ -82,6 +75,11 @@ class SocketInput(Input):
        """
        @see Input.stop
        """
+       # Closing the socket doesn't wake up accept() so we shut it down first
+       try:
+           self._socket.shutdown(socket.SHUT_RDWR)
+       except:
+           pass
        try:
            self._socket.close()
        except:
@@ -125,7 +123,7 @@ class SocketInput(Input):
                     if len(tokens) > 0:
                         if self._prefix:
                             tokens = self._prefix + tokens
-                        self._output.append(tokens)
+                        self._put(tokens)
                         tokens = []
 
             else:
@@ -18,6 +18,7 @@ import json
 import numpy
 import os
 import pyaudio
+import time
 
 # ------------------------------------------------------------------------------
 
@@ -34,7 +35,10 @@ class VoskInput(AudioInput):
                  notifier,
                  rate   =16000,
                  wav_dir=None,
-                 model  =os.path.join(_MODEL_DIR, 'model')):
+                 model  =os.path.join(_MODEL_DIR, 'model'),
+                 vad    ='level',
+                 partials=False,
+                 warmup  =False):
         """
         @see AudioInput.__init__()
 
@@ -52,21 +56,30 @@ class VoskInput(AudioInput):
         if not os.path.exists(model):
             raise IOError("Not found: %s" % (model,))
         LOG.info("Loading model from %s, this could take a while", model)
+        start = time.monotonic()
         SetLogLevel(1 if LOG.getLogger().getEffectiveLevel() >= 20 else 2)
         self._model      = Model(model)
         self._recognizer = KaldiRecognizer(self._model, rate)
-        LOG.info("Model loaded")
+        load_secs = time.monotonic() - start
+        LOG.info("Model loaded in %0.2fs", load_secs)
 
         # Wen can now init the superclass
         super().__init__(notifier,
                          format  =pyaudio.paInt16,
                          channels=1,
                          rate    =rate,
-                         wav_dir =wav_dir)
+                         wav_dir =wav_dir,
+                         vad     =vad,
+                         partials=partials,
+                         warmup  =warmup)
+        self._startup_times['load'] = load_secs
 
         # Where we put the results
         self._results = []
 
+        # Now we're ready
+        self._warm_up()
+
 
     def _feed_raw(self, data):
         """
@@ -77,6 +90,19 @@ class VoskInput(AudioInput):
             self._add_result(self._recognizer.Result())
 
 
+    def _partial(self):
+        """
+        @see AudioInput._partial()
+        """
+        # What we have had so far, along with the recogniser's current guess at
+        # what follows
+        words = [result.get('word', '').strip() for result in self._results]
+        words.extend(json.loads(self._recognizer.PartialResult())
+                         .get('partial', '')
+                         .split())
+        return [Token(word, 1.0, True) for word in words if word]
+
+
     def _decode(self):
         """
         @see AudioInput._decode()
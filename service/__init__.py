@@ -5,8 +5,9 @@ Each service provides something which responds to given input commands, and
 possibly has some output too.
 """
 
-from dexter.core  import Component
-from dexter.input import Token
+from dexter.core      import Component
+from dexter.core.util import PHRASES
+from dexter.input     import Token
 
 # ------------------------------------------------------------------------------
 
@@ -24,7 +25,8 @@ class Service(Component):
             The global State instance.
         """
         super().__init__(state)
-        self._name = name
+        self._name       = name
+        self._registered = []
 
 
     @property
@@ -52,6 +54,30 @@ class Service(Component):
         raise NotImplementedError("Abstract method called")
 
 
+    def _register_phrases(self, phrases):
+        """
+        Register the given phrases with the global L{PhraseIndex}, remembering
+        that we did so.
+
+        :type  phrases: iterable(tuple<str>)
+        :param phrases:
+            The phrases to register.
+        """
+        for phrase in phrases:
+            PHRASES.register(phrase)
+            self._registered.append(phrase)
+
+
+    def _unregister_phrases(self):
+        """
+        Unregister the phrases which we registered, if any. The registrations
+        are reference counted across all the services so we must only undo our
+        own, even if we are being stopped without having been started.
+        """
+        while self._registered:
+            PHRASES.unregister(self._registered.pop())
+
+
     def _words(self, tokens):
         """
         Get only the words from the tokens, all as lowercase.
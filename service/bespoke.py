@@ -5,7 +5,10 @@ where you should put all the humourous request/response stuff.
 
 from dexter.service   import Service, Handler, Result
 from dexter.core.log  import LOG
-from dexter.core.util import get_pygame, fuzzy_list_range, to_alphanumeric
+from dexter.core.util import (get_pygame,
+                              fuzzy_list_range,
+                              to_alphanumeric,
+                              PHRASES)
 
 # ----------------------------------------------------------------------
 
@@ -107,6 +110,20 @@ class BespokeService(Service):
                               for (phrase, reply, is_prefix) in _PHRASES)
 
 
+    def _start(self):
+        """
+        @see Component._start()
+        """
+        self._register_phrases(phrase for (phrase, _, _) in self._phrases)
+
+
+    def _stop(self):
+        """
+        @see Component._stop()
+        """
+        self._unregister_phrases()
+
+
     def evaluate(self, tokens):
         """
         @see Service.evaluate()
@@ -118,7 +135,7 @@ class BespokeService(Service):
         for (phrase, reply, is_prefix) in self._phrases:
             try:
                 LOG.debug("Looking for %s in %s", phrase, words)
-                (start, end, score) = fuzzy_list_range(words, phrase)
+                (start, end, score) = PHRASES.find(words, phrase)
                 LOG.debug("Matched [%d:%d] and score %d", start, end, score)
                 if start == 0 and (not is_prefix or end == len(phrase)):
                     return _BespokeHandler(self, tokens, reply, self._belief)
@@ -7,7 +7,8 @@ Various services related to the ticking of the clock.
 from   datetime         import datetime
 from   dexter.core      import Notifier
 from   dexter.core.log  import LOG
-from   dexter.core.util import (fuzzy_list_range,
+from   dexter.core.util import (PHRASES,
+                                fuzzy_list_range,
                                 get_pygame,
                                 number_to_words,
                                 parse_number,
@@ -350,6 +351,9 @@ class TimerService(Service):
     """
     A service for setting timers and alarms.
     """
+    _SET_PHRASE    = ('set', 'a', 'timer', 'for')
+    _CANCEL_PHRASE = ('cancel', 'timer')
+
     def __init__(self, state, timer_sound=None, duration=5.0):
         """
         @see Service.__init__()
@@ -375,6 +379,20 @@ class TimerService(Service):
         self._interrupt_time = None
 
 
+    def _start(self):
+        """
+        @see Component._start()
+        """
+        self._register_phrases((self._SET_PHRASE, self._CANCEL_PHRASE))
+
+
+    def _stop(self):
+        """
+        @see Component._stop()
+        """
+        self._unregister_phrases()
+
+
     def evaluate(self, tokens):
         """
         @see Service.evaluate()
@@ -384,17 +402,17 @@ class TimerService(Service):
         # know I could do a cross product here but...
         words  = tuple(to_alphanumeric(word)
                        for word in self._words(tokens))
-        phrase = ('set', 'a', 'timer', 'for')
+        phrase = self._SET_PHRASE
         try:
-            (start, end, score) = fuzzy_list_range(words, phrase)
+            (start, end, score) = PHRASES.find(words, phrase)
             return _SetTimerHandler(self, tokens, words[end:])
         except Exception as e:
             pass
 
         # And now for cancelling
-        phrase = ('cancel', 'timer')
+        phrase = self._CANCEL_PHRASE
         try:
-            index = fuzzy_list_range(words, phrase)
+            index = PHRASES.find(words, phrase)
             return _CancelTimerHandler(self, tokens, words)
         except Exception as e:
             pass
@@ -732,6 +750,9 @@ class AlarmService(Service):
     """
     A service for setting alarms and alarms.
     """
+    _SET_PHRASE    = ('set', 'an', 'alarm', 'for')
+    _CANCEL_PHRASE = ('cancel', 'alarm')
+
     def __init__(self, state, alarm_sound=None, duration=5.0):
         """
         @see Service.__init__()
@@ -757,6 +778,20 @@ class AlarmService(Service):
         self._interrupt_time = None
 
 
+    def _start(self):
+        """
+        @see Component._start()
+        """
+        self._register_phrases((self._SET_PHRASE, self._CANCEL_PHRASE))
+
+
+    def _stop(self):
+        """
+        @see Component._stop()
+        """
+        self._unregister_phrases()
+
+
     def evaluate(self, tokens):
         """
         @see Service.evaluate()
@@ -765,10 +800,10 @@ class AlarmService(Service):
         # homonyms of "four" and "set" apparently sounds like "said". Yes, I
         # know I could do a cross product here but...
         words  = self._words(tokens)
-        phrase = ('set', 'an', 'alarm', 'for')
+        phrase = self._SET_PHRASE
         try:
             # Attempt to match
-            (start, end, score) = fuzzy_list_range(words, phrase)
+            (start, end, score) = PHRASES.find(words, phrase)
 
             # We need to handle the STT giving us "3:32" or "3.32" instead of "3 32"
             words = words[end:]
@@ -791,9 +826,9 @@ class AlarmService(Service):
             pass
 
         # And now for cancelling
-        phrase = ('cancel', 'alarm')
+        phrase = self._CANCEL_PHRASE
         try:
-            index = fuzzy_list_range(words, phrase)
+            index = PHRASES.find(words, phrase)
             return _CancelAlarmHandler(self, tokens, words)
         except Exception as e:
             LOG.debug("Didn't match on %s: %s", phrase, e)
@@ -3,7 +3,7 @@ Services related to natural language.
 """
 
 from   dexter.core.log    import LOG
-from   dexter.core.util   import fuzzy_list_range, to_alphanumeric
+from   dexter.core.util   import PHRASES, fuzzy_list_range, to_alphanumeric
 from   dexter.service     import Service, Handler, Result
 from   fuzzywuzzy.process import fuzz
 from   math               import sqrt
@@ -66,6 +66,11 @@ class DictionaryService(Service):
     """
     A service which looks up words in a  dictionary.
     """
+    # How a request could be phrased, as prefix and suffix pairs
+    _FIXES = ((('define',),                            tuple()),
+              (('what', 'is', 'the', 'meaning', 'of'), tuple()),
+              (('what', 'does'),                       ('mean',)))
+
     def __init__(self, state, limit=3):
         """
         @see Service.__init__()
@@ -87,6 +92,23 @@ class DictionaryService(Service):
         self._dict  = PyDictionary()
 
 
+    def _start(self):
+        """
+        @see Component._start()
+        """
+        self._register_phrases(phrase
+                               for fix in self._FIXES
+                               for phrase in fix
+                               if len(phrase) > 0)
+
+
+    def _stop(self):
+        """
+        @see Component._stop()
+        """
+        self._unregister_phrases()
+
+
     def evaluate(self, tokens):
         """
         @see Service.evaluate()
@@ -97,20 +119,17 @@ class DictionaryService(Service):
                                       .replace('+', '')
                  for word in self._words(tokens)]
 
-        # This is how it could be phrased
-        fixes = ((('define',),                            tuple()),
-                 (('what', 'is', 'the', 'meaning', 'of'), tuple()),
-                 (('what', 'does'),                       ('mean',)))
+        # Look for how it could be phrased
         match = None
-        for (prefix, suffix) in fixes:
+        for (prefix, suffix) in self._FIXES:
             try:
                 # Look for the prefix and suffix in the words
                 if len(prefix) > 0:
-                    (pre_start, pre_end, pre_score) = fuzzy_list_range(words, prefix)
+                    (pre_start, pre_end, pre_score) = PHRASES.find(words, prefix)
                 else:
                     (pre_start, pre_end, pre_score) = (0, 0, 100)
                 if len(suffix) > 0:
-                    (suf_start, suf_end, suf_score) = fuzzy_list_range(words, suffix)
+                    (suf_start, suf_end, suf_score) = PHRASES.find(words, suffix)
                 else:
                     (suf_start, suf_end, suf_score) = (len(words), len(words), 100)
                 LOG.debug("%s matches %s with from %d to %d with score %d, "
@@ -6,10 +6,10 @@ from   dexter.core.audio        import MIN_VOLUME, MAX_VOLUME
 from   dexter.core.log          import LOG
 from   dexter.core.media_index  import FileMusicIndex, AudioEntry
 from   dexter.core.player       import SimpleMP3Player
-from   dexter.core.util         import homonize, fuzzy_list_range
+from   dexter.core.util         import homonize, PHRASES
 from   dexter.service           import Service, Handler, Result
 from   fuzzywuzzy               import fuzz
-from   threading                import Thread
+from   threading                import Lock, Thread
 
 # ------------------------------------------------------------------------------
 
@@ -17,6 +17,34 @@ class MusicService(Service):
     """
     The base class for playing music on various platforms.
     """
+    # The stock phrases for controlling what's playing, along with the names of
+    # the methods which give back the handlers for them
+    _CONTROL_PHRASES = (
+        ('_get_next_song_handler', (
+            ('next', 'song'),
+            ('play', 'next', 'song'),
+            ('go',   'forward', 'a', 'song'),
+            ('move', 'forward', 'a', 'song'),
+            ('skip', 'forward', 'a', 'song'),
+        )),
+        ('_get_prev_song_handler', (
+            ('previous', 'song'),
+            ('play', 'previous', 'song'),
+            ('go',   'back',      'a', 'song'),
+            ('go',   'backwards', 'a', 'song'),
+            ('move', 'back',      'a', 'song'),
+            ('move', 'backwards', 'a', 'song'),
+            ('skip', 'back',      'a', 'song'),
+            ('skip', 'backwards', 'a', 'song'),
+        )),
+        ('_get_describe_song_handler', (
+            ('identify', 'song'),
+            ('whats', 'this', 'song'),
+            ('what', 'is', ' this', 'song'),
+            ('name', 'this', 'song'),
+        )),
+    )
+
     def __init__(self, name, state, platform):
         """
         @see Service.__init__()
@@ -31,6 +59,22 @@ class MusicService(Service):
         self._platform = platform
 
 
+    def _start(self):
+        """
+        @see Component._start()
+        """
+        self._register_phrases(phrase
+                               for (_, phrases) in self._CONTROL_PHRASES
+                               for phrase in phrases)
+
+
+    def _stop(self):
+        """
+        @see Component._stop()
+        """
+        self._unregister_phrases()
+
+
     def evaluate(self, tokens):
         """
         @see Service.evaluate()
@@ -57,36 +101,12 @@ class MusicService(Service):
             return self._get_toggle_pause_handler(tokens)
 
         # Now some potentially fuzzier matches
-        for (get_handler, phrases) in (
-                (self._get_next_song_handler, (
-                    ('next', 'song'),
-                    ('play', 'next', 'song'),
-                    ('go',   'forward', 'a', 'song'),
-                    ('move', 'forward', 'a', 'song'),
-                    ('skip', 'forward', 'a', 'song'),
-                )),
-                (self._get_prev_song_handler, (
-                    ('previous', 'song'),
-                    ('play', 'previous', 'song'),
-                    ('go',   'back',      'a', 'song'),
-                    ('go',   'backwards', 'a', 'song'),
-                    ('move', 'back',      'a', 'song'),
-                    ('move', 'backwards', 'a', 'song'),
-                    ('skip', 'back',      'a', 'song'),
-                    ('skip', 'backwards', 'a', 'song'),
-                )),
-                (self._get_describe_song_handler, (
-                    ('identify', 'song'),
-                    ('whats', 'this', 'song'),
-                    ('what', 'is', ' this', 'song'),
-                    ('name', 'this', 'song'),
-                )),
-        ):
+        for (get_handler, phrases) in self._CONTROL_PHRASES:
             for phrase in phrases:
                 try:
-                    (s, e, _) = fuzzy_list_range(words, phrase)
+                    (s, e, _) = PHRASES.find(words, phrase)
                     if s == 0 and e == len(phrase):
-                        return get_handler(tokens)
+                        return getattr(self, get_handler)(tokens)
                 except ValueError:
                     pass
 
@@ -445,27 +465,64 @@ class LocalMusicService(MusicService):
     """
     Music service for local files.
     """
-    def __init__(self, state, dirname=None):
+    def __init__(self,
+                 state,
+                 dirname      =None,
+                 index_cache  =None,
+                 index_workers=4,
+                 index_watch  ='notify'):
         """
         @see Service.__init__()
 
         :type  dirname: str
         :param dirname:
             The directory where all the music lives.
+        :type  index_cache: str
+        :param index_cache:
+            The file to cache the music index in, if any. With this the index
+            does not have to be rebuilt from scratch each time that we start.
+        :type  index_workers: int
+        :param index_workers:
+            How many threads to read the music files' tags with when indexing.
+        :type  index_watch: str
+        :param index_watch:
+            How to keep the music index up to date once it's built. This may be
+            ``notify``, to be told about changes (falling back to polling if we
+            can't be), ``poll``, to look for them every few minutes, or ``None``
+            to not bother. Polling is needed to see changes which other machines
+            make to network storage.
         """
         super().__init__("LocalMusic", state, "Local")
 
         if dirname is None:
             raise ValueError("Not given a directory name")
+        if index_watch not in ('notify', 'poll', None):
+            raise ValueError("Bad index_watch value: %s" % (index_watch,))
 
         self._player = SimpleMP3Player()
 
         # Spawn a thread to create the media index, since it can take a long
-        # time.
+        # time. The index is usable as soon as we have it, with whatever it has
+        # loaded from any cache, while it's brought up to date. If we're
+        # stopped in the meantime then we stop the index too, so that it
+        # doesn't carry on building or watching.
         self._media_index = None
+        self._index_lock  = Lock()
+        self._stopped     = False
         def create_index():
             try:
-                self._media_index = FileMusicIndex(dirname)
+                index = FileMusicIndex(dirname,
+                                       cache  =index_cache,
+                                       create =False,
+                                       workers=index_workers)
+                with self._index_lock:
+                    if self._stopped:
+                        index.stop()
+                        return
+                    self._media_index = index
+                if index_watch is not None:
+                    index.watch(poll=(index_watch == 'poll'))
+                index.create()
             except Exception as e:
                 LOG.error("Failed to create music index: %s", e)
         thread = Thread(name='MusicIndexer', target=create_index)
@@ -473,6 +530,17 @@ class LocalMusicService(MusicService):
         thread.start()
 
 
+    def _stop(self):
+        """
+        @see Component._stop()
+        """
+        super()._stop()
+        with self._index_lock:
+            self._stopped = True
+            if self._media_index is not None:
+                self._media_index.stop()
+
+
     def set_volume(self, volume):
         """
         @see MusicService.set_volume()
@@ -612,6 +680,11 @@ class LocalMusicService(MusicService):
         if len(entries) == 0:
             entries = self._media_index.lookup(album=name, artist=artist)
             if len(entries) > 0:
+                # We only want the best matching album
+                entries = [entry
+                           for entry in entries
+                           if entry.album == entries[0].album]
+
                 # Score by the album name (this is also out of 100)
                 score = fuzz.ratio(entries[0].album, name)
                 if score < 50:
@@ -187,6 +187,8 @@ class PandoraService(MusicService):
         """
         @see Startable._start()
         """
+        super()._start()
+
         builder = clientbuilder.PydoraConfigFileBuilder('')
         if not builder.file_exists:
             raise ValueError("Unable to find config file; "
@@ -203,6 +205,8 @@ class PandoraService(MusicService):
         """
         @see Startable._stop()
         """
+        super()._stop()
+
         # Be tidy
         if self._station is not None:
             self._player.end_station()
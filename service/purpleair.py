@@ -6,7 +6,7 @@ you could get an API key by mailing ``contact@purpleair.com``.
 """
 
 from   dexter.core.log   import LOG
-from   dexter.core.util  import fuzzy_list_range
+from   dexter.core.util  import PHRASES
 from   dexter.service    import Service, Handler, Result
 
 import httplib2
@@ -215,6 +215,22 @@ class PurpleAirService(Service):
         self._key       = api_key
 
 
+    def _start(self):
+        """
+        @see Component._start()
+        """
+        self._register_phrases(prefix + what
+                               for (what, _) in self._HANDLERS
+                               for prefix in self._PREFICES)
+
+
+    def _stop(self):
+        """
+        @see Component._stop()
+        """
+        self._unregister_phrases()
+
+
     def evaluate(self, tokens):
         """
         @see Service.evaluate()
@@ -224,7 +240,7 @@ class PurpleAirService(Service):
             for prefix in self._PREFICES:
                 phrase = (prefix + what)
                 try:
-                    (s, e, _) = fuzzy_list_range(words, phrase)
+                    (s, e, _) = PHRASES.find(words, phrase)
                     if s == 0 and e == len(phrase):
                         return handler(self, tokens)
                 except Exception as e:
@@ -81,8 +81,6 @@ from   dexter.core.util         import homonize, fuzzy_list_range
 from   dexter.service           import Service, Handler, Result
 from   fuzzywuzzy               import fuzz
 from   math                     import sqrt
-from   spotipy                  import Spotify
-from   spotipy.oauth2           import SpotifyOAuth
 from   .music                   import (MusicService,
                                         MusicServicePauseHandler,
                                         MusicServiceTogglePauseHandler,
@@ -285,13 +283,17 @@ class SpotifyService(MusicService):
         """
         @see Startable._start()
         """
+        super()._start()
+
         # This is what we need to be able to do
         scope = ','.join(('user-library-read',
                           'user-read-playback-state',
                           'user-modify-playback-state'))
 
         # Create the authorization manager, and then use that to create the
-        # client
+        # client. These are imported lazily since spotipy pulls in a lot.
+        from spotipy        import Spotify
+        from spotipy.oauth2 import SpotifyOAuth
         auth_manager = SpotifyOAuth(client_id    =self._client_id,
                                     client_secret=self._client_secret,
                                     redirect_uri =self._redirect_uri,
@@ -339,6 +341,8 @@ class SpotifyService(MusicService):
         """
         @see Startable._stop()
         """
+        super()._stop()
+
         try:
             self._spotify.pause_playback(device_id=self._device_id)
         except:
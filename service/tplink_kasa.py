@@ -6,8 +6,8 @@ This is very basic right now.
 
 from   dexter.core.log  import LOG
 from   dexter.core.util import (COLORS,
+                                PHRASES,
                                 as_list,
-                                fuzzy_list_range,
                                 parse_number,
                                 to_alphanumeric,
                                 to_letters)
@@ -103,6 +103,21 @@ class KasaService(Service):
         }
 
 
+    def _start(self):
+        """
+        @see Component._start()
+        """
+        self._register_phrases(action.split()
+                               for action in (self._TURN_OFF, self._TURN_ON))
+
+
+    def _stop(self):
+        """
+        @see Component._stop()
+        """
+        self._unregister_phrases()
+
+
     def evaluate(self, tokens):
         """
         @see Service.evaluate()
@@ -129,8 +144,8 @@ class KasaService(Service):
                            self._TURN_ON):
                 try:
                     # Match the different actions on the input
-                    (start, end, action_score) = fuzzy_list_range(words,
-                                                                  action.split())
+                    (start, end, action_score) = PHRASES.find(words,
+                                                              action.split())
 
                     # Did we match? The end has to be smaller than the number of
                     # words since we want to know what we're acting on.
@@ -2,6 +2,10 @@
 Classes for UPnP services.
 """
 
+from   collections              import deque
+from   concurrent.futures       import (FIRST_COMPLETED,
+                                        ThreadPoolExecutor,
+                                        wait)
 from   dexter.core.audio        import MIN_VOLUME, MAX_VOLUME
 from   dexter.core.log          import LOG
 from   dexter.core.media_index  import MusicIndex, AudioEntry
@@ -10,7 +14,7 @@ from   dexter.service           import Service, Handler, Result
 from   didl_lite                import didl_lite
 from   fnmatch                  import fnmatch
 from   fuzzywuzzy               import fuzz
-from   threading                import Thread
+from   threading                import Event, Thread
 from   .music                   import (MusicService,
                                         MusicServicePauseHandler,
                                         MusicServiceTogglePauseHandler,
@@ -191,14 +195,40 @@ class _VlcMusicService(MusicService):
 # ------------------------------------------------------------------------------
 
 class _UpnpMusicIndex(MusicIndex):
-    def __init__(self, device, globs):
+    """
+    Index the music on a UPnP server by crawling its ContentDirectory.
+
+    Big servers can have a great many folders, and can time out when asked for
+    all of a big folder's children in one go. So we browse a number of folders
+    at once, breadth first, and ask for their children a page at a time. Any
+    browse which fails is retried a few times before we give up on that part of
+    the tree.
+    """
+    # How many children we ask for in each browse
+    _PAGE_SIZE = 200
+
+    # How many times we retry a failed browse, and how long we wait before the
+    # first retry. The wait doubles with each retry.
+    _RETRIES     = 3
+    _RETRY_DELAY = 1.0
+
+    # How many entries we add to the index at a time
+    _BATCH_SIZE = 64
+
+    def __init__(self, device, globs, workers=4):
         """
         Build the music index on the given device, filtering by the globs if given.
+
+        :type  workers: int
+        :param workers:
+            How many browses to have on the go at once.
         """
         super().__init__()
 
-        self._device = device
-        self._globs  = globs
+        self._device  = device
+        self._globs   = globs
+        self._workers = max(1, int(workers))
+        self._stopped = Event()
 
 
     def create(self):
@@ -207,70 +237,187 @@ class _UpnpMusicIndex(MusicIndex):
         """
         LOG.info("Indexing %s", (self._device,))
         start = time.time()
-        self._get_songs(self._device, self._globs)
+        (browses, failures) = self._crawl()
+        self._publish()
         end = time.time()
-        LOG.info("Done indexing %s in %ds; got %d entries",
-                 self._device, end - start, self._count)
+        LOG.info("%s indexing %s in %ds with %d browses and %d failures; "
+                 "got %d entries",
+                 "Stopped" if self._stopped.is_set() else "Done",
+                 self._device, end - start, browses, failures, self._count)
 
 
-    def _get_songs(self,
-                   device,
-                   globs,
-                   seen     =set(),
-                   dirname  ='',
-                   object_id='0'):
+    def stop(self):
         """
-        Recurse into the device, walking down the ContentDirectory tree.
+        Have any `create()` which is under way give up as soon as it can. What
+        it has found so far is kept.
         """
-        LOG.info(f"Retrieving '{device.friendly_name}':/{dirname}")
-        try:
-            data = device.ContentDirectory.Browse(
-                       Filter        ='*',
-                       ObjectID      =object_id,
-                       BrowseFlag    ='BrowseDirectChildren',
-                       StartingIndex ='0',
-                       RequestedCount='-1',
-                       SortCriteria  =''
-                   )
-            entries = didl_lite.from_xml_string(data['Result'],
-                                                strict=False)
-        except Exception as e:
-            LOG.warning("Failed to browse %s: %s", dirname, e)
-            return
-
-        # Okay, let's parse them
-        for entry in entries:
-            # Create the path
-            basename = entry.title.replace("/", "|")
-            if dirname:
-                path = f'{dirname}{basename}'
-            else:
-                path = f'{basename}'
-
-            # Different actions depending on what we have
-            if isinstance(entry, didl_lite.StorageFolder):
-                # Recurse into folder?
-                path += '/'
-                if (globs is None or
-                    any(len(glob.split('/')) > len(path.split('/')) or
-                        fnmatch(path, glob)
-                        for glob in globs)):
-                    self._get_songs(device,
-                                    globs,
-                                    seen     =seen,
-                                    dirname  =path,
-                                    object_id=entry.id)
-            elif isinstance(entry, didl_lite.MusicTrack):
-                # Parse song info?
-                name   = (getattr(entry, 'title',  '') or '').strip()
-                artist = (getattr(entry, 'artist', '') or '').strip()
-                song_id = f'{path}/{artist}/{name}'
-                if song_id not in seen:
-                    seen.add(song_id)
+        self._stopped.set()
+
+
+    def _crawl(self):
+        """
+        Walk down the device's ContentDirectory tree, adding the songs which we
+        find to the index.
+
+        :rtype: tuple(int, int)
+        :return:
+            How many browses we made, and how many parts of the tree we gave up
+            on.
+        """
+        # The pages which we have yet to browse, as (dirname, object_id, start,
+        # end, tries) tuples, and the ones which we're browsing, keyed by their
+        # futures. The end is where the next page starts, or None if we don't
+        # know how many children there are.
+        queue    = deque([('', '0', 0, None, 0)])
+        running  = {}
+        seen     = set()
+        batch    = []
+        browses  = 0
+        failures = 0
+        with ThreadPoolExecutor(max_workers       =self._workers,
+                                thread_name_prefix='UpnpIndexer') as pool:
+            while len(queue) > 0 or len(running) > 0:
+                # Keep the workers busy, unless we've been told to stop, in
+                # which case we just see out the browses which are running
+                if self._stopped.is_set():
+                    queue.clear()
+                while len(queue) > 0 and len(running) < self._workers:
+                    task = queue.popleft()
+                    (_, object_id, start, _, tries) = task
+                    future = pool.submit(self._browse, object_id, start, tries)
+                    running[future] = task
+
+                # And handle whatever comes back
+                (done, _) = wait(running, return_when=FIRST_COMPLETED)
+                for future in done:
+                    (dirname, object_id, start, end, tries) = \
+                        running.pop(future)
+                    browses += 1
                     try:
-                        self._add_entry(AudioEntry.from_music_track(entry))
+                        (entries, returned, total) = future.result()
                     except Exception as e:
-                        LOG.warning("Failed to index %s: %s", song_id, e)
+                        if tries < self._RETRIES:
+                            LOG.info("Retrying browsing /%s: %s", dirname, e)
+                            queue.append((dirname, object_id, start, end,
+                                          tries + 1))
+                        else:
+                            LOG.warning("Failed to browse /%s: %s", dirname, e)
+                            failures += 1
+                        continue
+
+                    # If there's more to come then we'll want the other pages.
+                    # Once we know how many children there are we can ask for
+                    # all the pages at once, else we go one after the other. A
+                    # page which comes back short, since the device gives back
+                    # fewer than we asked for, is carried on from where it left
+                    # off. A page which comes back empty is the end of it, so
+                    # that a device which gets its numbers wrong can't keep us
+                    # going round in circles.
+                    follow = start + returned
+                    if returned == 0:
+                        if end is not None and start < end:
+                            LOG.warning("Got nothing browsing /%s from %d of %d",
+                                        dirname, start, total)
+                    elif end is None and total > 0:
+                        # Go by what it gave us, since it may give back fewer
+                        # than we ask for each time
+                        step = returned
+                        queue.extend((dirname,
+                                      object_id,
+                                      page,
+                                      min(page + step, total),
+                                      0)
+                                     for page in range(follow, total, step))
+                    elif end is None or follow < end:
+                        queue.append((dirname, object_id, follow, end, 0))
+
+                    # Now look at what we got
+                    for entry in entries:
+                        self._handle(dirname, entry, queue, seen, batch)
+                    if len(batch) >= self._BATCH_SIZE:
+                        self._add_entries(batch)
+                        batch.clear()
+
+        self._add_entries(batch)
+        return (browses, failures)
+
+
+    def _browse(self, object_id, start, tries):
+        """
+        Get a page of the children of the given object from the device. This is
+        called in the workers.
+
+        :rtype: tuple(list(didl_lite.DidlObject), int, int)
+        :return:
+            The children, how many the device says that it returned, and how many
+            it says that there are in all (zero if it doesn't know).
+        """
+        if tries > 0:
+            if self._stopped.wait(self._RETRY_DELAY * 2 ** (tries - 1)):
+                raise ValueError("Stopped")
+        data = self._device.ContentDirectory.Browse(
+                   Filter        ='*',
+                   ObjectID      =object_id,
+                   BrowseFlag    ='BrowseDirectChildren',
+                   StartingIndex =str(start),
+                   RequestedCount=str(self._PAGE_SIZE),
+                   SortCriteria  =''
+               )
+        entries = didl_lite.from_xml_string(data['Result'], strict=False)
+        return (entries,
+                int(data.get('NumberReturned') or len(entries)),
+                int(data.get('TotalMatches')   or 0))
+
+
+    def _handle(self, dirname, entry, queue, seen, batch):
+        """
+        Handle a child which we got from browsing the given directory.
+
+        :type  dirname: str
+        :param dirname:
+            The path of the directory, ending in a slash if it's not the root.
+        :type  entry: didl_lite.DidlObject
+        :param entry:
+            The child.
+        :type  queue: deque
+        :param queue:
+            Where to add the child if it's a folder which we want to browse.
+        :type  seen: set(str)
+        :param seen:
+            The songs which we have already seen.
+        :type  batch: list(AudioEntry)
+        :param batch:
+            Where to add the child if it's a new song.
+        """
+        # Create the path
+        basename = entry.title.replace("/", "|")
+        if dirname:
+            path = f'{dirname}{basename}'
+        else:
+            path = f'{basename}'
+
+        # Different actions depending on what we have
+        if isinstance(entry, didl_lite.StorageFolder):
+            # Recurse into folder?
+            path += '/'
+            if (self._globs is None or
+                any(len(glob.split('/')) > len(path.split('/')) or
+                    fnmatch(path, glob)
+                    for glob in self._globs)):
+                queue.append((path, entry.id, 0, None, 0))
+        elif isinstance(entry, didl_lite.MusicTrack):
+            # Parse song info?
+            name   = (getattr(entry, 'title',  '') or '').strip()
+            artist = (getattr(entry, 'artist', '') or '').strip()
+            song_id = f'{path}/{artist}/{name}'
+            if song_id not in seen:
+                seen.add(song_id)
+                try:
+                    audio = AudioEntry.from_music_track(entry)
+                    if audio is not None:
+                        batch.append(audio)
+                except Exception as e:
+                    LOG.warning("Failed to index %s: %s", song_id, e)
 
 
 class UpnpMusicService(_VlcMusicService):
@@ -281,8 +428,9 @@ class UpnpMusicService(_VlcMusicService):
     """
     def __init__(self, state,
                  server_name,
-                 alias=None,
-                 globs=None):
+                 alias        =None,
+                 globs        =None,
+                 index_workers=4):
         """
         @see Service.__init__()
 
@@ -297,6 +445,9 @@ class UpnpMusicService(_VlcMusicService):
         :param globs:
             Any matches to use when traversing the directory hierarchies in the
             DLNA servers. Ignored if ``None``.
+        :type  index_workers: int
+        :param index_workers:
+            How many requests to make of the server at once when indexing it.
         """
         super().__init__("UpnpMusic",
                          state,
@@ -309,18 +460,17 @@ class UpnpMusicService(_VlcMusicService):
             if not isinstance(globs, (list, tuple)):
                 globs = [globs]
 
-        self._globs       = globs
-        self._server_name = server_name
-        self._server      = None
-        self._media_index = None
+        self._globs         = globs
+        self._index_workers = index_workers
+        self._server_name   = server_name
+        self._server        = None
+        self._media_index   = None
 
 
     def _start(self):
         """
         @see Service._start()
         """
-        super()._start()
-
         # Look for what we have sitting on the network
         LOG.info("Looking for UPnP devices...")
         upnp = upnpy.UPnP()
@@ -355,9 +505,14 @@ class UpnpMusicService(_VlcMusicService):
                     (self._server_name, svc)
                 )
 
+        # We have what we need, so we can take requests
+        super()._start()
+
         # Spawn a thread to create the media index, since it can take a long
         # time
-        self._media_index = _UpnpMusicIndex(self._server, self._globs)
+        self._media_index = _UpnpMusicIndex(self._server,
+                                            self._globs,
+                                            workers=self._index_workers)
         def create_index():
             try:
                 self._media_index.create()
@@ -369,6 +524,15 @@ class UpnpMusicService(_VlcMusicService):
         thread.start()
 
 
+    def _stop(self):
+        """
+        @see Component._stop()
+        """
+        super()._stop()
+        if self._media_index is not None:
+            self._media_index.stop()
+
+
     def _match_artist(self, artist):
         """
         @see MusicService._match_artist()
@@ -427,6 +591,11 @@ class UpnpMusicService(_VlcMusicService):
         if len(entries) == 0:
             entries = self._media_index.lookup(album=name, artist=artist)
             if len(entries) > 0:
+                # We only want the best matching album
+                entries = [entry
+                           for entry in entries
+                           if entry.album == entries[0].album]
+
                 # Score by the album name (this is also out of 100)
                 score = fuzz.ratio(entries[0].album, name)
                 if score < 50:
@@ -11,7 +11,7 @@ and obtain and API key for personal use. See::
 
 from   datetime         import date, timedelta
 from   dexter.core.log  import LOG
-from   dexter.core.util import fuzzy_list_range, parse_number, to_letters
+from   dexter.core.util import PHRASES, parse_number, to_letters
 from   dexter.service   import Service, Handler, Result
 from   fuzzywuzzy       import fuzz
 from   urllib.request   import Request, urlopen
@@ -364,6 +364,8 @@ class WeatherService(Service):
     """
     A service which gets the weather.
     """
+    _PREFIX = ("whats", "the", "weather")
+
     def __init__(self,
                  state,
                  coordinates=None,
@@ -406,6 +408,20 @@ class WeatherService(Service):
             raise ValueError(f"Unhandled region: {region}")
 
 
+    def _start(self):
+        """
+        @see Component._start()
+        """
+        self._register_phrases((self._PREFIX,))
+
+
+    def _stop(self):
+        """
+        @see Component._stop()
+        """
+        self._unregister_phrases()
+
+
     def evaluate(self, tokens):
         """
         @see Service.evaluate()
@@ -413,8 +429,7 @@ class WeatherService(Service):
         # Turn the tokens into a set of words to match on
         words = self._words(tokens)
         try:
-            prefix = ("whats", "the", "weather")
-            (start, end, score) = fuzzy_list_range(words, prefix)
+            (start, end, score) = PHRASES.find(words, self._PREFIX)
             if len(words) >= end:
                 LOG.info("Matched on: %s", ' '.join(words))
                 return self._handler_class(
@@ -0,0 +1,978 @@
+"""
+The common parts of the speech-to-text servers, like C{whisper_server.py}.
+
+The servers listen for connections from a L{RemoteInput} and decode the audio
+which it sends them. Two versions of the protocol are spoken, and which one a
+client wants is determined by the first 8 bytes which it sends. All values are
+in network byte order.
+
+Version 1 uses a connection per utterance:
+  - The client sends a header of three longs: channels, width and rate.
+  - The client sends the audio as chunks, each prefixed by its length as a long.
+  - The client sends a length of -1 to denote the end of the audio.
+  - The server sends back the decoded string, prefixed by its length as a long,
+    and closes the connection.
+
+Version 2 uses a long-lived connection which can carry many utterances, possibly
+at the same time:
+  - The client sends C{V2_HELLO}, in place of the version 1 header, and the
+    server echoes it back. Since it has a rate of zero, a version 1 server will
+    reject it and close the connection, so the client can fall back.
+  - From then on, both sides send frames. Each frame is a header of the frame
+    type (a byte), the utterance ID (a long) and the payload length (a long),
+    followed by the payload.
+  - The client sends C{START}, with the version 1 header as its payload, then
+    C{DATA} frames of audio, then C{END}. The server replies with a C{RESULT}
+    frame holding the decoded string, or an C{ERROR} frame holding a message.
+  - The client sends C{PING} frames when it is otherwise idle and the server
+    replies with a C{PONG}. The server drops connections which have been
+    silent for longer than C{IDLE_TIMEOUT} seconds.
+
+The connections are all read by a single thread, using a selector, so idle ones
+cost next to nothing. The decoding work is done by a pool of threads, in the
+order in which it arrived on each connection.
+
+The servers can also be run with a pool of worker processes, each with its own
+copy of the model, so that decoding can use more than one core. The parent
+process accepts the connections and hands each one off to the least loaded
+worker, which then talks to the client directly. The clients can't tell the
+difference.
+"""
+
+from   collections        import deque
+from   concurrent.futures import ThreadPoolExecutor
+from   threading          import Event, Lock, Thread
+
+import logging
+import os
+import selectors
+import signal
+import socket
+import struct
+import time
+
+# ------------------------------------------------------------------------------
+
+# The version 1 header and chunk lengths
+HEADER = struct.Struct('!qqq')
+LENGTH = struct.Struct('!q')
+
+# What a version 2 client sends first, and what the server echoes back. The
+# magic is followed by the version and some (currently unused) flags.
+V2_MAGIC = b'DEXTERv2'
+V2_HELLO = V2_MAGIC + struct.pack('!qq', 2, 0)
+
+# The version 2 frame header: type, utterance ID, payload length
+FRAME = struct.Struct('!Bqq')
+
+# The version 2 frame types
+START  = 1
+DATA   = 2
+END    = 3
+PING   = 4
+PONG   = 5
+RESULT = 6
+ERROR  = 7
+
+# How long a connection may be silent for before we drop it, unless we are busy
+# doing something for it
+IDLE_TIMEOUT = 60
+
+# How long we will wait for a client to accept what we send it
+SEND_TIMEOUT = 30
+
+# The most threads to do the decoding work with
+MAX_THREADS = 32
+
+# The largest frame payload which we will accept
+MAX_PAYLOAD = 16 * 1024 * 1024
+
+# How long the workers have to finish off what they are doing when shutting down
+SHUTDOWN_GRACE = 10
+
+# How long we wait before replacing a worker which died before it was ready, at
+# first and at most. The wait doubles each time that happens in a row.
+RESPAWN_DELAY     = 1
+RESPAWN_DELAY_MAX = 60
+
+# How many times in a row a worker may die before it's ready before we give up
+MAX_WORKER_FAILURES = 5
+
+# What a worker sends to the parent when it's ready for work, and when it's done
+# with a connection
+_READY = b'+'
+_DONE  = b'-'
+
+# ------------------------------------------------------------------------------
+
+class Decoder(object):
+    """
+    Decodes a single utterance. Each server provides its own version of this.
+    """
+    def __init__(self, channels, width, rate):
+        """
+        :type  channels: int
+        :param channels:
+            The number of audio channels.
+        :type  width: int
+        :param width:
+            The number of bytes in each sample.
+        :type  rate: int
+        :param rate:
+            The sample rate.
+        """
+        if width not in (1, 2, 4, 8):
+            raise ValueError("Unhandled width: %d" % width)
+
+        self.channels = channels
+        self.width    = width
+        self.rate     = rate
+
+
+    def feed(self, data):
+        """
+        Feed in the next chunk of audio.
+
+        :type  data: bytes
+        :param data:
+            The raw audio data.
+        """
+        # Subclasses should implement this
+        raise NotImplementedError("Abstract method called")
+
+
+    def finish(self):
+        """
+        Decode everything which was fed in.
+
+        :rtype: str
+        :return:
+            The decoded words.
+        """
+        # Subclasses should implement this
+        raise NotImplementedError("Abstract method called")
+
+
+# ------------------------------------------------------------------------------
+
+def serve(port, create_decoder, workers=1, init=None):
+    """
+    Listen for connections on the given port and handle them, forever.
+
+    :type  port: int
+    :param port:
+        The port number to listen on.
+    :type  create_decoder: function
+    :param create_decoder:
+        A function which takes the channels, width and rate of an utterance and
+        gives back a L{Decoder} for it. This should raise an exception if it
+        can't handle audio of that type.
+    :type  workers: int
+    :param workers:
+        The number of worker processes to run. If this is 1 then everything is
+        done in this process.
+    :type  init: function
+    :param init:
+        A function to call, with no arguments, before handling any connections.
+        This is where the model should be loaded, since it's called by each of
+        the workers.
+    """
+    # Set up the server socket
+    logging.info("Opening socket on port %d", port)
+    sckt = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+    sckt.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+    sckt.bind(('0.0.0.0', port))
+    sckt.listen(max(5, 5 * workers))
+
+    # Hand off to the pool?
+    if workers > 1:
+        _Pool(sckt, create_decoder, workers, init).run()
+        return
+
+    if init is not None:
+        init()
+    reactor = _Reactor(create_decoder)
+
+    # Do this forever
+    while True:
+        try:
+            # Get a connection
+            logging.info("Waiting for a connection")
+            (conn, addr) = sckt.accept()
+            logging.info("Got connection from %s" % (addr,))
+            reactor.add(conn)
+
+        except Exception as e:
+            # Tell the user at least
+            logging.error("Error handling incoming connection: %s", e)
+
+
+class _Reactor(object):
+    """
+    Reads from all the client connections in one thread, handing what they
+    send over to a thread pool to act on.
+    """
+    def __init__(self, create_decoder):
+        """
+        @see serve()
+        """
+        self._create_decoder = create_decoder
+        self._selector       = selectors.DefaultSelector()
+        self._pool           = ThreadPoolExecutor(max_workers=MAX_THREADS,
+                                                  thread_name_prefix='Decode')
+        self._connections    = set()
+        self._stopping       = False
+        self._stopped        = Event()
+
+        # The connections which have yet to be closed, including the ones which
+        # we have stopped reading from but which are still busy
+        self._lock = Lock()
+        self._open = set()
+
+        # How other threads ask us to do things, and how they wake us up to do
+        # them
+        self._commands = deque()
+        (self._wake_r, self._wake_w) = socket.socketpair()
+        self._wake_r.setblocking(False)
+        self._wake_w.setblocking(False)
+        self._selector.register(self._wake_r, selectors.EVENT_READ)
+
+        thread = Thread(name='Reactor', target=self._run)
+        thread.daemon = True
+        thread.start()
+
+
+    def add(self, conn, on_done=None):
+        """
+        Start handling a new client connection.
+
+        :type  conn: socket.socket
+        :param conn:
+            The connection.
+        :type  on_done: function
+        :param on_done:
+            What to call, with no arguments, once the connection is closed.
+        """
+        connection = _Connection(self, conn, on_done)
+        with self._lock:
+            self._open.add(connection)
+        self._call(self._add, connection)
+
+
+    def close(self, connection):
+        """
+        Close the given connection once it has finished any work which it has
+        in hand.
+        """
+        self._call(self._close, connection)
+
+
+    def stop(self, grace):
+        """
+        Stop reading from the clients, letting any work in hand finish and
+        closing the connections. Blocks until this is done, or the grace period
+        is up.
+
+        :type  grace: float
+        :param grace:
+            How long to wait, in seconds.
+        """
+        self._call(self._stop)
+        self._stopped.wait(grace)
+
+
+    def closed(self, connection):
+        """
+        Called by a connection once it has actually been closed.
+        """
+        with self._lock:
+            self._open.discard(connection)
+            if self._stopping and not self._open:
+                self._stopped.set()
+
+
+    def submit(self, func, *args):
+        """
+        Have the thread pool call the given function.
+        """
+        return self._pool.submit(func, *args)
+
+
+    def create_decoder(self, channels, width, rate):
+        """
+        @see serve()
+        """
+        return self._create_decoder(channels, width, rate)
+
+
+    def _call(self, func, *args):
+        """
+        Have the reactor thread call the given function.
+        """
+        self._commands.append((func, args))
+        try:
+            self._wake_w.send(b'x')
+        except BlockingIOError:
+            # It's already been woken up
+            pass
+
+
+    def _run(self):
+        """
+        The reactor loop, forever.
+        """
+        next_sweep = 0
+        while True:
+            try:
+                for (key, _) in self._selector.select(timeout=1.0):
+                    if key.fileobj is self._wake_r:
+                        self._drain_commands()
+                        continue
+
+                    # This might have been closed by an earlier event
+                    connection = key.data
+                    if connection not in self._connections:
+                        continue
+                    try:
+                        if not connection.on_readable():
+                            logging.info("Connection closed by client")
+                            self._close(connection)
+                    except Exception as e:
+                        logging.error("Error handling incoming data: %s", e)
+                        self._close(connection)
+
+                # Drop anyone who has gone quiet on us, checking every so often
+                now = time.monotonic()
+                if now < next_sweep:
+                    continue
+                next_sweep = now + 1.0
+                for connection in tuple(self._connections):
+                    if (connection.is_idle and
+                        now - connection.last_heard > IDLE_TIMEOUT):
+                        logging.info("Connection timed out")
+                        self._close(connection)
+
+            except Exception as e:
+                logging.error("Error in reactor: %s", e)
+
+
+    def _drain_commands(self):
+        """
+        Handle what the other threads asked us to do.
+        """
+        try:
+            while self._wake_r.recv(4096):
+                pass
+        except BlockingIOError:
+            pass
+        while self._commands:
+            (func, args) = self._commands.popleft()
+            func(*args)
+
+
+    def _add(self, connection):
+        """
+        Start reading from the given connection.
+        """
+        if self._stopping:
+            connection.close()
+            return
+        self._connections.add(connection)
+        self._selector.register(connection.sock,
+                                selectors.EVENT_READ,
+                                connection)
+
+
+    def _close(self, connection):
+        """
+        Stop reading from the given connection, and close it.
+        """
+        if connection in self._connections:
+            self._connections.discard(connection)
+            self._selector.unregister(connection.sock)
+            connection.close()
+
+
+    def _stop(self):
+        """
+        Stop reading from all the connections.
+        """
+        with self._lock:
+            self._stopping = True
+            if not self._open:
+                self._stopped.set()
+        for connection in tuple(self._connections):
+            self._close(connection)
+
+
+class _Connection(object):
+    """
+    A client connection.
+
+    The reactor reads the data from the client into this, directly into
+    preallocated buffers. Whenever a whole header or payload has come in, the
+    work which it calls for is queued up. The thread pool does that work, in
+    order, and only one of its threads does so for any given connection at any
+    one time.
+    """
+    def __init__(self, reactor, sock, on_done):
+        """
+        :type  reactor: _Reactor
+        :param reactor:
+            The reactor which is reading from the connection.
+        :type  sock: socket.socket
+        :param sock:
+            The client connection.
+        :type  on_done: function
+        :param on_done:
+            What to call once the connection has been closed, if anything.
+        """
+        self.sock       = sock
+        self.last_heard = time.monotonic()
+
+        self._reactor  = reactor
+        self._on_done  = on_done
+        self._lock     = Lock()
+        self._pending  = deque()
+        self._busy     = False
+        self._closing  = False
+        self._closed   = False
+        self._decoders = dict()
+
+        # Where the fixed sized parts of the protocol are read into
+        self._header = memoryview(bytearray(HEADER.size))
+
+        # Read with a timeout, so that we can't be blocked forever when we
+        # send. The reactor only reads when there's data ready for us.
+        self.sock.settimeout(SEND_TIMEOUT)
+
+        # The first 8 bytes tell us which version of the protocol the client is
+        # speaking
+        self._expect(self._header[:len(V2_MAGIC)], self._on_magic)
+
+
+    @property
+    def is_idle(self):
+        """
+        Whether we have nothing in hand for the client.
+        """
+        with self._lock:
+            return not self._busy
+
+
+    def on_readable(self):
+        """
+        Read what the client has sent us. The reactor calls this when there's
+        something to read.
+
+        :return: Whether the connection is still open.
+        """
+        got = self.sock.recv_into(self._target[self._got:])
+        if got == 0:
+            return False
+
+        self.last_heard = time.monotonic()
+        self._got += got
+        if self._got == len(self._target):
+            self._on_full(self._target)
+        return True
+
+
+    def close(self):
+        """
+        Close the connection, once the work which we have in hand is done.
+        """
+        with self._lock:
+            self._closing = True
+            if self._busy:
+                return
+        self._close()
+
+
+    def _expect(self, target, on_full):
+        """
+        Say what to read next, and what to do once it's all in.
+
+        :type  target: memoryview
+        :param target:
+            Where to read it into.
+        :type  on_full: function
+        :param on_full:
+            What to call, with the target, once it has been filled.
+        """
+        self._target  = target
+        self._got     = 0
+        self._on_full = on_full
+
+
+    def _queue(self, func, *args):
+        """
+        Queue up the given work for the thread pool.
+        """
+        with self._lock:
+            self._pending.append((func, args))
+            if self._busy:
+                return
+            self._busy = True
+        self._reactor.submit(self._work)
+
+
+    def _work(self):
+        """
+        Do the work which has been queued up, in the thread pool.
+        """
+        while True:
+            with self._lock:
+                if not self._pending:
+                    self._busy = False
+                    if self._closing:
+                        break
+                    return
+                (func, args) = self._pending.popleft()
+
+            try:
+                func(*args)
+            except Exception as e:
+                logging.error("Error handling incoming data: %s", e)
+                with self._lock:
+                    self._pending.clear()
+                self._reactor.close(self)
+
+        # We were asked to close while we were busy
+        self._close()
+
+
+    def _close(self):
+        """
+        Actually close the connection, in a best-effort fashion.
+        """
+        with self._lock:
+            if self._closed:
+                return
+            self._closed = True
+        try:
+            logging.info("Closing connection")
+            self.sock.shutdown(socket.SHUT_RDWR)
+            self.sock.close()
+        except:
+            pass
+        self._reactor.closed(self)
+        if self._on_done is not None:
+            self._on_done()
+
+
+    def _on_magic(self, data):
+        """
+        We have the first 8 bytes from the client.
+        """
+        rest = self._header[len(V2_MAGIC):]
+        if data == V2_MAGIC:
+            self._expect(rest[:len(V2_HELLO) - len(V2_MAGIC)], self._on_hello)
+        else:
+            self._expect(rest, self._on_v1_header)
+
+
+    # - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - -
+
+    def _on_v1_header(self, data):
+        """
+        We have the rest of a version 1 header.
+        """
+        (channels, width, rate) = HEADER.unpack(self._header)
+        self._queue(self._start_v1, channels, width, rate)
+        self._expect(self._header[:LENGTH.size], self._on_v1_length)
+
+
+    def _on_v1_length(self, data):
+        """
+        We have the length of the next version 1 chunk.
+        """
+        (length,) = LENGTH.unpack(data)
+        if length < 0:
+            # That's it from the client. The connection is closed once the
+            # result has been sent back, and we don't expect anything more.
+            logging.debug("Got end of data")
+            self._queue(self._finish_v1)
+            self._expect(self._header[:1], self._on_unexpected)
+        elif length > MAX_PAYLOAD:
+            raise ValueError("Bad chunk length: %d" % (length,))
+        elif length == 0:
+            self._queue(self._feed_v1, b'')
+        else:
+            logging.debug("Reading %d bytes of data", length)
+            self._expect(memoryview(bytearray(length)), self._on_v1_chunk)
+
+
+    def _on_v1_chunk(self, data):
+        """
+        We have a version 1 chunk of audio.
+        """
+        self._queue(self._feed_v1, data.obj)
+        self._expect(self._header[:LENGTH.size], self._on_v1_length)
+
+
+    def _on_unexpected(self, data):
+        """
+        The client sent us something when it should have been quiet.
+        """
+        raise ValueError("Unexpected data from client")
+
+
+    def _start_v1(self, channels, width, rate):
+        """
+        Start decoding a version 1 utterance.
+        """
+        logging.info("%d channel(s), %d byte(s) wide, %dHz",
+                     channels, width, rate)
+        self._decoders[0] = self._reactor.create_decoder(channels, width, rate)
+
+
+    def _feed_v1(self, data):
+        """
+        Feed in a version 1 chunk of audio.
+        """
+        self._decoders[0].feed(data)
+
+
+    def _finish_v1(self):
+        """
+        Send back the result of a version 1 utterance, and we're done.
+        """
+        # Send back the length (as a long) and the string
+        words = self._decoders.pop(0).finish().encode()
+        self.sock.sendall(LENGTH.pack(len(words)) + words)
+        self._reactor.close(self)
+
+
+    # - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - -
+
+    def _on_hello(self, data):
+        """
+        We have the rest of a version 2 hello.
+        """
+        self._queue(self._hello_v2)
+        self._expect(self._header[:FRAME.size], self._on_v2_frame)
+
+
+    def _on_v2_frame(self, data):
+        """
+        We have a version 2 frame header.
+        """
+        (kind, uid, length) = FRAME.unpack(data)
+        if length < 0 or length > MAX_PAYLOAD:
+            raise ValueError("Bad payload length: %d" % (length,))
+
+        if length == 0:
+            self._on_v2_payload(kind, uid, b'')
+        else:
+            self._expect(
+                memoryview(bytearray(length)),
+                lambda payload: self._on_v2_payload(kind, uid, payload.obj)
+            )
+
+
+    def _on_v2_payload(self, kind, uid, payload):
+        """
+        We have a whole version 2 frame.
+        """
+        self._queue(self._handle_v2, kind, uid, payload)
+        self._expect(self._header[:FRAME.size], self._on_v2_frame)
+
+
+    def _hello_v2(self):
+        """
+        Say hello back to a version 2 client.
+        """
+        logging.info("Client is using protocol version 2")
+        self.sock.sendall(V2_HELLO)
+
+
+    def _handle_v2(self, kind, uid, payload):
+        """
+        Act on a version 2 frame. A None in the decoders means that the
+        utterance failed and the client has already been told.
+        """
+        decoders = self._decoders
+        if kind == PING:
+            _send(self.sock, PONG, uid)
+            return
+        elif kind not in (START, DATA, END):
+            logging.warning("Ignoring unknown frame type %d", kind)
+            return
+
+        try:
+            if kind == START:
+                (channels, width, rate) = HEADER.unpack(payload)
+                logging.info("Utterance %d: "
+                             "%d channel(s), %d byte(s) wide, %dHz",
+                             uid, channels, width, rate)
+                decoders[uid] = self._reactor.create_decoder(channels,
+                                                             width,
+                                                             rate)
+
+            elif kind == DATA:
+                if uid not in decoders:
+                    raise ValueError("Unknown utterance %d" % (uid,))
+                decoder = decoders[uid]
+                if decoder is not None:
+                    decoder.feed(payload)
+
+            elif kind == END:
+                if uid not in decoders:
+                    raise ValueError("Unknown utterance %d" % (uid,))
+                decoder = decoders.pop(uid)
+                if decoder is not None:
+                    _send(self.sock, RESULT, uid, decoder.finish().encode())
+
+        except OSError:
+            # Can't talk to the client
+            raise
+
+        except Exception as e:
+            # Tell the client and ignore anything else it sends for this
+            # utterance
+            logging.error("Error handling utterance %d: %s", uid, e)
+            _send(self.sock, ERROR, uid, str(e).encode())
+            if kind != END:
+                decoders[uid] = None
+
+
+def _send(conn, kind, uid, payload=b''):
+    """
+    Send a version 2 frame.
+    """
+    conn.sendall(FRAME.pack(kind, uid, len(payload)) + payload)
+
+
+# ------------------------------------------------------------------------------
+
+class _Pool(object):
+    """
+    A pool of pre-forked worker processes which the connections are handed off
+    to.
+
+    Each worker has a Unix socket back to the parent. The parent passes the
+    connections down it, and the worker sends back a C{_READY} byte once it has
+    loaded its model and a C{_DONE} byte each time it closes a connection. This
+    lets the parent keep count of how many connections each worker has.
+
+    Each worker has a slot in the pool. If a worker dies before it's ready, like
+    when its model can't be loaded, then the slot waits a while before trying
+    again, and longer each time. If that keeps happening then we give up.
+    """
+    def __init__(self, sckt, create_decoder, count, init):
+        """
+        @see serve()
+        """
+        self._sckt           = sckt
+        self._create_decoder = create_decoder
+        self._count          = count
+        self._init           = init
+        self._selector       = selectors.DefaultSelector()
+        self._stopping       = False
+
+        # The workers' channels, mapped to their [pid, ready, load, slot]
+        self._workers = dict()
+
+        # How many times in a row each slot's worker died before it was ready,
+        # and when we next start a worker in the slots which are waiting
+        self._failures = [0] * count
+        self._respawns = dict()
+        self._failed   = None
+
+
+    def run(self):
+        """
+        Run the pool until we are told to stop.
+        """
+        for slot in range(self._count):
+            self._spawn(slot)
+
+        # Shut down cleanly when asked to
+        def stop(signum, frame):
+            logging.info("Got signal %d, shutting down", signum)
+            self._stopping = True
+        signal.signal(signal.SIGTERM, stop)
+        signal.signal(signal.SIGINT,  stop)
+
+        self._selector.register(self._sckt, selectors.EVENT_READ)
+        try:
+            while not self._stopping:
+                # Restart any workers which are due
+                now = time.monotonic()
+                for (slot, when) in tuple(self._respawns.items()):
+                    if when <= now:
+                        del self._respawns[slot]
+                        self._spawn(slot)
+                timeout = min([1.0] + [max(0.0, when - now)
+                                       for when in self._respawns.values()])
+
+                for (key, _) in self._selector.select(timeout=timeout):
+                    try:
+                        if key.fileobj is self._sckt:
+                            self._dispatch()
+                        else:
+                            self._hear(key.fileobj)
+                    except Exception as e:
+                        logging.error("Error in worker pool: %s", e)
+        finally:
+            self._shutdown()
+
+        if self._failed is not None:
+            raise RuntimeError(self._failed)
+
+
+    def _spawn(self, slot):
+        """
+        Fork off a new worker, in the given slot.
+        """
+        (parent, child) = socket.socketpair(socket.AF_UNIX, socket.SOCK_STREAM)
+        pid = os.fork()
+        if pid == 0:
+            # In the worker. Drop everything which belongs to the parent, and
+            # leave the parent to decide when we go away, since signals tend to
+            # get sent to the whole process group.
+            status = 0
+            try:
+                signal.signal(signal.SIGINT,  signal.SIG_IGN)
+                signal.signal(signal.SIGTERM, signal.SIG_IGN)
+                parent.close()
+                self._sckt.close()
+                for chan in self._workers:
+                    chan.close()
+                _work(child, self._create_decoder, self._init)
+            except Exception as e:
+                logging.error("Worker failed: %s", e)
+                status = 1
+            finally:
+                os._exit(status)
+
+        # In the parent
+        child.close()
+        self._workers[parent] = [pid, False, 0, slot]
+        self._selector.register(parent, selectors.EVENT_READ)
+        logging.info("Started worker %d", pid)
+
+
+    def _dispatch(self):
+        """
+        Accept a connection and hand it to the least loaded worker.
+        """
+        (conn, addr) = self._sckt.accept()
+        try:
+            # Prefer the workers which are ready to go
+            ready = [chan for (chan, (_, is_ready, _, _)) in self._workers.items()
+                     if is_ready]
+            chan = min(ready or self._workers,
+                       key=lambda chan: self._workers[chan][2])
+            socket.send_fds(chan, [b'c'], [conn.fileno()])
+            self._workers[chan][2] += 1
+            logging.info("Passed connection from %s to worker %d, "
+                         "which now has %d",
+                         addr, self._workers[chan][0], self._workers[chan][2])
+        finally:
+            # The worker has its own copy now
+            conn.close()
+
+
+    def _hear(self, chan):
+        """
+        Read what a worker has told us.
+        """
+        data = chan.recv(4096)
+        if len(data) == 0:
+            # It went away on us, so replace it. If it never got going then
+            # something is likely wrong with its setup, so we back off.
+            (pid, ready, _, slot) = self._workers.pop(chan)
+            self._selector.unregister(chan)
+            chan.close()
+            (_, status) = os.waitpid(pid, 0)
+            logging.warning("Worker %d exited with status %d",
+                            pid, os.waitstatus_to_exitcode(status))
+            if self._stopping:
+                return
+            if ready:
+                self._spawn(slot)
+                return
+
+            self._failures[slot] += 1
+            if self._failures[slot] >= MAX_WORKER_FAILURES:
+                self._failed = ("Workers died before they were ready %d times "
+                                "in a row, giving up" % self._failures[slot])
+                logging.critical(self._failed)
+                self._stopping = True
+            else:
+                delay = min(RESPAWN_DELAY_MAX,
+                            RESPAWN_DELAY * 2 ** (self._failures[slot] - 1))
+                logging.error("Worker %d died before it was ready, "
+                              "replacing it in %gs", pid, delay)
+                self._respawns[slot] = time.monotonic() + delay
+            return
+
+        worker = self._workers[chan]
+        if _READY in data:
+            logging.info("Worker %d is ready", worker[0])
+            worker[1] = True
+            self._failures[worker[3]] = 0
+        worker[2] = max(0, worker[2] - data.count(_DONE))
+
+
+    def _shutdown(self):
+        """
+        Close down all the workers, giving them a chance to finish what they're
+        doing.
+        """
+        logging.info("Stopping %d worker(s)", len(self._workers))
+        self._sckt.close()
+
+        # Closing a worker's channel tells it to stop
+        pids = [pid for (pid, _, _, _) in self._workers.values()]
+        for chan in self._workers:
+            chan.close()
+        self._workers.clear()
+
+        # Wait for them, and force the issue if they take too long
+        deadline = time.monotonic() + SHUTDOWN_GRACE + 1
+        while len(pids) > 0:
+            for pid in tuple(pids):
+                if os.waitpid(pid, os.WNOHANG)[0] == pid:
+                    pids.remove(pid)
+            if len(pids) > 0:
+                if time.monotonic() > deadline:
+                    for pid in pids:
+                        logging.warning("Killing worker %d", pid)
+                        os.kill(pid, signal.SIGKILL)
+                    deadline = float('inf')
+                time.sleep(0.1)
+        logging.info("All workers stopped")
+
+
+def _work(chan, create_decoder, init):
+    """
+    The main loop of a worker process. This handles the connections which the
+    parent sends it until the parent closes the channel.
+    """
+    if init is not None:
+        init()
+    reactor = _Reactor(create_decoder)
+
+    lock = Lock()
+    def done():
+        with lock:
+            try:
+                chan.sendall(_DONE)
+            except OSError:
+                pass
+
+    chan.sendall(_READY)
+    while True:
+        (msg, fds, _, _) = socket.recv_fds(chan, 1, 1)
+        if len(msg) == 0:
+            break
+        for fd in fds:
+            reactor.add(socket.socket(fileno=fd), done)
+
+    # Stop reading from the clients, which lets any decodes in flight finish
+    # and send back their results
+    logging.info("Worker %d stopping", os.getpid())
+    reactor.stop(SHUTDOWN_GRACE)
@@ -11,132 +11,546 @@ cloud to process, then it seems only fair that we can do something like that
 too.
 """
 
-from   threading  import Lock, Thread
+from   concurrent.futures      import Future
+from   numpy.lib.stride_tricks import sliding_window_view
+from   stt_server              import Decoder, serve
+from   threading               import Thread
+from   whisper.audio           import HOP_LENGTH, N_FFT, N_FRAMES, N_SAMPLES
 
 import argparse
+import dataclasses
 import logging
 import numpy
-import os
-import socket
-import struct
+import queue
 import time
+import torch
 import whisper
 
 # ------------------------------------------------------------------------------
 
 _MODELS = ('tiny', 'base', 'small', 'medium', 'large')
-_LOCK   = Lock()
 
 # ------------------------------------------------------------------------------
 
-def handle(conn, translate):
+class _BatchScheduler(object):
     """
-    Create a new thread for the given connection and start it.
+    Runs the transcriptions through the model.
+
+    Whisper works on 30 second windows of audio, and it costs about the same to
+    push several of those through the model at once as it does to push one.
+    When requests come in at the same time we collect them for a short while
+    and then decode them as one padded batch, instead of one after the other.
+
+    A request which is on its own, or whose audio is too long to fit into a
+    window, is handed to C{model.transcribe()}. Otherwise we use the log-mel
+    spectrogram which usually comes with the request, and decode the batch in
+    the same way as C{model.transcribe()} would: any result which looks like it
+    went wrong is decoded again at a higher temperature, and any which is
+    likely just noise comes back empty.
     """
-    thread = Thread(target=lambda: run(conn, translate))
-    thread.daemon = True
-    thread.start()
+    # The same as C{model.transcribe()}'s defaults
+    _TEMPERATURES                = (0.0, 0.2, 0.4, 0.6, 0.8, 1.0)
+    _COMPRESSION_RATIO_THRESHOLD = 2.4
+    _LOGPROB_THRESHOLD           = -1.0
+    _NO_SPEECH_THRESHOLD         = 0.6
+
+    def __init__(self, model, task, max_batch, max_wait):
+        """
+        :type  model: whisper.Whisper
+        :param model:
+            The model to run.
+        :type  task: str
+        :param task:
+            Either ``transcribe`` or ``translate``.
+        :type  max_batch: int
+        :param max_batch:
+            The most requests to put into a batch.
+        :type  max_wait: float
+        :param max_wait:
+            How long, in seconds, to wait for other requests to turn up once we
+            have one.
+        """
+        self._model     = model
+        self._task      = task
+        self._max_batch = max(1, int(max_batch))
+        self._max_wait  = max(0.0, float(max_wait))
+        self._options   = whisper.DecodingOptions(
+                              task=task,
+                              fp16=(model.device.type != 'cpu')
+                          )
+        self._queue     = queue.Queue()
+
+        # What the decoders need to compute the spectrograms themselves
+        self.n_mels      = model.dims.n_mels
+        self.mel_filters = whisper.audio.mel_filters('cpu', self.n_mels).numpy()
+
+        # Metrics
+        self._batches   = 0
+        self._requests  = 0
+        self._max_depth = 0
+
+        thread = Thread(name='BatchScheduler', target=self._run)
+        thread.daemon = True
+        thread.start()
+
+
+    def transcribe(self, audio, mel=None, prefix=None):
+        """
+        Transcribe the given audio, blocking until it's done.
+
+        @see submit()
+
+        :rtype: str
+        :return:
+            What was heard.
+        """
+        return self.submit(audio, mel, prefix).result()
+
+
+    def submit(self, audio, mel=None, prefix=None):
+        """
+        Queue up the given audio to be transcribed.
+
+        :type  audio: numpy.ndarray
+        :param audio:
+            The audio, as float32 samples normalised between +/-1.0. This may be
+            ``None`` if the spectrogram is given, in which case the request is
+            always decoded from that.
+        :type  mel: numpy.ndarray
+        :param mel:
+            The normalised log-mel spectrogram of the audio, padded out to
+            Whisper's window, or ``None`` if it should be worked out here.
+        :type  prefix: str
+        :param prefix:
+            The words which the result is known to start with, if any.
+
+        :rtype: Future
+        :return:
+            The future which will hold the result.
+        """
+        future = Future()
+        self._queue.put((time.monotonic(), (audio, mel, prefix), future))
+        return future
+
+
+    def _run(self):
+        """
+        Pull requests off the queue and decode them, forever.
+        """
+        while True:
+            # Wait for something to do, and then for some friends for it
+            batch    = [self._queue.get()]
+            deadline = time.monotonic() + self._max_wait
+            while len(batch) < self._max_batch:
+                timeout = deadline - time.monotonic()
+                if timeout <= 0:
+                    break
+                try:
+                    batch.append(self._queue.get(timeout=timeout))
+                except queue.Empty:
+                    break
+
+            # What's left behind is the queue depth
+            depth = self._queue.qsize()
+            self._max_depth = max(self._max_depth, depth)
+
+            start = time.monotonic()
+            try:
+                results = self._decode([request for (_, request, _) in batch])
+                for ((_, _, future), result) in zip(batch, results):
+                    future.set_result(result)
+            except Exception as e:
+                for (_, _, future) in batch:
+                    future.set_exception(e)
+            end = time.monotonic()
+
+            self._batches  += 1
+            self._requests += len(batch)
+            logging.info("Decoded batch of %d in %0.2fs, "
+                         "oldest waited %0.3fs, queue depth %d; "
+                         "%d requests in %d batches, "
+                         "mean batch size %0.2f, max queue depth %d",
+                         len(batch), end - start,
+                         start - batch[0][0], depth,
+                         self._requests, self._batches,
+                         self._requests / self._batches, self._max_depth)
+
+
+    def _decode(self, requests):
+        """
+        Decode a batch of requests, each a tuple of the audio, its spectrogram
+        and the prefix.
+
+        :return: The list of results.
+        """
+        results = [None] * len(requests)
+        groups  = dict()
+        for (index, (audio, mel, prefix)) in enumerate(requests):
+            # Anything longer than Whisper's window can't be batched since
+            # transcribe() has to slide along it, so those go on their own. So
+            # do requests which have nothing to be batched with, since there's
+            # nothing to be gained from doing otherwise.
+            if audio is not None and (len(requests) == 1 or
+                                      mel is None    or
+                                      len(audio) > N_SAMPLES):
+                # The prefix would be applied to every window, so we only give
+                # it when there's just the one
+                if len(audio) > N_SAMPLES:
+                    prefix = None
+                options = {'prefix' : prefix} if prefix else {}
+                text    = self._model.transcribe(audio,
+                                                 task=self._task,
+                                                 **options)['text']
+                results[index] = ' '.join(filter(None, (prefix, text.strip())))
+                continue
+
+            mel = torch.from_numpy(mel)
+
+            # The prefix is a decoding option, so only requests which share one
+            # can be decoded together
+            groups.setdefault(prefix, []).append((index, mel))
+
+        for (prefix, members) in groups.items():
+            mel     = torch.stack([mel for (_, mel) in members])
+            options = self._options
+            if prefix:
+                options = dataclasses.replace(options, prefix=prefix)
+            decoded = self._decode_with_fallback(mel, options)
+
+            # Whisper doesn't give back the prefix as part of the result
+            for ((index, _), text) in zip(members, decoded):
+                results[index] = ' '.join(filter(None, (prefix, text.strip())))
+
+        return [result.strip() for result in results]
+
+
+    def _decode_with_fallback(self, mel, options):
+        """
+        Decode a batch of spectrograms in the same way as C{model.transcribe()}
+        does with a single window. Each result which is too repetitive, or which
+        the model isn't sure about, is decoded again at the next temperature.
+        Each one which is likely not speech, and which the model isn't sure
+        about, is dropped.
+
+        :type  mel: torch.Tensor
+        :param mel:
+            The stacked spectrograms.
+        :type  options: whisper.DecodingOptions
+        :param options:
+            How to decode them.
+
+        :rtype: list(str)
+        :return:
+            The text of each one.
+        """
+        mel     = mel.to(self._model.device)
+        results = [None] * len(mel)
+        pending = list(range(len(mel)))
+        for temperature in self._TEMPERATURES:
+            if len(pending) == 0:
+                break
+            decoded = whisper.decode(self._model,
+                                     mel[pending],
+                                     dataclasses.replace(options,
+                                                         temperature=temperature))
+            retry = []
+            for (index, result) in zip(pending, decoded):
+                results[index] = result
+                unsure = result.avg_logprob < self._LOGPROB_THRESHOLD
+                if unsure and result.no_speech_prob > self._NO_SPEECH_THRESHOLD:
+                    # Likely silence, so trying again won't help
+                    continue
+                if (unsure or
+                    result.compression_ratio > self._COMPRESSION_RATIO_THRESHOLD):
+                    retry.append(index)
+            pending = retry
 
+        return ['' if (result.no_speech_prob >  self._NO_SPEECH_THRESHOLD and
+                       result.avg_logprob    <= self._LOGPROB_THRESHOLD)
+                else result.text
+                for result in results]
 
-def run(conn, translate):
+
+# ------------------------------------------------------------------------------
+
+class _MelBuffer(object):
     """
-    Handle a new connection, in its own thread.
+    Holds an utterance's audio, and works out its log-mel spectrogram as the
+    audio arrives so that there's little left to do once it has ended. This
+    gives the same result as C{log_mel_spectrogram(pad_or_trim(audio))}.
+
+    The audio goes into a preallocated buffer, big enough for Whisper's 30
+    second window along with the padding which the STFT adds either side. Each
+    frame of the spectrogram is computed as soon as all of its samples are in.
+    Only the final normalisation, by the spectrogram's maximum value, and the
+    last few frames have to wait for the end.
+
+    Audio which is too long for the window is still kept, but we give up on the
+    spectrogram for it.
     """
-    try:
-        # Read in the header data
-        logging.info("Reading header")
-        header = b''
-        while len(header) < (3 * 8):
-            got = conn.recv((3 * 8) - len(header))
-            if len(got) == 0:
-                time.sleep(0.001)
-                continue
-            header += got
+    # How much padding the STFT adds at each end
+    _PAD = N_FFT // 2
+
+    # A periodic Hann window, like torch.hann_window() gives
+    _WINDOW = (0.5 - 0.5 * numpy.cos(2 * numpy.pi * numpy.arange(N_FFT) / N_FFT)) \
+              .astype(numpy.float32)
+
+    # What the log of silence comes out as
+    _SILENCE = -10.0
+
+    def __init__(self, filters):
+        """
+        :type  filters: numpy.ndarray
+        :param filters:
+            The Mel filterbank, of shape ``(n_mels, 1 + N_FFT // 2)``.
+        """
+        self._filters = filters
+        self._buffer  = numpy.zeros(N_SAMPLES + 2 * self._PAD,
+                                    dtype=numpy.float32)
+        self._log_mel = numpy.empty((len(filters), N_FRAMES),
+                                    dtype=numpy.float32)
+        self._length  = 0
+        self._frames  = 0
+
+
+    @property
+    def audio(self):
+        """
+        The audio which we have, as a view onto the buffer.
+        """
+        return self._buffer[self._PAD:self._PAD + self._length]
 
-        # Unpack to variables
-        (channels, width, rate) = struct.unpack('!qqq', header)
-        logging.info("%d channel(s), %d byte(s) wide, %dHz",
-                     channels, width, rate)
+
+    @property
+    def is_overflowed(self):
+        """
+        Whether we have more audio than will fit into Whisper's window.
+        """
+        return self._length > N_SAMPLES
+
+
+    def append(self, samples, scale):
+        """
+        Add more audio to the end of the buffer.
+
+        :type  samples: numpy.ndarray
+        :param samples:
+            The raw integer samples.
+        :type  scale: float
+        :param scale:
+            What to multiply the samples by to normalise them to +/-1.0.
+        """
+        start = self._PAD + self._length
+        end   = start + len(samples)
+        if end > len(self._buffer):
+            buffer = numpy.zeros(max(end, 2 * len(self._buffer)),
+                                 dtype=numpy.float32)
+            buffer[:start] = self._buffer[:start]
+            self._buffer = buffer
+
+        # Convert directly into the buffer, without any temporaries
+        numpy.multiply(samples,
+                       scale,
+                       out=self._buffer[start:end],
+                       casting='unsafe')
+        self._length += len(samples)
+
+        # Compute any frames which we now have all the samples for. The first
+        # ones need the reflected padding at the start, which we can only fill
+        # in once we have enough audio.
+        if self._length > self._PAD and not self.is_overflowed:
+            if self._frames == 0:
+                self._reflect_start()
+            self._compute(self._frames,
+                          min(N_FRAMES,
+                              (self._PAD + self._length - N_FFT) // HOP_LENGTH + 1))
+
+
+    def spectrogram(self, final=True):
+        """
+        Get the normalised log-mel spectrogram, padded out to Whisper's window.
+
+        :type  final: bool
+        :param final:
+            Whether the audio has ended. If not, we give back what we have so
+            far; the last few frames, which still need more audio, are treated
+            as silence.
+
+        :rtype: numpy.ndarray
+        :return:
+            The spectrogram, or ``None`` if the audio is too long.
+        """
+        if self.is_overflowed:
+            return None
+
+        if final:
+            # Fill in the padding and compute the remaining frames. Anything
+            # after the end of the audio is silence. (The padding at the end
+            # only matters if the audio nearly fills the window.)
+            self._reflect_start()
+            self._reflect_end()
+            if self._length > N_SAMPLES - N_FFT:
+                silent = N_FRAMES
+            else:
+                silent = min(N_FRAMES,
+                             -(-(self._PAD + self._length) // HOP_LENGTH))
+            self._compute(self._frames, silent)
+            log_mel = self._log_mel
+        else:
+            log_mel = self._log_mel.copy()
+        log_mel[:, self._frames:] = self._SILENCE
+
+        # And normalise, like Whisper does
+        log_mel = numpy.maximum(log_mel, log_mel.max() - 8.0)
+        return (log_mel + 4.0) / 4.0
+
+
+    def _reflect_start(self):
+        """
+        Fill in the padding at the start of the buffer by reflecting the audio.
+        """
+        pad = self._PAD
+        self._buffer[:pad] = self._buffer[2 * pad:pad:-1]
+
+
+    def _reflect_end(self):
+        """
+        Fill in the padding at the end of the window by reflecting the audio.
+        """
+        pad = self._PAD
+        end = pad + N_SAMPLES
+        self._buffer[end:end + pad] = self._buffer[end - 2:end - 2 - pad:-1]
+
+
+    def _compute(self, start, end):
+        """
+        Compute the given range of frames of the spectrogram.
+        """
+        if end <= start:
+            return
+
+        # Frame i covers the padded audio from i * HOP_LENGTH, for N_FFT samples
+        frames = sliding_window_view(
+            self._buffer[start * HOP_LENGTH:(end - 1) * HOP_LENGTH + N_FFT],
+            N_FFT
+        )[::HOP_LENGTH]
+        power = numpy.abs(numpy.fft.rfft(frames * self._WINDOW, axis=1)) ** 2
+        numpy.log10(numpy.maximum(self._filters @ power.T, 1e-10),
+                    out=self._log_mel[:, start:end])
+        self._frames = end
+
+
+# ------------------------------------------------------------------------------
+
+class _WhisperDecoder(Decoder):
+    """
+    Decodes an utterance using Whisper.
+
+    The audio is converted, and its spectrogram computed, as it arrives. If
+    rolling decodes are turned on then what we have so far is also decoded
+    every so often. The words which two of those in a row agree on are then
+    given to Whisper as the start of the final result, which saves it from
+    having to work them out again after the audio has ended.
+    """
+    # The numpy types for the different sample widths, along with their maximum
+    # values
+    _TYPES = {
+        1 : (numpy.int8,  2.0**7 ),
+        2 : (numpy.int16, 2.0**15),
+        4 : (numpy.int32, 2.0**31),
+        8 : (numpy.int64, 2.0**63),
+    }
+
+    def __init__(self, channels, width, rate):
+        """
+        @see Decoder.__init__()
+        """
+        super().__init__(channels, width, rate)
 
         # We only handle 16kHz mono right now
         if rate != 16000:
-            raise ValueError("Can only decode 16000Hz but had %dHz", rate)
+            raise ValueError("Can only decode 16000Hz but had %dHz" % rate)
         if channels != 1:
-            raise ValueError("Can only decode 1 channel but had %d", channels)
+            raise ValueError("Can only decode 1 channel but had %d" % channels)
 
-        # Keep pulling in the data until we get an empty chunk
-        data = b''
-        while True:
-            # How big is this incoming chunk?
-            length_bytes = b''
-            while len(length_bytes) < (8):
-                got = conn.recv(8 - len(length_bytes))
-                if len(got) == 0:
-                    time.sleep(0.001)
-                    continue
-                length_bytes += got
-            (length,) = struct.unpack('!q', length_bytes)
+        (self._dtype, maximum) = self._TYPES[width]
+        self._scale   = numpy.float32(1.0 / maximum)
+        self._mel     = _MelBuffer(scheduler.mel_filters)
+        self._partial = b''
 
-            # End marker?
-            if length < 0:
-                logging.debug("Got end of data")
-                break
+        # The rolling decode state
+        self._rolling    = None
+        self._rolled     = 0
+        self._hypothesis = None
+        self._prefix     = None
 
-            # Pull in the chunk
-            logging.debug("Reading %d bytes of data", length)
-            start = len(data)
-            while len(data) - start < length:
-                got = conn.recv(length - (len(data) - start))
-                if len(got) == 0:
-                    time.sleep(0.001)
-                    continue
-                data += got
-
-        # Convert to a numpy array. Whisper expects a numpy float array
-        # normalised between +/-1.0..
-        if   width == 1:
-            audio = numpy.frombuffer(data, numpy.int8 ).astype(numpy.float32) / 2.0**7
-        elif width == 2:
-            audio = numpy.frombuffer(data, numpy.int16).astype(numpy.float32) / 2.0**15
-        elif width == 4:
-            audio = numpy.frombuffer(data, numpy.int32).astype(numpy.float32) / 2.0**31
-        elif width == 8:
-            audio = numpy.frombuffer(data, numpy.int64).astype(numpy.float32) / 2.0**63
-
-        # Finally, decode it
-        logging.info("Decoding %0.2f seconds of audio",
-                     len(data) / rate / width / channels)
-
-        # Only one at a time so do this under a lock
-        with _LOCK:
-            result = model.transcribe(audio,
-                                      task='translate' if translate else 'transcribe')
-
-        # And give it back
-        words = result['text'].strip()
-        logging.info("Got: '%s'", words)
 
-        # Send back the length (as a long) and the string
-        words = words.encode()
-        conn.sendall(struct.pack('!q', len(words)))
-        conn.sendall(words)
+    def feed(self, data):
+        """
+        @see Decoder.feed()
+        """
+        # Hang on to any trailing part of a sample until the rest turns up
+        if len(self._partial) > 0:
+            data = self._partial + data
+        usable = len(data) - len(data) % self.width
+        self._partial = data[usable:]
+        self._mel.append(numpy.frombuffer(data,
+                                          self._dtype,
+                                          count=usable // self.width),
+                         self._scale)
+
+        # Time to see what we have so far? We only have one of these in flight
+        # at once.
+        if (args.rolling > 0                                             and
+            not self._mel.is_overflowed                                  and
+            (self._rolling is None or self._rolling.done())              and
+            len(self._mel.audio) - self._rolled >= args.rolling * self.rate):
+            self._rolled  = len(self._mel.audio)
+            self._rolling = scheduler.submit(None,
+                                             self._mel.spectrogram(final=False))
+            self._rolling.add_done_callback(self._update_prefix)
+
 
-    except Exception as e:
-        # Tell the user at least
-        logging.error("Error handling incoming data: %s", e)
+    def finish(self):
+        """
+        @see Decoder.finish()
+        """
+        logging.info("Decoding %0.2f seconds of audio, with prefix '%s'",
+                     len(self._mel.audio) / self.rate, self._prefix or '')
 
-    finally:
-        # We're done with this connection now, close in a best-effort fashion
+        # The scheduler looks after sharing the model, and decides whether to
+        # use the spectrogram or the audio. If the audio was too long for us to
+        # handle then we won't have a spectrogram.
+        words = scheduler.transcribe(self._mel.audio,
+                                     self._mel.spectrogram(),
+                                     self._prefix)
+        logging.info("Got: '%s'", words)
+        return words
+
+
+    def _update_prefix(self, future):
+        """
+        Called with the result of a rolling decode.
+        """
         try:
-            logging.info("Closing connection")
-            conn.shutdown(socket.SHUT_RDWR)
-            conn.close()
-        except:
-            pass
+            words = future.result().split()
+        except Exception as e:
+            logging.warning("Rolling decode failed: %s", e)
+            return
 
+        # Only trust the words which the last two decodes agree on, since the
+        # ones at the end were likely cut off
+        if self._hypothesis is not None:
+            agreed = []
+            for (previous, current) in zip(self._hypothesis, words):
+                if previous != current:
+                    break
+                agreed.append(current)
+            self._prefix = ' '.join(agreed)
+        self._hypothesis = words
 
-# ------------------------------------------------------------------------------
 
+# ------------------------------------------------------------------------------
 
 # Set up the logger
 logging.basicConfig(
@@ -152,28 +566,33 @@ parser.add_argument('--port', type=int, default=8008,
                     help='The port number to listen on')
 parser.add_argument('--translate', default=False, action='store_true',
                     help='Whether to translate to English')
+parser.add_argument('--max-batch', type=int, default=8,
+                    help='The most utterances to decode together')
+parser.add_argument('--max-wait', type=float, default=10,
+                    help='How long, in milliseconds, to wait for an utterance '
+                         'to be joined by others')
+parser.add_argument('--workers', type=int, default=1,
+                    help='The number of worker processes, each with its own model')
+parser.add_argument('--rolling', type=float, default=0,
+                    help='How often, in seconds of audio, to decode what we '
+                         'have of an utterance while it is still arriving; '
+                         '0 to turn this off')
 args = parser.parse_args()
 
-# Pull in the model
-logging.info("Loading '%s' model", args.model,)
-model = whisper.load_model(args.model)
-
-# Set up the server socket
-logging.info("Opening socket on port %d", args.port)
-sckt = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
-sckt.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
-sckt.bind(('0.0.0.0', args.port))
-sckt.listen(5)
-
-# Do this forever
-while True:
-    try:
-        # Get a connection
-        logging.info("Waiting for a connection")
-        (conn, addr) = sckt.accept()
-        logging.info("Got connection from %s" % (addr,))
-        handle(conn, args.translate)
-
-    except Exception as e:
-        # Tell the user at least
-        logging.error("Error handling incoming connection: %s", e)
+
+def _load_model():
+    """
+    Pull in the model. When running with workers, each one calls this.
+    """
+    global scheduler
+
+    logging.info("Loading '%s' model", args.model,)
+    model = whisper.load_model(args.model)
+    scheduler = _BatchScheduler(model,
+                                'translate' if args.translate else 'transcribe',
+                                args.max_batch,
+                                args.max_wait / 1000.0)
+
+
+# And serve forever
+serve(args.port, _WhisperDecoder, workers=args.workers, init=_load_model)